@@ -232,6 +232,7 @@ const Unmute = () => {
         "unmute.interrupted_by_vad",
         "unmute.response.text.delta.ready",
         "unmute.response.audio.delta.ready",
+        "unmute.chat_history.update",
       ];
       if (!ignoredTypes.includes(data.type)) {
         console.warn("Received unknown message:", data);
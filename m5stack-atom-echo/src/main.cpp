@@ -169,6 +169,12 @@ void sendSessionUpdate() {
     session["instructions"] = "You are a helpful voice assistant.";
     session["turn_detection"] = nullptr;  // Disable auto turn detection
 
+    // Only receive what we handle, to save Wi-Fi bandwidth for the audio
+    JsonArray subscriptions = session.createNestedArray("event_subscriptions");
+    subscriptions.add("audio");
+    subscriptions.add("bambola");
+    subscriptions.add("response.text.delta");
+
     String jsonString;
     serializeJson(doc, jsonString);
 
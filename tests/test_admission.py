@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from unmute.admission import AdmissionController
+from unmute.exceptions import ServerAtCapacity
+
+
+class Updates:
+    def __init__(self):
+        self.positions: list[int] = []
+
+    async def __call__(self, position: int, estimated_wait_sec: float | None):
+        self.positions.append(position)
+
+
+@pytest.mark.asyncio
+async def test_admits_immediately_under_capacity():
+    controller = AdmissionController(2, max_waiting=0, max_wait_sec=1.0)
+    updates = Updates()
+
+    async with controller.admit(updates):
+        async with controller.admit(updates):
+            assert controller.active == 2
+
+    assert controller.active == 0
+    assert updates.positions == []
+
+
+@pytest.mark.asyncio
+async def test_waiting_room_is_fifo():
+    controller = AdmissionController(1, max_waiting=2, max_wait_sec=10.0)
+    admitted: list[str] = []
+    release = asyncio.Event()
+
+    async def session(name: str):
+        async with controller.admit(Updates()):
+            admitted.append(name)
+            await release.wait()
+
+    first = asyncio.create_task(session("first"))
+    await asyncio.sleep(0)
+    waiting = [asyncio.create_task(session(name)) for name in ["second", "third"]]
+    await asyncio.sleep(0)
+    assert admitted == ["first"]
+    assert len(controller.waiting) == 2
+
+    release.set()
+    await asyncio.gather(first, *waiting)
+
+    assert admitted == ["first", "second", "third"]
+    assert controller.active == 0
+    assert not controller.waiting
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_waiting_room_is_full():
+    controller = AdmissionController(1, max_waiting=0, max_wait_sec=10.0)
+
+    async with controller.admit(Updates()):
+        with pytest.raises(ServerAtCapacity) as exc_info:
+            async with controller.admit(Updates()):
+                pass
+
+    assert exc_info.value.code == "waiting_room_full"
+    assert controller.active == 0
+
+
+@pytest.mark.asyncio
+async def test_times_out_and_reports_position():
+    controller = AdmissionController(
+        1, max_waiting=1, max_wait_sec=0.05, update_interval_sec=0.01
+    )
+    updates = Updates()
+
+    async with controller.admit(Updates()):
+        with pytest.raises(ServerAtCapacity) as exc_info:
+            async with controller.admit(updates):
+                pass
+
+    assert exc_info.value.code == "waiting_room_timeout"
+    assert updates.positions and set(updates.positions) == {1}
+    assert not controller.waiting
+    assert controller.active == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_update_gives_up_place_in_line():
+    controller = AdmissionController(1, max_waiting=1, max_wait_sec=10.0)
+
+    async def disconnected(position: int, estimated_wait_sec: float | None):
+        raise ConnectionError()
+
+    async with controller.admit(Updates()):
+        with pytest.raises(ConnectionError):
+            async with controller.admit(disconnected):
+                pass
+        assert not controller.waiting
+
+    assert controller.active == 0
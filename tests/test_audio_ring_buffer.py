@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from unmute.stt.audio_ring_buffer import AudioBufferOverflow, AudioRingBuffer
+
+
+def test_view_is_contiguous_after_wrapping():
+    buffer = AudioRingBuffer(8, overflow="drop_oldest")
+    buffer.append(np.arange(6, dtype=np.float32))
+    buffer.append(np.arange(6, 11, dtype=np.float32))
+
+    view = buffer.view()
+    np.testing.assert_array_equal(view, np.arange(3, 11))
+    assert view.base is not None  # no copy
+    assert buffer.dropped_samples == 3
+
+    with pytest.raises(ValueError):
+        view[0] = 0.0  # read-only
+
+
+def test_drop_oldest_with_frame_larger_than_capacity():
+    buffer = AudioRingBuffer(4, overflow="drop_oldest")
+    buffer.append(np.arange(2, dtype=np.float32))
+    buffer.append(np.arange(10, dtype=np.float32))
+    np.testing.assert_array_equal(buffer.view(), [6, 7, 8, 9])
+    assert buffer.dropped_samples == 8
+
+
+def test_drop_newest():
+    buffer = AudioRingBuffer(4, overflow="drop_newest")
+    buffer.append(np.arange(3, dtype=np.float32))
+    buffer.append(np.arange(3, 6, dtype=np.float32))
+    np.testing.assert_array_equal(buffer.view(), [0, 1, 2, 3])
+    assert buffer.dropped_samples == 2
+
+
+def test_error_on_overflow():
+    buffer = AudioRingBuffer(4)
+    buffer.append(np.ones((1, 3), dtype=np.float32))
+    assert buffer.free == 1
+
+    with pytest.raises(AudioBufferOverflow):
+        buffer.append(np.ones(2, dtype=np.float32))
+    assert len(buffer) == 3
+
+    buffer.clear()
+    buffer.append(np.ones(4, dtype=np.float32))
+    assert len(buffer) == 4
+
+
+def test_int16():
+    buffer = AudioRingBuffer(4, dtype=np.int16)
+    buffer.append(np.array([1, -2], dtype=np.int16))
+    assert buffer.view().dtype == np.int16
+
+
+def test_discard():
+    buffer = AudioRingBuffer(4)
+    buffer.append(np.arange(3, dtype=np.float32))
+    buffer.discard(2)
+    buffer.append(np.arange(3, 6, dtype=np.float32))
+    np.testing.assert_array_equal(buffer.view(), [2, 3, 4, 5])
+    buffer.discard(10)
+    assert len(buffer) == 0
@@ -0,0 +1,40 @@
+import pytest
+
+from unmute import binary_audio_protocol as bap
+
+
+def test_choose_subprotocol():
+    assert bap.choose_subprotocol([]) == "realtime"
+    assert bap.choose_subprotocol(["realtime"]) == "realtime"
+    assert (
+        bap.choose_subprotocol(["realtime", bap.BINARY_SUBPROTOCOL])
+        == bap.BINARY_SUBPROTOCOL
+    )
+
+
+def test_audio_frame_roundtrip():
+    opus_bytes = b"OggS\x00\x02some-opus-data"
+    frame = bap.encode_audio_frame(bap.OUTPUT_AUDIO, opus_bytes)
+    assert len(frame) == len(opus_bytes) + 1
+    assert bap.decode_audio_frame(frame) == (bap.OUTPUT_AUDIO, opus_bytes)
+
+
+def test_decode_invalid_frames():
+    with pytest.raises(ValueError):
+        bap.decode_audio_frame(b"")
+
+    with pytest.raises(ValueError):
+        bap.decode_audio_frame(b"\x7fOggS")
+
+
+@pytest.mark.parametrize("n_bytes", range(1, 6))
+def test_decode_too_short_frames(n_bytes: int):
+    frame = bap.encode_audio_frame(bap.INPUT_AUDIO, b"OggS\x00\x02"[:n_bytes])
+    with pytest.raises(ValueError):
+        bap.decode_audio_frame(frame)
+
+
+def test_is_first_ogg_page():
+    assert bap.is_first_ogg_page(b"OggS\x00\x02")
+    assert not bap.is_first_ogg_page(b"OggS\x00\x00")
+    assert not bap.is_first_ogg_page(b"OggS")
@@ -0,0 +1,82 @@
+import unmute.openai_realtime_api_events as ora
+from unmute.chat_history_sync import ChatHistorySync
+
+
+def apply_update(
+    history: list[dict[str, str]], update: ora.UnmuteChatHistoryUpdate
+) -> list[dict[str, str]]:
+    """What a client does with an update."""
+    history = [dict(m) for m in history[: update.length]]
+    for message in update.messages:
+        if message.index == len(history):
+            history.append({"role": message.role, "content": ""})
+        old = history[message.index]["content"]
+        history[message.index] = {
+            "role": message.role,
+            "content": old[: message.offset] + message.content,
+        }
+    return history
+
+
+def test_sends_only_changes():
+    sync = ChatHistorySync()
+    history = [{"role": "user", "content": "Hello"}]
+
+    first = sync.make_update(history)
+    assert first is not None and first.base_version is None
+    client = apply_update([], first)
+
+    assert sync.make_update(history) is None
+
+    history = [
+        {"role": "user", "content": "Hello there"},
+        {"role": "assistant", "content": "Hi"},
+    ]
+    second = sync.make_update(history)
+    assert second is not None and second.base_version == first.version
+    assert [(m.index, m.offset, m.content) for m in second.messages] == [
+        (0, 5, " there"),
+        (1, 0, "Hi"),
+    ]
+    assert apply_update(client, second) == history
+
+
+def test_diffs_against_acknowledged_version():
+    sync = ChatHistorySync()
+    first = sync.make_update([{"role": "user", "content": "a"}])
+    assert first is not None
+    client = apply_update([], first)
+    sync.ack(first.version)
+
+    # The client misses this one...
+    sync.make_update([{"role": "user", "content": "a b"}])
+    # ...but this one is relative to the acknowledged version, so it's enough.
+    history = [{"role": "user", "content": "a b c"}]
+    third = sync.make_update(history)
+    assert third is not None and third.base_version == first.version
+    assert apply_update(client, third) == history
+
+    # Applying an older update on top of a newer history changes nothing.
+    assert apply_update(history, third) == history
+
+
+def test_replaced_and_removed_messages():
+    sync = ChatHistorySync()
+    sync.make_update(
+        [{"role": "user", "content": "abc"}, {"role": "assistant", "content": "x"}]
+    )
+    update = sync.make_update([{"role": "user", "content": "xyz"}])
+    assert update is not None
+    assert update.length == 1
+    assert [(m.offset, m.content) for m in update.messages] == [(0, "xyz")]
+
+
+def test_resync_sends_full_snapshot():
+    sync = ChatHistorySync()
+    history = [{"role": "user", "content": "a"}, {"role": "assistant", "content": "b"}]
+    sync.make_update(history)
+    sync.resync()
+
+    update = sync.make_update(history)
+    assert update is not None and update.base_version is None
+    assert apply_update([], update) == history
@@ -0,0 +1,24 @@
+from unmute.client_event_decoding import extract_input_audio
+
+
+def test_extract_input_audio():
+    assert (
+        extract_input_audio('{"type": "input_audio_buffer.append", "audio": "T2dn"}')
+        == "T2dn"
+    )
+    assert (
+        extract_input_audio(
+            '{"audio": "T2dn", "event_id": "e", "type": "input_audio_buffer.append"}'
+        )
+        == "T2dn"
+    )
+
+
+def test_other_messages_go_to_validation():
+    assert extract_input_audio('{"type": "session.update", "session": {}}') is None
+    assert extract_input_audio('{"type": "input_audio_buffer.append"}') is None
+    assert (
+        extract_input_audio('{"type": "input_audio_buffer.append", "audio": 3}') is None
+    )
+    assert extract_input_audio("[1, 2]") is None
+    assert extract_input_audio("not json") is None
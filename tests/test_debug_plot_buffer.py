@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from unmute.debug_plot_buffer import DebugPlotBuffer
+
+
+def test_decimation_averages_amplitude():
+    buffer = DebugPlotBuffer(capacity=8, decimation=2)
+    buffer.add(0.0, np.full(4, 0.5, dtype=np.float32), 0.1)
+    assert len(buffer) == 0
+    buffer.add(1.0, np.zeros(4, dtype=np.float32), 0.2)
+
+    [point] = buffer.snapshot()
+    assert point["t"] == 1.0
+    assert point["amplitude"] == pytest.approx(np.sqrt(0.125))
+    assert point["pause_prediction"] == pytest.approx(0.2)
+
+
+def test_ring_buffer_keeps_newest_points():
+    buffer = DebugPlotBuffer(capacity=4)
+    for i in range(10):
+        buffer.add(float(i), np.ones(2, dtype=np.float32), 0.0)
+
+    assert len(buffer) == 4
+    assert [p["t"] for p in buffer.snapshot()] == [6.0, 7.0, 8.0, 9.0]
+    assert [p["t"] for p in buffer.snapshot(since=7.0)] == [8.0, 9.0]
+    assert buffer.snapshot(since=100.0) == []
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from unmute.emit_source import EmitSource, SignalingQueue
+
+
+@pytest.mark.asyncio
+async def test_emit_source_priority_and_wakeup():
+    ready = asyncio.Event()
+    high: asyncio.Queue[str] = SignalingQueue(ready)
+    low: asyncio.Queue[str] = SignalingQueue(ready)
+    source: EmitSource[str] = EmitSource(
+        get_queues=lambda: [high, low],
+        ready=ready,
+        timer_interval_sec=100.0,
+        on_timer=lambda: "timer",
+    )
+
+    await low.put("low")
+    await high.put("high")
+    assert await source.get() == "high"
+    assert await source.get() == "low"
+
+    async def put_later():
+        await asyncio.sleep(0.01)
+        await low.put("later")
+
+    task = asyncio.create_task(put_later())
+    assert await asyncio.wait_for(source.get(), timeout=1.0) == "later"
+    await task
+
+
+@pytest.mark.asyncio
+async def test_emit_source_timer():
+    ready = asyncio.Event()
+    n_calls = 0
+
+    def on_timer() -> str | None:
+        nonlocal n_calls
+        n_calls += 1
+        return "timer" if n_calls >= 2 else None
+
+    source: EmitSource[str] = EmitSource(
+        get_queues=lambda: [], ready=ready, timer_interval_sec=0.01, on_timer=on_timer
+    )
+    assert await asyncio.wait_for(source.get(), timeout=1.0) == "timer"
+    assert n_calls == 2
@@ -0,0 +1,59 @@
+import pytest
+
+from unmute import metrics as mt
+from unmute.event_subscriptions import (
+    ALL_EVENTS,
+    EVENT_GROUPS,
+    EVENT_SIZES,
+    SERVER_EVENT_TYPES,
+    EventFilter,
+)
+
+
+def test_groups_only_contain_server_events():
+    for group in EVENT_GROUPS.values():
+        assert group <= SERVER_EVENT_TYPES
+
+
+def test_filter_by_groups_and_types():
+    event_filter = EventFilter.from_subscriptions(["audio", "bambola", "vad"])
+
+    assert event_filter.wants("response.audio.delta")
+    assert event_filter.wants("unmute.bambola.buffer_ready")
+    assert event_filter.wants("unmute.interrupted_by_vad")
+    # Always sent
+    assert event_filter.wants("error")
+    assert event_filter.wants("session.updated")
+
+    assert not event_filter.wants("unmute.additional_outputs")
+    assert not event_filter.wants("response.text.delta")
+
+    assert ALL_EVENTS.wants("unmute.additional_outputs")
+
+
+def test_unknown_subscription():
+    with pytest.raises(ValueError, match="response.video"):
+        EventFilter.from_subscriptions(["audio", "response.video"])
+
+
+def test_counts_saved_bytes():
+    EVENT_SIZES.observe("response.text.delta", 100)
+    before = mt.EVENT_BYTES_SAVED._value.get()
+
+    event_filter = EventFilter.from_subscriptions(["audio"])
+    assert not event_filter.wants("response.text.delta")
+
+    assert mt.EVENT_BYTES_SAVED._value.get() == pytest.approx(before + 100)
+
+
+def test_counts_saved_audio_bytes():
+    # 80 ms of audio at 24 kHz were sent as 120 bytes of Opus.
+    EVENT_SIZES.observe_audio(1920, 120)
+    before = mt.EVENT_BYTES_SAVED._value.get()
+
+    event_filter = EventFilter.from_subscriptions(["text"])
+    # Half of that, not the size of a whole audio event.
+    assert not event_filter.wants_audio(960)
+    assert ALL_EVENTS.wants_audio(960)
+
+    assert mt.EVENT_BYTES_SAVED._value.get() == pytest.approx(before + 60)
@@ -0,0 +1,96 @@
+import pytest
+
+from unmute.kyutai_constants import SAMPLES_PER_FRAME
+from unmute.tts.jitter_buffer import AudioJitterBuffer
+
+FRAME = 0.08
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_buffer(**kwargs) -> tuple[AudioJitterBuffer[str, str], FakeClock]:
+    clock = FakeClock()
+    return AudioJitterBuffer(get_time=clock, base_lead_sec=4 * FRAME, **kwargs), clock
+
+
+def test_audio_is_sent_the_lead_time_ahead():
+    buffer, clock = make_buffer()
+    for i in range(10):
+        buffer.put_audio(f"a{i}", SAMPLES_PER_FRAME)
+    buffer.put_text("hello", 0.0)
+    buffer.put_text("world", 2 * FRAME)
+
+    # The TTS is faster than real time: the lead time plus the frame that plays then.
+    assert buffer.pop_ready() == ["a0", "a1", "a2", "a3", "a4", "hello"]
+    assert buffer.time_until_next() == pytest.approx(FRAME)
+
+    clock.now = FRAME
+    assert buffer.pop_ready() == ["a5"]
+    clock.now = 2 * FRAME
+    # The text goes when its audio starts playing.
+    assert buffer.pop_ready() == ["a6", "world"]
+    assert buffer.n_underruns == 0 and buffer.lead_sec == pytest.approx(4 * FRAME)
+
+
+def test_underrun_holds_the_audio():
+    buffer, clock = make_buffer()
+    buffer.put_audio("a0", SAMPLES_PER_FRAME)
+    assert buffer.pop_ready() == ["a0"]
+
+    # The next frame comes after the client is done playing the first one.
+    clock.now = 0.2
+    buffer.put_audio("a1", SAMPLES_PER_FRAME)
+    buffer.put_text("late", FRAME)
+    assert buffer.n_underruns == 1
+    # The TTS is slower than real time, so the lead time grows.
+    assert buffer.lead_sec > 4 * FRAME
+    assert buffer.pop_ready() == []
+    assert buffer.time_until_next() == pytest.approx(buffer.lead_sec)
+
+    # Held until the lead time is buffered, or for the lead time.
+    clock.now += buffer.lead_sec
+    assert buffer.pop_ready() == ["a1", "late"]
+    assert buffer.n_underruns == 1
+
+
+def test_late_frames():
+    buffer, clock = make_buffer(max_lead_sec=4 * FRAME)
+    for i in range(5):
+        buffer.put_audio(f"a{i}", SAMPLES_PER_FRAME)
+    assert len(buffer.pop_ready()) == 5
+
+    # Less than the lead time is left on the client, but it isn't out of audio.
+    clock.now = 0.2
+    buffer.put_audio("a5", SAMPLES_PER_FRAME)
+    assert (buffer.n_late_frames, buffer.n_underruns) == (1, 0)
+    assert buffer.pop_ready() == ["a5"]
+
+
+def test_close_sends_everything():
+    buffer, clock = make_buffer()
+    buffer.put_text("before the audio", 0.0)
+    assert buffer.pop_ready() == []
+    assert buffer.time_until_next() is None
+
+    for i in range(8):
+        buffer.put_audio(f"a{i}", SAMPLES_PER_FRAME)
+    buffer.put_text("after the audio", 10.0)
+    buffer.close()
+
+    sent = buffer.pop_ready()
+    while not buffer.empty():
+        wait = buffer.time_until_next()
+        assert wait is not None
+        clock.now += wait
+        sent += buffer.pop_ready()
+
+    assert sent[:6] == ["a0", "a1", "a2", "a3", "a4", "before the audio"]
+    assert sent[6:] == ["a5", "a6", "a7", "after the audio"]
+    # The last text goes when all the audio has been played.
+    assert clock.now == pytest.approx(8 * FRAME)
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+import sphn
+
+from unmute.stt.local_transcriber import (
+    FasterWhisperEngine,
+    LocalTranscriber,
+    TranscriptionScheduler,
+)
+from unmute.stt.transcriber import (
+    OpenAITranscriber,
+    WordTranscriber,
+    make_transcriber,
+)
+from unmute.stt.whisper_stt import WhisperSTT
+
+SPEECH_CLIP = (
+    Path(__file__).parents[1] / "unmute/loadtest/voices/vaclav_english_news_trim.mp3"
+)
+
+
+class FakeEngine:
+    """Transcribes each audio as its duration, and records the batches."""
+
+    def __init__(self):
+        self.batches: list[list[str]] = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def transcribe_batch(self, audios: list[np.ndarray], prompts: list[str]):
+        self.release.wait(timeout=5)
+        texts = [
+            f"{prompt}{len(audio) / 16000:.1f}s"
+            for audio, prompt in zip(audios, prompts, strict=True)
+        ]
+        self.batches.append(texts)
+        return texts
+
+
+@pytest.mark.asyncio
+async def test_utterances_are_batched():
+    engine = FakeEngine()
+    scheduler = TranscriptionScheduler(lambda: engine, max_batch_size=3)
+    transcriber = LocalTranscriber(scheduler)
+
+    # Block the first batch so that the next utterances wait together.
+    engine.release.clear()
+    first = asyncio.create_task(
+        transcriber.transcribe(np.zeros(24000, np.float32), 24000, "")
+    )
+    await asyncio.sleep(0.05)
+    others = [
+        asyncio.create_task(
+            transcriber.transcribe(np.zeros(n * 2400, np.float32), 24000, "p")
+        )
+        for n in range(1, 6)
+    ]
+    await asyncio.sleep(0.05)
+    engine.release.set()
+
+    assert await first == "1.0s"
+    # Resampled to 16 kHz, each result goes to its own utterance.
+    assert await asyncio.gather(*others) == [
+        "p0.1s",
+        "p0.2s",
+        "p0.3s",
+        "p0.4s",
+        "p0.5s",
+    ]
+    assert [len(batch) for batch in engine.batches] == [1, 3, 2]
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_the_batch():
+    class FlakyEngine(FakeEngine):
+        def transcribe_batch(self, audios: list[np.ndarray], prompts: list[str]):
+            if not self.batches:
+                self.batches.append([])
+                raise RuntimeError("out of memory")
+            return super().transcribe_batch(audios, prompts)
+
+    transcriber = LocalTranscriber(TranscriptionScheduler(FlakyEngine))
+    audio = np.ones(1600, np.float32)
+    with pytest.raises(RuntimeError, match="out of memory"):
+        await transcriber.transcribe(audio, 16000, "")
+
+    # The scheduler keeps going after a failure.
+    assert await transcriber.transcribe(audio, 16000, "") == "0.1s"
+    assert not isinstance(transcriber, WordTranscriber)
+
+
+def test_make_transcriber_rejects_unknown_backend():
+    with pytest.raises(ValueError, match="Unknown STT backend"):
+        make_transcriber("carrier-pigeon")
+
+
+def test_only_the_api_has_word_timestamps():
+    assert issubclass(OpenAITranscriber, WordTranscriber)
+    stt = WhisperSTT(transcriber=LocalTranscriber(TranscriptionScheduler(FakeEngine)))
+    # No partial transcriptions without word timestamps.
+    assert stt.word_transcriber is None and stt.partial_interval_sec is None
+
+
+@pytest.mark.asyncio
+async def test_faster_whisper_transcribes_a_batch():
+    pytest.importorskip("faster_whisper")
+    try:
+        engine = FasterWhisperEngine(model="tiny.en", language="en")
+    except OSError as e:
+        pytest.skip(f"Whisper model not available: {e}")
+
+    audio, _sr = sphn.read(SPEECH_CLIP, sample_rate=16000)
+    first, second = audio[0, : 3 * 16000], audio[0, 3 * 16000 :]
+    transcriber = LocalTranscriber(
+        TranscriptionScheduler(lambda: engine, batch_wait_sec=0.1)
+    )
+
+    texts = await asyncio.gather(
+        transcriber.transcribe(first, 16000, ""),
+        transcriber.transcribe(second, 16000, ""),
+    )
+    # Each utterance gets its own text.
+    assert all(texts) and texts[0] != texts[1]
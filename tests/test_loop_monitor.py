@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import time
+
+import pytest
+
+from unmute import metrics as mt
+from unmute.loop_monitor import LoopMonitor, count_tasks_by_name
+
+
+def _slow_callbacks() -> float:
+    return mt.EVENT_LOOP_SLOW_CALLBACKS._value.get()
+
+
+def block_the_loop():
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_reports_blocking_callback_with_stack(caplog):
+    caplog.set_level(logging.WARNING, logger="unmute.loop_monitor")
+    before = _slow_callbacks()
+
+    async with LoopMonitor(tick_interval_sec=0.01, slow_callback_sec=0.05):
+        await asyncio.sleep(0.05)
+        block_the_loop()
+        await asyncio.sleep(0.05)
+
+    assert _slow_callbacks() == before + 1
+    warnings = [r.getMessage() for r in caplog.records]
+    assert len(warnings) == 1
+    assert "block_the_loop" in warnings[0]
+
+
+@pytest.mark.asyncio
+async def test_no_reports_when_idle(caplog):
+    caplog.set_level(logging.WARNING, logger="unmute.loop_monitor")
+    before = _slow_callbacks()
+
+    async with LoopMonitor(tick_interval_sec=0.01, slow_callback_sec=0.1):
+        await asyncio.sleep(0.2)
+
+    assert _slow_callbacks() == before
+    assert not caplog.records
+
+
+@pytest.mark.asyncio
+async def test_count_tasks_by_name():
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(stop.wait(), name="emit_loop()") for _ in range(3)]
+    tasks.append(asyncio.create_task(stop.wait()))
+    await asyncio.sleep(0)
+
+    counts = count_tasks_by_name()
+    assert counts["emit_loop()"] == 3
+    assert counts["Task"] >= 1
+
+    stop.set()
+    await asyncio.gather(*tasks)
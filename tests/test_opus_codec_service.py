@@ -0,0 +1,29 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from unmute.kyutai_constants import SAMPLE_RATE, SAMPLES_PER_FRAME
+from unmute.opus_codec_service import OpusCodecService
+
+
+@pytest.mark.asyncio
+async def test_encode_decode_roundtrip():
+    service = OpusCodecService(num_workers=2)
+    try:
+        writer = service.open_writer(SAMPLE_RATE)
+        reader = service.open_reader(SAMPLE_RATE)
+
+        t = np.arange(SAMPLES_PER_FRAME * 10) / SAMPLE_RATE
+        audio = (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+        frames = np.split(audio, 10)
+
+        # Submitted concurrently, but the jobs of a stream must run in order.
+        pages = await asyncio.gather(*[writer.append_pcm(f) for f in frames])
+        pages = [p for p in pages if p]
+        assert pages
+
+        decoded = await asyncio.gather(*[reader.append_bytes(p) for p in pages])
+        assert sum(x.size for x in decoded) > 0
+    finally:
+        service.shutdown()
@@ -0,0 +1,37 @@
+from pathlib import Path
+
+import pytest
+
+from unmute.prefork import max_clients_per_worker, prepare_multiprocess_dir
+
+
+def test_prepare_multiprocess_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR", raising=False)
+    metrics_dir = tmp_path / "metrics"
+    prepare_multiprocess_dir(metrics_dir)
+    assert metrics_dir.is_dir()
+
+    # The files of a previous run are deleted.
+    (metrics_dir / "counter_1234.db").write_bytes(b"")
+    prepare_multiprocess_dir(metrics_dir)
+    assert list(metrics_dir.iterdir()) == []
+
+
+def test_prepare_multiprocess_dir_keeps_other_files(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR", raising=False)
+    (tmp_path / "counter_1234.db").write_bytes(b"")
+    (tmp_path / "notes.txt").write_text("important")
+
+    with pytest.raises(ValueError, match="notes.txt"):
+        prepare_multiprocess_dir(tmp_path)
+    assert (tmp_path / "notes.txt").exists()
+    assert (tmp_path / "counter_1234.db").exists()
+
+
+@pytest.mark.parametrize("max_clients", [4, 10, 11, 32])
+def test_max_clients_add_up(max_clients: int):
+    limits = [max_clients_per_worker(max_clients, 4, i) for i in range(4)]
+    assert sum(limits) == max_clients
+    assert max(limits) - min(limits) <= 1
@@ -0,0 +1,27 @@
+import unmute.openai_realtime_api_events as ora
+import unmute.server_event_encoding as see
+
+
+def test_same_json_as_pydantic():
+    events: list[ora.ServerEvent] = [
+        see.response_audio_delta("T2dnUwACAAAA+/="),
+        see.response_text_delta(' "hé"\n\t\\ ok'),
+        see.unmute_response_text_delta_ready(" ciao\x01"),
+        see.unmute_response_audio_delta_ready(1920),
+        ora.ResponseTextDelta(delta="validated the usual way"),
+    ]
+
+    for event in events:
+        assert see.dump_server_event_json(event) == event.model_dump_json()
+
+
+def test_fallback_for_other_events():
+    event = ora.ResponseTextDone(text="done")
+    assert see.dump_server_event_json(event) == event.model_dump_json()
+
+
+def test_monotonic_event_ids():
+    ids = [ora.monotonic_event_id() for _ in range(3)]
+    assert len(set(ids)) == 3
+    assert ids == sorted(ids)
+    assert all(x.startswith("event_") for x in ids)
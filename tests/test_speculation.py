@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from unmute.speculation import TurnSpeculation
+from unmute.tts.tts_pool import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self, index: int):
+        self.index = index
+        self.closed = False
+
+    def state(self):
+        return "closed" if self.closed else "connected"
+
+    async def shutdown(self):
+        self.closed = True
+
+
+class FakeServer:
+    def __init__(self):
+        self.connections: list[FakeConnection] = []
+        self.fail = False
+
+    async def connect(self, voice: str | None) -> FakeConnection:
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise ConnectionError("no TTS")
+        self.connections.append(FakeConnection(len(self.connections)))
+        return self.connections[-1]
+
+
+@pytest.mark.asyncio
+async def test_commit_returns_the_speculative_connection():
+    server = FakeServer()
+    pool = ConnectionPool(server.connect, size_per_voice=1)
+    warmed_up = asyncio.Event()
+
+    async def warm_up_llm():
+        warmed_up.set()
+
+    speculation = TurnSpeculation(pool, "alice", warm_up_llm=warm_up_llm)
+    await asyncio.sleep(0.05)
+    assert warmed_up.is_set()
+
+    connection = await speculation.commit("alice")
+    assert connection is server.connections[0] and not connection.closed
+
+
+@pytest.mark.asyncio
+async def test_cancel_gives_the_connection_back():
+    server = FakeServer()
+    pool = ConnectionPool(server.connect, size_per_voice=1)
+    await pool.checkout("alice")
+    await asyncio.sleep(0.05)
+    assert pool.n_ready("alice") == 1
+
+    server.fail = True  # The pool isn't refilled before the speculation is over
+    speculation = TurnSpeculation(pool, "alice")
+    await asyncio.sleep(0.05)
+    assert pool.n_ready("alice") == 0
+    await speculation.cancel()
+    assert pool.n_ready("alice") == 1
+
+    # The next turn gets the connection the speculation didn't use.
+    assert (await pool.checkout("alice")).index == 1
+    assert not any(c.closed for c in server.connections)
+
+    # With the pool full already, it is closed instead.
+    server.fail = False
+    await asyncio.sleep(0.05)
+    speculation = TurnSpeculation(pool, "alice")
+    await asyncio.sleep(0.05)
+    assert pool.n_ready("alice") == 1
+    await speculation.cancel()
+    await asyncio.sleep(0)
+    assert pool.n_ready("alice") == 1 and server.connections[2].closed
+
+
+@pytest.mark.asyncio
+async def test_cancel_while_connecting():
+    server = FakeServer()
+    pool = ConnectionPool(server.connect, size_per_voice=0)
+
+    speculation = TurnSpeculation(pool, "alice")
+    await speculation.cancel()
+    await asyncio.sleep(0.05)
+    assert server.connections == []
+
+
+@pytest.mark.asyncio
+async def test_failures_fall_back_to_connecting():
+    server = FakeServer()
+    pool = ConnectionPool(server.connect, size_per_voice=0)
+
+    async def warm_up_llm():
+        raise ConnectionError("no LLM")
+
+    server.fail = True
+    speculation = TurnSpeculation(pool, "alice", warm_up_llm=warm_up_llm)
+    assert await speculation.commit("alice") is None
+
+    server.fail = False
+    speculation = TurnSpeculation(pool, "alice")
+    await asyncio.sleep(0.05)
+    # The voice changed in the meantime, the connection is closed.
+    assert await speculation.commit("bob") is None
+    await asyncio.sleep(0)
+    assert server.connections[0].closed
+
+
+@pytest.mark.asyncio
+async def test_commit_skips_a_closed_connection():
+    server = FakeServer()
+    pool = ConnectionPool(server.connect, size_per_voice=0)
+
+    speculation = TurnSpeculation(pool, "alice")
+    await asyncio.sleep(0.05)
+    # Closed by the TTS server while waiting for the answer.
+    server.connections[0].closed = True
+    assert await speculation.commit("alice") is None
@@ -0,0 +1,107 @@
+import asyncio
+
+import msgpack
+import numpy as np
+import pydantic
+import pytest
+
+from unmute.kyutai_constants import SAMPLES_PER_FRAME
+from unmute.stt.speech_to_text import (
+    SpeechToText,
+    STTMessageAdapter,
+    STTStepMessage,
+    STTWordMessage,
+    decode_stt_message,
+    encode_audio_message,
+)
+
+
+@pytest.mark.parametrize("n_samples", [0, 5, 15, 16, 1920, 2**16])
+def test_list_encoding_matches_msgpack(n_samples: int):
+    audio = np.random.default_rng(0).uniform(-1, 1, n_samples).astype(np.float32)
+    expected = msgpack.packb(
+        {"type": "Audio", "pcm": audio.tolist()},
+        use_bin_type=True,
+        use_single_float=True,
+    )
+    assert encode_audio_message(audio, "list") == expected
+
+
+def test_binary_encodings():
+    audio = np.array([0.0, 0.5, -1.0, 2.0], dtype=np.float32)
+
+    message = msgpack.unpackb(encode_audio_message(audio, "float32"))
+    assert message["pcm_format"] == "float32"
+    np.testing.assert_array_equal(np.frombuffer(message["pcm"], "<f4"), audio)
+
+    message = msgpack.unpackb(encode_audio_message(audio, "int16"))
+    assert message["pcm_format"] == "int16"
+    assert np.frombuffer(message["pcm"], "<i2").tolist() == [0, 16383, -32767, 32767]
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"type": "Step", "step_idx": 3, "prs": [0.1, 0.2, 0.9], "buffered_pcm": 0},
+        {"type": "Word", "text": "bonjour", "start_time": 1.5},
+        {"type": "Marker", "id": 4},
+        # Not the types expected by the fast path, validated (and converted) instead.
+        {"type": "Step", "step_idx": 3, "prs": [0, 1, 1]},
+        {"type": "Word", "text": "bonjour", "start_time": 2},
+    ],
+)
+def test_decode_matches_pydantic(data: dict):
+    message = decode_stt_message(msgpack.packb(data))  # type: ignore
+    expected = STTMessageAdapter.validate_python(data)
+    assert message == expected
+    assert message.model_dump() == expected.model_dump()
+
+
+def test_decode_fast_path_types():
+    step = msgpack.packb({"type": "Step", "step_idx": 0, "prs": [0.0, 0.5, 1.0]})
+    assert isinstance(decode_stt_message(step), STTStepMessage)  # type: ignore
+    word = msgpack.packb({"type": "Word", "text": "a", "start_time": 0.0})
+    assert isinstance(decode_stt_message(word), STTWordMessage)  # type: ignore
+
+
+def test_decode_invalid_message():
+    with pytest.raises(pydantic.ValidationError):
+        decode_stt_message(msgpack.packb({"type": "Step", "prs": [0.5]}))  # type: ignore
+
+
+class FakeWebsocket:
+    def __init__(self):
+        self.sent: list[bytes] = []
+        self.incoming: asyncio.Queue[bytes | None] = asyncio.Queue()
+
+    async def send(self, message: bytes):
+        self.sent.append(message)
+
+    async def __aiter__(self):
+        while (message := await self.incoming.get()) is not None:
+            yield message
+
+
+@pytest.mark.asyncio
+async def test_flush_is_a_single_message():
+    stt = SpeechToText(delay_sec=0.5)
+    websocket = FakeWebsocket()
+    stt.websocket = websocket  # type: ignore
+    consumer = asyncio.create_task(anext(aiter(stt), None))
+
+    flush = await stt.flush()
+    assert len(websocket.sent) == 1
+    pcm = msgpack.unpackb(websocket.sent[0])["pcm"]
+    assert pcm == [0.0] * (8 * SAMPLES_PER_FRAME)  # The delay and a frame of margin
+
+    # Resolved once the STT has stepped past the delay, 7 frames of 80 ms.
+    step = msgpack.packb({"type": "Step", "step_idx": 0, "prs": [0.0, 0.0, 1.0]})
+    for _ in range(6):
+        websocket.incoming.put_nowait(step)  # type: ignore
+    await asyncio.sleep(0.01)
+    assert not flush.done()
+    websocket.incoming.put_nowait(step)  # type: ignore
+    await asyncio.wait_for(flush, timeout=1)
+
+    websocket.incoming.put_nowait(None)
+    assert await consumer is None
@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from unmute.tracing import TraceExporter, TraceStore, TurnTrace, to_otlp_request
+
+
+def test_turn_trace_spans():
+    store = TraceStore(max_traces=10)
+    trace = TurnTrace(store=store, trigger="pause")
+
+    trace.start_span("llm.first_token")
+    trace.end_span("llm.first_token", words=3)
+    trace.end_span("never.started")
+    with pytest.raises(ValueError):
+        with trace.span("tts.connect"):
+            raise ValueError("no TTS")
+    trace.start_span("emit.first_audio")
+
+    assert not store.traces
+    trace.end()
+    trace.end()  # idempotent
+    assert store.recent(10) == [trace]
+
+    spans = {span["name"]: span for span in trace.summary()["spans"]}
+    assert spans.keys() == {"llm.first_token", "tts.connect", "emit.first_audio"}
+    assert spans["llm.first_token"]["attributes"] == {"words": 3}
+    assert "ValueError" in spans["tts.connect"]["error"]
+    assert spans["emit.first_audio"]["attributes"] == {"unfinished": True}
+
+    # Spans started after the turn ended aren't recorded
+    trace.start_span("late")
+    assert "late" not in trace.spans
+
+
+def test_add_span():
+    trace = TurnTrace()
+    start_ns = trace.root.start_ns - 1000
+
+    span = trace.add_span("stt.pause", start_ns, start_ns + 500)
+    assert (span.start_ns, span.end_ns) == (start_ns, start_ns + 500)
+    span = trace.add_span("stt.transcript", start_ns + 500)
+    assert span.end_ns is not None and span.end_ns > start_ns + 500
+    # Like `start_span`, a span that already exists is kept as is.
+    assert trace.add_span("stt.pause", 0, 1) is trace.spans["stt.pause"]
+    assert trace.spans["stt.pause"].start_ns == start_ns
+
+
+def test_backdated_turn_trace():
+    trace = TurnTrace(trigger="pause")
+    start_ns = trace.root.start_ns - 1000
+
+    trace = TurnTrace(trigger="pause", start_ns=start_ns)
+    assert trace.root.start_ns == start_ns
+    span = trace.add_span("stt.pause", start_ns, start_ns + 500)
+    assert span.start_ns >= trace.root.start_ns
+
+
+def test_store_is_bounded():
+    store = TraceStore(max_traces=2)
+    traces = [TurnTrace(store=store) for _ in range(3)]
+    for trace in traces:
+        trace.end()
+
+    assert store.recent(10) == [traces[2], traces[1]]
+    assert store.get(traces[0].trace_id) is None
+    assert store.get(traces[2].trace_id) is traces[2]
+
+
+def test_otlp_format():
+    trace = TurnTrace(trigger="pause", turn=4)
+    with trace.span("llm.first_token"):
+        pass
+    trace.end(interrupted=True)
+
+    request = to_otlp_request([trace])
+    spans = request["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    root, child = spans
+
+    assert len(root["traceId"]) == 32 and len(root["spanId"]) == 16
+    assert "parentSpanId" not in root
+    assert child["parentSpanId"] == root["spanId"]
+    assert int(child["endTimeUnixNano"]) >= int(child["startTimeUnixNano"])
+    assert {"key": "turn", "value": {"intValue": "4"}} in root["attributes"]
+    assert {"key": "interrupted", "value": {"boolValue": True}} in root["attributes"]
+
+
+def test_file_export(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = TraceExporter(file=path)
+    store = TraceStore(max_traces=10, exporter=exporter)
+    TurnTrace(store=store).end()
+    TurnTrace(store=store).end()
+    exporter.shutdown()
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 2
+    assert "resourceSpans" in json.loads(lines[0])
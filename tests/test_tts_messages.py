@@ -0,0 +1,54 @@
+import msgpack
+import numpy as np
+import pydantic
+import pytest
+
+from unmute.tts.text_to_speech import (
+    TTSAudioMessage,
+    TTSMessageAdapter,
+    TTSTextMessage,
+    decode_tts_message,
+)
+
+AUDIO = np.random.default_rng(0).uniform(-1, 1, 1920).astype(np.float32)
+
+
+@pytest.mark.parametrize("n_samples", [0, 1, 15, 16, 1920, 2**16])
+@pytest.mark.parametrize("use_single_float", [True, False])
+def test_audio_matches_pydantic(n_samples: int, use_single_float: bool):
+    pcm = np.resize(AUDIO, n_samples).tolist()
+    data: bytes = msgpack.packb(
+        {"type": "Audio", "pcm": pcm}, use_single_float=use_single_float
+    )  # type: ignore
+
+    message = decode_tts_message(data)
+    expected = TTSMessageAdapter.validate_python(msgpack.unpackb(data))
+    assert isinstance(message, TTSAudioMessage)
+    assert message.pcm.dtype == np.float32 and message.pcm.flags.c_contiguous
+    np.testing.assert_array_equal(message.pcm, expected.pcm)
+    np.testing.assert_array_equal(message.pcm, np.array(pcm, dtype=np.float32))
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        # Not what the fast path expects, unpacked and validated instead.
+        {"type": "Audio", "pcm": [0, 1, 0.5]},
+        {"pcm": [0.5, 0.25], "type": "Audio"},
+        {"type": "Audio", "pcm": [0.5, 0.25], "extra": 1},
+    ],
+)
+def test_audio_fallback(data: dict):
+    message = decode_tts_message(msgpack.packb(data))  # type: ignore
+    assert isinstance(message, TTSAudioMessage)
+    assert message.pcm.dtype == np.float32
+    assert message.pcm.tolist() == [float(x) for x in data["pcm"]]
+
+
+def test_other_messages():
+    data = {"type": "Text", "text": "bonjour", "start_s": 0.5, "stop_s": 0.9}
+    message = decode_tts_message(msgpack.packb(data))  # type: ignore
+    assert message == TTSTextMessage(**data)
+
+    with pytest.raises(pydantic.ValidationError):
+        decode_tts_message(msgpack.packb({"type": "Audio", "pcm": ["a"]}))  # type: ignore
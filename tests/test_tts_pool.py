@@ -0,0 +1,164 @@
+import asyncio
+
+import msgpack
+import numpy as np
+import pytest
+from websockets.protocol import State
+
+from unmute.kyutai_constants import SAMPLES_PER_FRAME
+from unmute.tts.text_to_speech import TextToSpeech
+from unmute.tts.tts_pool import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self, voice: str | None, index: int):
+        self.voice = voice
+        self.index = index
+        self.closed = False
+
+    def state(self):
+        return "closed" if self.closed else "connected"
+
+    async def shutdown(self):
+        self.closed = True
+
+
+class FakeServer:
+    def __init__(self):
+        self.connections: list[FakeConnection] = []
+        self.fail = False
+
+    async def connect(self, voice: str | None) -> FakeConnection:
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise ConnectionError("no TTS")
+        self.connections.append(FakeConnection(voice, len(self.connections)))
+        return self.connections[-1]
+
+
+async def wait_for_ready(pool: ConnectionPool, voice: str | None, n: int):
+    async with asyncio.timeout(1):
+        while pool.n_ready(voice) < n:
+            await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_checkout_takes_a_ready_connection():
+    server = FakeServer()
+    pool = ConnectionPool(server.connect, size_per_voice=2)
+
+    # Nothing ready for the first turn, it connects by itself.
+    first = await pool.checkout("alice")
+    assert first.index == 0 and not first.closed
+    await wait_for_ready(pool, "alice", 2)
+
+    second = await pool.checkout("alice")
+    assert second.index in (1, 2)
+    # The pool is refilled in the background.
+    await wait_for_ready(pool, "alice", 2)
+    assert len(server.connections) == 4
+    assert all(c.voice == "alice" for c in server.connections)
+
+
+@pytest.mark.asyncio
+async def test_closed_and_old_connections_are_replaced():
+    server = FakeServer()
+    pool = ConnectionPool(server.connect, size_per_voice=1, max_idle_sec=0.05)
+
+    await pool.checkout(None)
+    await wait_for_ready(pool, None, 1)
+    server.connections[1].closed = True
+    # The closed connection is skipped.
+    assert (await pool.checkout(None)).index == 2
+
+    await wait_for_ready(pool, None, 1)
+    await asyncio.sleep(0.06)
+    pool.clean_up()
+    await asyncio.sleep(0)
+    assert server.connections[3].closed
+    await wait_for_ready(pool, None, 1)
+    assert (await pool.checkout(None)).index == 4
+
+
+@pytest.mark.asyncio
+async def test_unused_voices_are_dropped():
+    server = FakeServer()
+    pool = ConnectionPool(server.connect, size_per_voice=1, voice_ttl_sec=0.05)
+
+    await pool.checkout("alice")
+    await wait_for_ready(pool, "alice", 1)
+    await asyncio.sleep(0.06)
+    pool.clean_up()
+    await asyncio.sleep(0)
+
+    assert pool.n_ready("alice") == 0
+    assert server.connections[1].closed
+
+
+@pytest.mark.asyncio
+async def test_custom_voices_and_failures_are_not_pooled():
+    server = FakeServer()
+    pool = ConnectionPool(server.connect, size_per_voice=1)
+
+    await pool.checkout("custom:1234")
+    await asyncio.sleep(0.05)
+    assert pool.n_ready("custom:1234") == 0 and len(server.connections) == 1
+
+    # Errors in the background refill don't reach the turns.
+    server.fail = True
+    with pytest.raises(ConnectionError):
+        await pool.checkout("alice")
+    await asyncio.sleep(0.05)
+    server.fail = False
+    assert (await pool.checkout("alice")).voice == "alice"
+
+
+class FakeTTSWebsocket:
+    """Sends audio frames as fast as they are read, then nothing."""
+
+    def __init__(self, n_frames: int):
+        self.state = State.OPEN
+        pcm = np.zeros(SAMPLES_PER_FRAME, dtype=np.float32).tolist()
+        self.messages = [
+            msgpack.packb({"type": "Audio", "pcm": pcm}, use_single_float=True)
+        ] * n_frames
+
+    async def recv(self, decode: bool):
+        if not self.messages:
+            await asyncio.Event().wait()
+        return self.messages.pop(0)
+
+    async def close(self):
+        self.state = State.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_checked_out_tts_paces_on_the_callers_clock():
+    async def connect(voice: str | None) -> TextToSpeech:
+        tts = TextToSpeech(voice=voice)
+        tts.websocket = FakeTTSWebsocket(n_frames=10)  # type: ignore
+        return tts
+
+    pool = ConnectionPool(connect, size_per_voice=0)
+    tts = await pool.checkout("alice")
+    now = 0.0
+    tts.get_time = lambda: now
+
+    received = []
+
+    async def receive():
+        async for message in tts:
+            received.append(message)
+
+    task = asyncio.create_task(receive())
+    # With the caller's clock stopped, only the lead time and the frame that plays
+    # are sent, however long it takes.
+    await asyncio.sleep(0.3)
+    assert len(received) == 5
+
+    now = 0.08
+    await asyncio.sleep(0.1)
+    assert len(received) == 6
+
+    task.cancel()
+    await tts.shutdown()
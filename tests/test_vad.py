@@ -0,0 +1,78 @@
+import numpy as np
+
+from unmute.stt.vad import EnergyVAD, FeatureVAD, VoiceActivityDetector, frame_features
+
+SAMPLE_RATE = 24000
+CHUNK_SIZE = 1920
+
+
+def voiced(duration_sec: float, rms: float = 0.1) -> np.ndarray:
+    """Harmonics of 150 Hz, like a vowel."""
+    t = np.arange(int(duration_sec * SAMPLE_RATE)) / SAMPLE_RATE
+    x = sum(np.sin(2 * np.pi * 150 * k * t) / k for k in range(1, 20))
+    return x * rms / np.sqrt(np.mean(x**2))
+
+
+def noise(duration_sec: float, rms: float, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rms * rng.standard_normal(int(duration_sec * SAMPLE_RATE))
+
+
+def run(vad: VoiceActivityDetector, audio: np.ndarray) -> list[bool]:
+    audio = audio.astype(np.float32)
+    return [
+        vad.process(audio[i : i + CHUNK_SIZE]).is_speech
+        for i in range(0, len(audio), CHUNK_SIZE)
+    ]
+
+
+def test_frame_features():
+    frames = np.stack([voiced(0.02), noise(0.02, 0.1)]).astype(np.float32)
+    energy_db, flatness, zero_crossing_rate = frame_features(frames)
+    np.testing.assert_allclose(energy_db, -20, atol=1)
+    assert flatness[0] < 0.1 < 0.4 < flatness[1]
+    assert zero_crossing_rate[0] < 0.1 < 0.4 < zero_crossing_rate[1]
+
+
+def test_speech_in_loud_noise():
+    # 10 dB SNR, the noise alone is above the threshold of the energy VAD.
+    n = noise(6.0, 0.03)
+    audio = n.copy()
+    audio[2 * SAMPLE_RATE : 4 * SAMPLE_RATE] += voiced(2.0)
+
+    decisions = run(FeatureVAD(SAMPLE_RATE), audio)
+    chunks_per_sec = SAMPLE_RATE // CHUNK_SIZE
+    assert not any(decisions[: 2 * chunks_per_sec])
+    assert all(decisions[2 * chunks_per_sec + 2 : 4 * chunks_per_sec])
+    # The end is detected after the hangover.
+    assert not any(decisions[4 * chunks_per_sec + 5 :])
+
+    assert all(run(EnergyVAD(SAMPLE_RATE), n))
+
+
+def test_noise_floor_follows_louder_noise():
+    audio = np.concatenate([noise(2.0, 0.001), noise(8.0, 0.05, seed=1)])
+    vad = FeatureVAD(SAMPLE_RATE, max_spectral_flatness=1.0, max_zero_crossing_rate=1.0)
+    decisions = run(vad, audio)
+    # Even when only looking at the energy, the noise stops being speech.
+    assert not any(decisions[-3 * SAMPLE_RATE // CHUNK_SIZE :])
+
+
+def test_min_speech_and_hangover():
+    vad = FeatureVAD(SAMPLE_RATE)
+    run(vad, noise(1.0, 0.001))
+
+    # A click is too short to be speech.
+    result = vad.process(voiced(0.04).astype(np.float32))
+    assert not result.is_speech and result.speech_sec == 0
+
+    speech = vad.process(voiced(0.2).astype(np.float32))
+    assert speech.is_speech and 0 < speech.speech_sec < 0.2
+
+    # A short pause doesn't end the speech, a longer one does.
+    assert vad.process(noise(0.2, 0.001).astype(np.float32)).is_speech
+    assert not vad.process(noise(0.2, 0.001).astype(np.float32)).is_speech
+
+    vad.process(voiced(0.2).astype(np.float32))
+    vad.reset()
+    assert not vad.is_speech
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from unmute.stt import whisper_client
+from unmute.stt.whisper_client import TokenBucket, WhisperClient, backoff_sec
+
+
+def api_error(status: int, headers: dict[str, str] | None = None) -> Exception:
+    request = httpx.Request("POST", "https://api.openai.com/v1/audio/transcriptions")
+    response = httpx.Response(status, headers=headers, request=request)
+    error_class = openai.RateLimitError if status == 429 else openai.APIStatusError
+    if status >= 500:
+        error_class = openai.InternalServerError
+    return error_class("error", response=response, body=None)
+
+
+class FakeTranscriptions:
+    """Raises the given errors, in order, then answers "ok"."""
+
+    def __init__(self, errors: list[Exception] | None = None, delay_sec: float = 0.0):
+        self.errors = list(errors or [])
+        self.delay_sec = delay_sec
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay_sec)
+            if self.errors:
+                raise self.errors.pop(0)
+            return "ok"
+        finally:
+            self.in_flight -= 1
+
+
+def make_client(transcriptions: FakeTranscriptions, **kwargs) -> WhisperClient:
+    client = SimpleNamespace(audio=SimpleNamespace(transcriptions=transcriptions))
+    kwargs.setdefault("requests_per_sec", 1000)
+    return WhisperClient(client, **kwargs)  # type: ignore
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(whisper_client, "BACKOFF_BASE_SEC", 0.001)
+
+
+@pytest.mark.asyncio
+async def test_retries_rate_limits_and_server_errors():
+    transcriptions = FakeTranscriptions([api_error(429), api_error(503)])
+    client = make_client(transcriptions)
+
+    assert await client.transcribe(model="whisper-1") == "ok"
+    assert transcriptions.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries():
+    transcriptions = FakeTranscriptions([api_error(500)] * 3)
+    client = make_client(transcriptions, max_retries=2)
+
+    with pytest.raises(openai.InternalServerError):
+        await client.transcribe(model="whisper-1")
+    assert transcriptions.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_does_not_retry_client_errors():
+    transcriptions = FakeTranscriptions([api_error(400)])
+    client = make_client(transcriptions)
+
+    with pytest.raises(openai.APIStatusError):
+        await client.transcribe(model="whisper-1")
+    assert transcriptions.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_limits_concurrent_requests():
+    transcriptions = FakeTranscriptions(delay_sec=0.02)
+    client = make_client(transcriptions, max_concurrent_requests=3)
+
+    results = await asyncio.gather(
+        *[client.transcribe(model="whisper-1") for _ in range(10)]
+    )
+    assert results == ["ok"] * 10
+    assert transcriptions.max_in_flight == 3
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_rate():
+    bucket = TokenBucket(rate_per_sec=100, burst=5)
+
+    start = time.monotonic()
+    for _ in range(15):
+        await bucket.acquire()
+    # The first 5 are immediate, the next 10 take 0.1 s.
+    assert 0.08 < time.monotonic() - start < 0.3
+
+
+def test_backoff_respects_retry_after():
+    assert all(0 <= backoff_sec(1) <= 0.5 for _ in range(100))
+    assert backoff_sec(0, retry_after_sec=2.0) == 2.0
+    # Too long to wait during a turn.
+    assert backoff_sec(0, retry_after_sec=60.0) is None
+
+
+@pytest.mark.asyncio
+async def test_gives_up_on_long_retry_after():
+    transcriptions = FakeTranscriptions([api_error(429, {"retry-after": "60"})])
+    client = make_client(transcriptions)
+
+    with pytest.raises(openai.RateLimitError):
+        await asyncio.wait_for(client.transcribe(model="whisper-1"), timeout=1)
+    assert transcriptions.calls == 1
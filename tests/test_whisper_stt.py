@@ -0,0 +1,266 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from unmute.stt.partial_transcription import TimedWord, TranscriptStabilizer
+from unmute.stt.transcriber import OpenAITranscriber
+from unmute.stt.vad import EnergyVAD, FeatureVAD
+from unmute.stt.whisper_client import WhisperClient
+from unmute.stt.whisper_stt import WhisperSTT, record_transcription_spans
+from unmute.tracing import TurnTrace
+
+SAMPLE_RATE = 24000
+FRAME_SIZE = 1920
+
+
+class FakeTranscriptions:
+    """Stands in for `client.audio.transcriptions`, answers when told to."""
+
+    def __init__(self):
+        self.requests: list[dict] = []
+        self.answers: asyncio.Queue = asyncio.Queue()
+
+    async def create(self, model: str, file: tuple[str, bytes, str], **kwargs):
+        self.requests.append(kwargs)
+        return await self.answers.get()
+
+    async def answer_words(self, *words: tuple[str, float, float]):
+        """Answer a request for word timestamps."""
+        await self.answers.put(
+            SimpleNamespace(
+                words=[SimpleNamespace(word=w, start=s, end=e) for w, s, e in words]
+            )
+        )
+
+
+def make_stt(
+    partial_interval_sec: float | None = None,
+) -> tuple[WhisperSTT, FakeTranscriptions]:
+    transcriptions = FakeTranscriptions()
+    client = SimpleNamespace(audio=SimpleNamespace(transcriptions=transcriptions))
+    # The simplest VAD, the tone used as speech is always above its threshold.
+    stt = WhisperSTT(
+        sample_rate=SAMPLE_RATE,
+        partial_interval_sec=partial_interval_sec,
+        vad=EnergyVAD(SAMPLE_RATE),
+        transcriber=OpenAITranscriber(WhisperClient(client)),  # type: ignore
+    )
+    return stt, transcriptions
+
+
+async def send(stt: WhisperSTT, audio: np.ndarray):
+    for i in range(0, len(audio), FRAME_SIZE):
+        await stt.send_audio(audio[i : i + FRAME_SIZE])
+
+
+async def wait_for_requests(transcriptions: FakeTranscriptions, n: int):
+    async with asyncio.timeout(2):
+        while len(transcriptions.requests) < n:
+            await asyncio.sleep(0.01)
+
+
+async def wait_until_idle(stt: WhisperSTT):
+    async with asyncio.timeout(2):
+        while stt.is_processing:
+            await asyncio.sleep(0.01)
+
+
+def utterance(speech_sec: float, silence_sec: float = 2.2) -> np.ndarray:
+    t = np.arange(int(speech_sec * SAMPLE_RATE)) / SAMPLE_RATE
+    speech = (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    silence = np.zeros(int(silence_sec * SAMPLE_RATE), dtype=np.float32)
+    return np.concatenate([speech, silence])
+
+
+@pytest.mark.asyncio
+async def test_send_audio_does_not_wait_for_whisper():
+    stt, transcriptions = make_stt()
+
+    await send(stt, utterance(1.5))
+    assert stt.is_processing
+    # Let the background task encode the audio and send the request.
+    await wait_for_requests(transcriptions, 1)
+
+    # Audio received while the request is in flight is kept for the next segment.
+    second = utterance(1.5, silence_sec=0.5)
+    await asyncio.wait_for(send(stt, second), timeout=1)
+    assert len(stt.audio_buffer) >= len(second)
+
+    await transcriptions.answers.put("hello there")
+    results = aiter(stt)
+    first = await asyncio.wait_for(anext(results), timeout=1)
+    assert first.text == "hello there"
+    assert not stt.is_processing
+
+    # The end of the second utterance starts the next request.
+    await send(stt, np.zeros(int(2 * SAMPLE_RATE), dtype=np.float32))
+    await transcriptions.answers.put("general Kenobi")
+    second_result = await asyncio.wait_for(anext(results), timeout=1)
+    assert second_result.text == "general Kenobi"
+    assert len(transcriptions.requests) == 2
+
+    await stt.shutdown()
+    with pytest.raises(StopAsyncIteration):
+        await anext(results)
+
+
+@pytest.mark.asyncio
+async def test_shutdown_cancels_transcription():
+    stt, transcriptions = make_stt()
+    await send(stt, utterance(1.5))
+    task = stt.transcription_task
+    assert task is not None
+
+    await stt.shutdown()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert [result async for result in stt] == []
+
+
+def test_stabilizer_confirms_agreeing_prefix():
+    stabilizer = TranscriptStabilizer()
+    assert stabilizer.update([TimedWord("Hello", 0.0, 0.5)]) == []
+
+    words = [TimedWord("hello,", 0.0, 0.5), TimedWord("word", 0.6, 1.0)]
+    assert stabilizer.update(words) == words[:1]
+    assert stabilizer.prompt() == "hello,"
+
+    # "word" was corrected, so it isn't confirmed.
+    assert stabilizer.update([TimedWord("world", 0.1, 0.5)]) == []
+    assert stabilizer.previous == ["world"]
+
+
+@pytest.mark.asyncio
+async def test_partial_transcriptions():
+    stt, transcriptions = make_stt(partial_interval_sec=1.0)
+    results = aiter(stt)
+
+    # After 1 s of speech: a first hypothesis, nothing is confirmed yet.
+    await send(stt, utterance(1.0, silence_sec=0))
+    await wait_for_requests(transcriptions, 1)
+    assert transcriptions.requests[0]["response_format"] == "verbose_json"
+    await transcriptions.answer_words(("hello", 0.2, 0.6), ("there", 0.7, 0.95))
+    await wait_until_idle(stt)
+    assert stt.results.empty()
+
+    # The second hypothesis agrees on two words.
+    await send(stt, utterance(1.0, silence_sec=0))
+    await wait_for_requests(transcriptions, 2)
+    await transcriptions.answer_words(
+        ("hello", 0.2, 0.6), ("there", 0.7, 1.1), ("general", 1.3, 1.8)
+    )
+    result = await asyncio.wait_for(anext(results), timeout=1)
+    assert (result.text, result.start_time) == ("hello there", 0.2)
+    # The audio of the confirmed words is dropped.
+    assert len(stt.audio_buffer) == int(0.9 * SAMPLE_RATE)
+
+    # The next window starts after "there".
+    await send(stt, utterance(1.0, silence_sec=0))
+    await wait_for_requests(transcriptions, 3)
+    assert transcriptions.requests[2]["prompt"] == "hello there"
+    await transcriptions.answer_words(("general", 0.2, 0.7), ("kenobi", 0.9, 1.5))
+    result = await asyncio.wait_for(anext(results), timeout=1)
+    assert (result.text, result.start_time) == ("general", pytest.approx(1.3))
+
+    # At the end of the utterance, only the rest is transcribed.
+    await send(stt, np.zeros(int(2.2 * SAMPLE_RATE), dtype=np.float32))
+    await wait_for_requests(transcriptions, 4)
+    assert transcriptions.requests[3]["response_format"] == "text"
+    assert transcriptions.requests[3]["prompt"] == "hello there general"
+    await transcriptions.answers.put("kenobi")
+    result = await asyncio.wait_for(anext(results), timeout=1)
+    assert result.text == "kenobi"
+    assert stt.stabilizer.confirmed == []
+
+    await stt.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_noise_is_not_transcribed():
+    stt, transcriptions = make_stt(partial_interval_sec=1.0)
+    stt.vad = FeatureVAD(SAMPLE_RATE)
+
+    rng = np.random.default_rng(0)
+    noise = (0.05 * rng.standard_normal(10 * SAMPLE_RATE)).astype(np.float32)
+    await send(stt, noise)
+
+    assert not stt.is_processing and transcriptions.requests == []
+    # Only the audio that may be the start of an utterance is kept.
+    assert len(stt.audio_buffer) <= SAMPLE_RATE
+    assert stt.pause_prediction.value > 0.9
+
+
+@pytest.mark.asyncio
+async def test_flush_transcribes_without_waiting_for_silence():
+    stt, transcriptions = make_stt(partial_interval_sec=1.0)
+    handled = []
+
+    async def consume():
+        async for result in stt:
+            handled.append(result.text)
+
+    consumer = asyncio.create_task(consume())
+
+    # A partial transcription is running when the flush starts.
+    await send(stt, utterance(1.0, silence_sec=0.2))
+    await wait_for_requests(transcriptions, 1)
+    flush = await stt.flush()
+    await transcriptions.answer_words(("hello", 0.2, 0.6))
+
+    # Then the whole utterance is transcribed.
+    await wait_for_requests(transcriptions, 2)
+    assert transcriptions.requests[1]["response_format"] == "text"
+    assert not flush.done()
+    await transcriptions.answers.put("hello there")
+
+    await asyncio.wait_for(flush, timeout=1)
+    # Resolved after the consumer got the transcription.
+    assert handled == ["hello there"]
+    assert stt.utterance_speech_sec == 0
+
+    # Nothing to transcribe.
+    await asyncio.wait_for(await stt.flush(), timeout=1)
+    assert len(transcriptions.requests) == 2
+
+    await stt.shutdown()
+    await consumer
+
+
+@pytest.mark.asyncio
+async def test_whisper_turn_spans():
+    stt, transcriptions = make_stt()
+    results = aiter(stt)
+
+    # Ended by the pause.
+    await send(stt, utterance(1.0))
+    await wait_for_requests(transcriptions, 1)
+    await transcriptions.answers.put("hello there")
+    result = await asyncio.wait_for(anext(results), timeout=1)
+    trace = TurnTrace(trigger="pause")
+    record_transcription_spans(trace, result)
+
+    pause, transcript = trace.spans["stt.pause"], trace.spans["stt.transcript"]
+    assert pause.end_ns == transcript.start_ns
+    # The trace was started after the pause, but the turn started with it.
+    assert trace.root.start_ns == pause.start_ns
+    assert not stt.has_speech
+    assert transcript.end_ns is not None and transcript.end_ns >= transcript.start_ns
+
+    # Ended by the button, before the pause.
+    await send(stt, utterance(1.0, silence_sec=0.2))
+    assert stt.has_speech
+    flush = await stt.flush()
+    await wait_for_requests(transcriptions, 2)
+    await transcriptions.answers.put("general Kenobi")
+    result = await asyncio.wait_for(anext(results), timeout=1)
+    trace = TurnTrace(trigger="cordino_tirato")
+    record_transcription_spans(trace, result)
+    assert trace.spans.keys() == {"stt.pause", "stt.transcript"}
+    assert trace.spans["stt.pause"].start_ns >= pause.end_ns
+    assert trace.root.start_ns <= trace.spans["stt.pause"].start_ns
+
+    await stt.shutdown()
+    assert [result async for result in results] == []
+    assert flush.done()
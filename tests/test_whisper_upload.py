@@ -0,0 +1,52 @@
+import numpy as np
+import sphn
+
+from unmute.stt.audio_ring_buffer import AudioRingBuffer
+from unmute.stt.whisper_upload import (
+    SILENCE_PADDING_SEC,
+    prepare_upload,
+    trim_silence,
+)
+
+SAMPLE_RATE = 24000
+
+
+def make_utterance() -> np.ndarray:
+    silence = np.zeros(SAMPLE_RATE, dtype=np.float32)
+    t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+    tone = (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    return np.concatenate([silence, tone, silence])
+
+
+def test_trim_silence():
+    trimmed = trim_silence(make_utterance(), SAMPLE_RATE, threshold=0.02)
+    expected = SAMPLE_RATE * (1 + 2 * SILENCE_PADDING_SEC)
+    assert abs(len(trimmed) - expected) <= SAMPLE_RATE * 0.02
+
+    assert len(trim_silence(np.zeros(1000, np.float32), SAMPLE_RATE, 0.02)) == 0
+
+
+def test_prepare_upload_opus():
+    # Also check that the read-only view of the ring buffer is accepted
+    buffer = AudioRingBuffer(4 * SAMPLE_RATE)
+    buffer.append(make_utterance())
+
+    upload = prepare_upload(buffer.view(), SAMPLE_RATE, silence_threshold=0.02)
+    assert upload is not None
+    filename, content, content_type = upload
+    assert filename.endswith(".ogg") and content_type == "audio/ogg"
+    assert content.startswith(b"OggS")
+
+    decoded, decoded_sample_rate = sphn.read_opus_bytes(content)
+    duration_sec = decoded.shape[-1] / decoded_sample_rate
+    assert 1.3 < duration_sec < 1.6
+
+
+def test_prepare_upload_wav_and_silence():
+    upload = prepare_upload(make_utterance(), SAMPLE_RATE, 0.02, format="wav")
+    assert upload is not None
+    # 16 kHz 16-bit mono, about 1.4 s
+    assert 40_000 < len(upload[1]) < 50_000
+
+    silence = np.zeros(SAMPLE_RATE, dtype=np.float32)
+    assert prepare_upload(silence, SAMPLE_RATE, 0.02) is None
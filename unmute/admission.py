@@ -0,0 +1,127 @@
+"""Admission control for `/v1/realtime` sessions.
+
+A worker only handles `capacity` sessions at once. Clients beyond that wait in a bounded
+FIFO waiting room and get told their position and an estimated wait. If the waiting room
+is full, or a client waited for too long, it's rejected right away with
+`ServerAtCapacity` instead of hanging.
+"""
+
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable
+
+from unmute import metrics as mt
+from unmute.exceptions import ServerAtCapacity
+from unmute.timer import Stopwatch
+
+# Called with the position in the waiting room (1 = next in line) and the estimated
+# wait in seconds, if we have an estimate.
+WaitingRoomCallback = Callable[[int, float | None], Awaitable[None]]
+
+# Weight of the newest session in the average session duration used for the estimate.
+SESSION_DURATION_EMA_ALPHA = 0.1
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        capacity: int,
+        max_waiting: int,
+        max_wait_sec: float,
+        update_interval_sec: float = 2.0,
+    ):
+        self.capacity = capacity
+        self.max_waiting = max_waiting
+        self.max_wait_sec = max_wait_sec
+        self.update_interval_sec = update_interval_sec
+
+        self.active = 0
+        self.waiting: deque[asyncio.Future[None]] = deque()
+        self.avg_session_sec: float | None = None
+
+    def estimate_wait_sec(self, position: int) -> float | None:
+        if self.avg_session_sec is None:
+            return None
+        return position * self.avg_session_sec / self.capacity
+
+    @asynccontextmanager
+    async def admit(self, on_update: WaitingRoomCallback) -> AsyncIterator[None]:
+        """Hold a session slot for the duration of the context.
+
+        Raises:
+            ServerAtCapacity: if the waiting room is full or the wait is too long.
+        """
+        waited = self.active >= self.capacity or bool(self.waiting)
+        if waited:
+            await self._wait_in_line(on_update)
+        else:
+            self.active += 1
+
+        session_stopwatch = Stopwatch()
+        try:
+            if waited:
+                await on_update(0, 0.0)  # Position 0 means admitted.
+            yield
+        finally:
+            self._record_session_duration(session_stopwatch.time())
+            self._release()
+
+    async def _wait_in_line(self, on_update: WaitingRoomCallback):
+        if len(self.waiting) >= self.max_waiting:
+            mt.WAITING_ROOM_REJECTIONS.inc()
+            raise ServerAtCapacity(
+                "waiting_room_full",
+                "Too many people are connected right now. Please try again later.",
+            )
+
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self.waiting.append(future)
+        mt.WAITING_ROOM_LENGTH.set(len(self.waiting))
+        wait_stopwatch = Stopwatch()
+
+        try:
+            while not future.done():
+                remaining_sec = self.max_wait_sec - wait_stopwatch.time()
+                if remaining_sec <= 0:
+                    mt.WAITING_ROOM_TIMEOUTS.inc()
+                    raise ServerAtCapacity(
+                        "waiting_room_timeout",
+                        "Waited too long for a free spot. Please try again later.",
+                    )
+
+                position = self.waiting.index(future) + 1
+                await on_update(position, self.estimate_wait_sec(position))
+                # Doesn't cancel the future on timeout.
+                await asyncio.wait(
+                    [future], timeout=min(self.update_interval_sec, remaining_sec)
+                )
+        except BaseException:
+            if future in self.waiting:
+                self.waiting.remove(future)
+            elif future.done() and not future.cancelled():
+                # We were handed a slot but won't use it, pass it on.
+                self._release()
+            raise
+        finally:
+            mt.WAITING_ROOM_LENGTH.set(len(self.waiting))
+            mt.WAITING_ROOM_WAIT_TIME.observe(wait_stopwatch.time())
+
+    def _release(self):
+        # Hand the slot over directly so that nobody can jump the line.
+        while self.waiting:
+            future = self.waiting.popleft()
+            if not future.done():
+                future.set_result(None)
+                mt.WAITING_ROOM_LENGTH.set(len(self.waiting))
+                return
+
+        self.active -= 1
+
+    def _record_session_duration(self, duration_sec: float):
+        if self.avg_session_sec is None:
+            self.avg_session_sec = duration_sec
+        else:
+            self.avg_session_sec += SESSION_DURATION_EMA_ALPHA * (
+                duration_sec - self.avg_session_sec
+            )
@@ -0,0 +1,75 @@
+"""Binary WebSocket framing for the audio of `/v1/realtime`.
+
+With the default "realtime" subprotocol, audio travels as base64 inside JSON events
+(`input_audio_buffer.append` and `response.audio.delta`). If the client offers
+`BINARY_SUBPROTOCOL` instead, Opus data is sent as raw binary WebSocket frames and only
+the control events stay JSON text frames.
+
+A binary frame is a single header byte giving the kind of frame, followed by the Opus
+(OGG page) bytes:
+
+    | kind (1 byte) | opus bytes ... |
+"""
+
+from typing import Literal
+
+REALTIME_SUBPROTOCOL = "realtime"
+BINARY_SUBPROTOCOL = "unmute-binary-v1"
+
+# Client -> server, equivalent of `input_audio_buffer.append`.
+INPUT_AUDIO = 0x01
+# Server -> client, equivalent of `response.audio.delta`.
+OUTPUT_AUDIO = 0x02
+
+FrameKind = Literal[0x01, 0x02]
+
+# Offset of the header type flag in an Ogg page, bit 2 marks the first page of a stream.
+# Payloads must at least reach it.
+OGG_HEADER_TYPE_OFFSET = 5
+OGG_FIRST_PAGE_FLAG = 2
+
+_HEADERS: dict[int, bytes] = {
+    INPUT_AUDIO: bytes((INPUT_AUDIO,)),
+    OUTPUT_AUDIO: bytes((OUTPUT_AUDIO,)),
+}
+
+
+def choose_subprotocol(offered: list[str]) -> str:
+    """Pick the subprotocol to accept given the ones the client offered.
+
+    We always answer with one of our protocols even if the client didn't offer any,
+    to keep the behavior of clients that don't set subprotocols at all.
+    """
+    if BINARY_SUBPROTOCOL in offered:
+        return BINARY_SUBPROTOCOL
+    return REALTIME_SUBPROTOCOL
+
+
+def encode_audio_frame(kind: FrameKind, opus_bytes: bytes) -> bytes:
+    return _HEADERS[kind] + opus_bytes
+
+
+def decode_audio_frame(data: bytes) -> tuple[int, bytes]:
+    """Split a binary frame into its kind and its Opus payload.
+
+    Raises:
+        ValueError: if the frame is empty, of an unknown kind or too short to hold an
+            Ogg page.
+    """
+    if not data:
+        raise ValueError("Empty binary frame")
+
+    kind = data[0]
+    if kind not in _HEADERS:
+        raise ValueError(f"Unknown binary frame kind: {kind:#04x}")
+    if len(data) - 1 <= OGG_HEADER_TYPE_OFFSET:
+        raise ValueError(f"Binary frame too short: {len(data)} bytes")
+
+    return kind, data[1:]
+
+
+def is_first_ogg_page(opus_bytes: bytes) -> bool:
+    return (
+        len(opus_bytes) > OGG_HEADER_TYPE_OFFSET
+        and opus_bytes[OGG_HEADER_TYPE_OFFSET] & OGG_FIRST_PAGE_FLAG != 0
+    )
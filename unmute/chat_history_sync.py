@@ -0,0 +1,105 @@
+"""Incremental, versioned updates of the chat history sent to the client.
+
+Sending the whole chat history in every debug update makes the payload grow with the
+length of the conversation. Instead, every change of the history gets a new version
+and the client only receives the messages that changed since the last version it
+acknowledged with `unmute.chat_history.ack`. A client that never acknowledges anything
+gets the changes since the last update that was sent, because the WebSocket delivers
+messages in order.
+
+An update is applied by truncating the history to `length` messages, then for each
+message update, keeping the first `offset` characters of the message's content and
+appending `content`. Messages only grow in practice, so an update is usually just the
+new words. Updates are idempotent: applying one on top of a newer history gives the same
+result, so the client can apply any update whose `base_version` is at most its own
+version. If it missed one, it sends `unmute.chat_history.resync` to get a full
+snapshot, which has no `base_version`.
+"""
+
+import unmute.openai_realtime_api_events as ora
+
+# How many unacknowledged versions to remember before falling back to a full snapshot.
+MAX_PENDING_VERSIONS = 32
+
+Snapshot = list[tuple[str, str]]  # (role, content) of each message
+
+
+class ChatHistorySync:
+    def __init__(self):
+        self.version = 0
+        self.last_sent: Snapshot | None = None
+        # Versions sent but not yet acknowledged, to diff against once they are.
+        self.pending: dict[int, Snapshot] = {}
+        self.acked_version: int | None = None
+        self.acked: Snapshot | None = None
+
+    def make_update(
+        self, chat_history: list[dict[str, str]]
+    ) -> ora.UnmuteChatHistoryUpdate | None:
+        """The update to send to the client, or None if nothing changed."""
+        snapshot = [(m["role"], m["content"]) for m in chat_history]
+        if snapshot == self.last_sent:
+            return None
+
+        if self.acked is not None:
+            base_version, base = self.acked_version, self.acked
+        elif self.last_sent is not None:
+            base_version, base = self.version, self.last_sent
+        else:
+            base_version, base = None, []
+
+        self.version += 1
+        self.last_sent = snapshot
+        self.pending[self.version] = snapshot
+        if len(self.pending) > MAX_PENDING_VERSIONS:
+            # The client doesn't seem to acknowledge, stop diffing against old versions.
+            self.pending.clear()
+            self.acked_version = self.acked = None
+
+        return ora.UnmuteChatHistoryUpdate(
+            version=self.version,
+            base_version=base_version,
+            length=len(snapshot),
+            messages=diff_chat_history(base, snapshot),
+        )
+
+    def ack(self, version: int):
+        snapshot = self.pending.get(version)
+        if snapshot is None:
+            return  # Too old, or already acknowledged
+
+        self.acked_version, self.acked = version, snapshot
+        self.pending = {v: s for v, s in self.pending.items() if v > version}
+
+    def resync(self):
+        """Make the next update a full snapshot, even if nothing changed."""
+        self.last_sent = None
+        self.pending.clear()
+        self.acked_version = self.acked = None
+
+
+def diff_chat_history(
+    old: Snapshot, new: Snapshot
+) -> list[ora.UnmuteChatMessageUpdate]:
+    updates = []
+    for index, (role, content) in enumerate(new):
+        if index < len(old):
+            old_role, old_content = old[index]
+            if old_role == role and old_content == content:
+                continue
+            if old_role == role and content.startswith(old_content):
+                updates.append(
+                    ora.UnmuteChatMessageUpdate(
+                        index=index,
+                        role=role,
+                        offset=len(old_content),
+                        content=content[len(old_content) :],
+                    )
+                )
+                continue
+
+        updates.append(
+            ora.UnmuteChatMessageUpdate(index=index, role=role, content=content)
+        )
+
+    return updates
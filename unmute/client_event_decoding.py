@@ -0,0 +1,33 @@
+"""Fast path for the most frequent client event, `input_audio_buffer.append`.
+
+Validating every incoming message against the `ClientEvent` union with pydantic is
+wasteful when almost all of them are audio. Here we only parse the JSON and pick out
+the audio. Anything else returns None and should go through the full validation.
+
+See `unmute/scripts/benchmark_client_events.py` for the numbers.
+"""
+
+from pydantic_core import from_json
+
+INPUT_AUDIO_BUFFER_APPEND = "input_audio_buffer.append"
+
+
+def extract_input_audio(message_raw: str | bytes) -> str | None:
+    """Return the base64 audio if the message is an `input_audio_buffer.append`.
+
+    Returns None for other events and for invalid messages, so that the caller can
+    validate them properly and report errors.
+    """
+    try:
+        data = from_json(message_raw)
+    except ValueError:
+        return None
+
+    if not isinstance(data, dict) or data.get("type") != INPUT_AUDIO_BUFFER_APPEND:
+        return None
+
+    audio = data.get("audio")
+    if not isinstance(audio, str):
+        return None
+
+    return audio
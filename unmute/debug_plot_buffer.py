@@ -0,0 +1,84 @@
+"""Fixed-size storage for the debug plot of `UnmuteHandler`.
+
+The handler records the input amplitude and the pause prediction for every frame it
+receives. Keeping them as a list of dicts grows without bound over a long session, so
+instead they're stored in preallocated arrays used as a ring buffer. Frames are
+decimated: one point is stored per `decimation` frames, with the RMS amplitude over
+all of them. Memory per session is constant no matter how long it lasts.
+"""
+
+import numpy as np
+
+
+class DebugPlotBuffer:
+    """Ring buffer of (time, amplitude, pause prediction) points.
+
+    Args:
+        capacity: How many points to keep. Older points are overwritten.
+        decimation: How many frames are aggregated into a single point.
+    """
+
+    def __init__(self, capacity: int, decimation: int = 1):
+        if capacity <= 0 or decimation <= 0:
+            raise ValueError("capacity and decimation must be positive")
+
+        self.capacity = capacity
+        self.decimation = decimation
+
+        self.t = np.zeros(capacity, dtype=np.float64)
+        self.amplitude = np.zeros(capacity, dtype=np.float32)
+        self.pause_prediction = np.zeros(capacity, dtype=np.float32)
+        self.n_points = 0  # Total number of points ever written
+
+        # Accumulators of the point being decimated.
+        self._frames = 0
+        self._sum_squares = 0.0
+        self._n_samples = 0
+
+    def add(self, t: float, audio: np.ndarray, pause_prediction: float):
+        """Record a frame of float32 audio received at time `t`."""
+        # `dot` avoids allocating a temporary array, unlike `(audio**2).mean()`.
+        self._sum_squares += float(np.dot(audio, audio))
+        self._n_samples += audio.shape[0]
+        self._frames += 1
+        if self._frames < self.decimation:
+            return
+
+        i = self.n_points % self.capacity
+        self.t[i] = t
+        self.amplitude[i] = np.sqrt(self._sum_squares / max(self._n_samples, 1))
+        self.pause_prediction[i] = pause_prediction
+        self.n_points += 1
+
+        self._frames = 0
+        self._sum_squares = 0.0
+        self._n_samples = 0
+
+    def __len__(self) -> int:
+        return min(self.n_points, self.capacity)
+
+    def _ordered(self, array: np.ndarray) -> np.ndarray:
+        if self.n_points <= self.capacity:
+            return array[: self.n_points]
+        start = self.n_points % self.capacity
+        return np.concatenate([array[start:], array[:start]])
+
+    def snapshot(self, since: float | None = None) -> list[dict]:
+        """The stored points from oldest to newest, optionally only after `since`.
+
+        This is the format of `GradioUpdate.debug_plot_data`.
+        """
+        t = self._ordered(self.t)
+        amplitude = self._ordered(self.amplitude)
+        pause_prediction = self._ordered(self.pause_prediction)
+
+        first = 0 if since is None else int(np.searchsorted(t, since, side="right"))
+        return [
+            {"t": t_i, "amplitude": amplitude_i, "pause_prediction": pause_i}
+            for t_i, amplitude_i, pause_i in zip(
+                t[first:].tolist(),
+                amplitude[first:].tolist(),
+                pause_prediction[first:].tolist(),
+                strict=True,
+            )
+        ]
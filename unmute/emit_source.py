@@ -0,0 +1,80 @@
+"""Wait for the next thing to send to the client without polling.
+
+The emit loop has several sources: the handler's output queue, the emit queue filled by
+the receive loop, and periodic debug updates. Waiting on each of them with a timeout
+means every session wakes up many times per second even when idle. Instead, all the
+queues set a shared `asyncio.Event` when something is put in them, and `EmitSource`
+sleeps on that event until something is ready or the debug timer is due.
+"""
+
+import asyncio
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class SignalingQueue(asyncio.Queue[T]):
+    """An `asyncio.Queue` that sets `ready` whenever an item is put into it."""
+
+    def __init__(self, ready: asyncio.Event, maxsize: int = 0):
+        super().__init__(maxsize)
+        self.ready = ready
+
+    def _put(self, item: T) -> None:
+        super()._put(item)  # type: ignore - private but meant to be overridden
+        self.ready.set()
+
+
+class EmitSource(Generic[T]):
+    """Merge several queues and a timer into a single prioritized source.
+
+    Args:
+        get_queues: Returns the queues to read from, highest priority first. It's a
+            callable because queues can be swapped, e.g. on interruption.
+        ready: The event that the queues set when an item is put in them.
+        timer_interval_sec: How often to call `on_timer`.
+        on_timer: Called when the timer is due. Can return an item to emit, or None.
+    """
+
+    def __init__(
+        self,
+        get_queues: Callable[[], list[asyncio.Queue]],
+        ready: asyncio.Event,
+        timer_interval_sec: float,
+        on_timer: Callable[[], T | None],
+    ):
+        self.get_queues = get_queues
+        self.ready = ready
+        self.timer_interval_sec = timer_interval_sec
+        self.on_timer = on_timer
+        self.next_timer_time = asyncio.get_running_loop().time() + timer_interval_sec
+
+    def get_nowait(self) -> T | None:
+        for queue in self.get_queues():
+            try:
+                return queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+
+        now = asyncio.get_running_loop().time()
+        if now >= self.next_timer_time:
+            self.next_timer_time = now + self.timer_interval_sec
+            return self.on_timer()
+
+        return None
+
+    async def get(self) -> T:
+        """Wait until an item is available."""
+        while True:
+            item = self.get_nowait()
+            if item is not None:
+                return item
+
+            # No await between checking the queues and clearing, so no lost wakeups.
+            self.ready.clear()
+            delay = self.next_timer_time - asyncio.get_running_loop().time()
+            try:
+                async with asyncio.timeout(max(delay, 0)):
+                    await self.ready.wait()
+            except TimeoutError:
+                pass
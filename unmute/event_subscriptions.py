@@ -0,0 +1,148 @@
+"""Let clients choose which server events they receive.
+
+By default a client gets every server event, including verbose debug ones. A client
+can instead list the event types it wants in `session.update`, under
+`session.event_subscriptions`. Entries are either event types, e.g.
+`"response.audio.delta"`, or the name of one of the `EVENT_GROUPS`, e.g. `"audio"`.
+
+Events the client didn't subscribe to are not sent, and when possible not even built:
+the handler asks `EventFilter.wants()` before producing verbose events. Errors and the
+replies to the client's own requests are always sent.
+"""
+
+from typing import get_args
+
+import unmute.openai_realtime_api_events as ora
+from unmute import metrics as mt
+
+
+def _event_type(event_class: type[ora.BaseEvent]) -> str:
+    literal = event_class.model_fields["type"].annotation
+    assert literal is not None
+    return get_args(literal)[0]
+
+
+SERVER_EVENT_TYPES = frozenset(_event_type(cls) for cls in get_args(ora.ServerEvent))
+
+ALWAYS_SENT = frozenset(["error", "session.updated", "unmute.waiting_room.update"])
+
+EVENT_GROUPS: dict[str, frozenset[str]] = {
+    "audio": frozenset(["response.audio.delta", "response.audio.done"]),
+    "text": frozenset(
+        [
+            "response.text.delta",
+            "response.text.done",
+            "unmute.response.text.delta.ready",
+        ]
+    ),
+    "transcription": frozenset(["conversation.item.input_audio_transcription.delta"]),
+    "vad": frozenset(
+        [
+            "input_audio_buffer.speech_started",
+            "input_audio_buffer.speech_stopped",
+            "unmute.interrupted_by_vad",
+        ]
+    ),
+    "response": frozenset(["response.created", "unmute.response.audio.delta.ready"]),
+    "chat_history": frozenset(["unmute.chat_history.update"]),
+    "debug": frozenset(["unmute.additional_outputs"]),
+    "bambola": frozenset(
+        [
+            "unmute.bambola.buffer_ready",
+            "unmute.bambola.playback_started",
+            "unmute.bambola.playback_completed",
+        ]
+    ),
+}
+
+# Weight of the newest event in the average size of the events of a given type.
+SIZE_EMA_ALPHA = 0.05
+
+
+class EventSizeEstimator:
+    """Average serialized size of each event type, from the events actually sent.
+
+    Used to estimate how many bytes were saved by not sending an event, without paying
+    for serializing it.
+    """
+
+    def __init__(self):
+        self.sizes: dict[str, float] = {}
+        # Audio events don't map to what's filtered: the PCM chunks before encoding.
+        self.audio_bytes_per_sample: float | None = None
+
+    def observe(self, event_type: str, size: int):
+        previous = self.sizes.get(event_type)
+        if previous is None:
+            self.sizes[event_type] = size
+        else:
+            self.sizes[event_type] = previous + SIZE_EMA_ALPHA * (size - previous)
+
+    def estimate(self, event_type: str) -> float:
+        return self.sizes.get(event_type, 0.0)
+
+    def observe_audio(self, n_samples: int, size: int):
+        """`size` bytes were sent for the encoding of `n_samples` of PCM."""
+        ratio = size / n_samples
+        previous = self.audio_bytes_per_sample
+        if previous is None:
+            self.audio_bytes_per_sample = ratio
+        else:
+            self.audio_bytes_per_sample = previous + SIZE_EMA_ALPHA * (ratio - previous)
+
+    def estimate_audio(self, n_samples: int) -> float:
+        return n_samples * (self.audio_bytes_per_sample or 0.0)
+
+
+# Shared by all the sessions of the process.
+EVENT_SIZES = EventSizeEstimator()
+
+
+class EventFilter:
+    def __init__(self, allowed: frozenset[str] | None = None):
+        """Allow only the given event types, or everything if None."""
+        self.allowed = allowed
+
+    @classmethod
+    def from_subscriptions(cls, subscriptions: list[str]) -> "EventFilter":
+        """Raises ValueError for names that are neither event types nor groups."""
+        allowed = set(ALWAYS_SENT)
+        unknown = []
+        for name in subscriptions:
+            if name in EVENT_GROUPS:
+                allowed |= EVENT_GROUPS[name]
+            elif name in SERVER_EVENT_TYPES:
+                allowed.add(name)
+            else:
+                unknown.append(name)
+
+        if unknown:
+            raise ValueError(
+                f"Unknown event types or groups: {unknown}. "
+                f"Groups: {sorted(EVENT_GROUPS)}. Types: {sorted(SERVER_EVENT_TYPES)}."
+            )
+        return cls(frozenset(allowed))
+
+    def wants(self, event_type: str) -> bool:
+        """Whether to send events of this type. Counts the skipped ones."""
+        if self.allowed is None or event_type in self.allowed:
+            return True
+
+        mt.EVENTS_FILTERED.labels(type=event_type).inc()
+        mt.EVENT_BYTES_SAVED.inc(EVENT_SIZES.estimate(event_type))
+        return False
+
+    def wants_audio(self, n_samples: int) -> bool:
+        """Whether to encode and send this PCM. Counts the bytes it would have taken.
+
+        Not counted in `EVENTS_FILTERED`: the encoder doesn't output an event for every
+        chunk of PCM.
+        """
+        if self.allowed is None or "response.audio.delta" in self.allowed:
+            return True
+
+        mt.EVENT_BYTES_SAVED.inc(EVENT_SIZES.estimate_audio(n_samples))
+        return False
+
+
+ALL_EVENTS = EventFilter()
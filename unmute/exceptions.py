@@ -17,10 +17,19 @@ class MissingServiceTimeout(Exception):
         super().__init__(f"{service} timed out.")
 
 
+class ServerAtCapacity(Exception):
+    """This server can't take another session right now."""
+
+    def __init__(self, code: str, message: str):
+        self.code = code
+        self.message = message
+        super().__init__(message)
+
+
 class WebSocketClosedError(Exception):
     """Remote web socket is closed, let's move on."""
 
 
-def make_ora_error(type: str, message: str) -> ora.Error:
-    details = ora.ErrorDetails(type=type, message=message)
+def make_ora_error(type: str, message: str, code: str | None = None) -> ora.Error:
+    details = ora.ErrorDetails(type=type, message=message, code=code)
     return ora.Error(error=details)
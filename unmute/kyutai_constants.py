@@ -32,9 +32,65 @@ RECORDINGS_DIR = Path(_recordings_dir) if _recordings_dir else None
 # Also checked on the frontend, see constant of the same name
 MAX_VOICE_FILE_SIZE_MB = 4
 
+# How many sessions a single backend process handles at once. When running several
+# processes with `unmute.prefork`, this is set for each worker from the total.
+MAX_CLIENTS_PER_WORKER = int(os.environ.get("KYUTAI_MAX_CLIENTS_PER_WORKER", "4"))
+# Clients beyond that wait in line, up to this many and for at most this long.
+MAX_WAITING_CLIENTS_PER_WORKER = int(
+    os.environ.get("KYUTAI_MAX_WAITING_CLIENTS_PER_WORKER", "8")
+)
+MAX_WAITING_TIME_SEC = float(os.environ.get("KYUTAI_MAX_WAITING_TIME_SEC", "120"))
+
+# TTS connections kept ready for each voice in use, see `unmute.tts.tts_pool`.
+# Each one holds a slot on the TTS server. 0 to disable.
+TTS_POOL_SIZE = int(os.environ.get("KYUTAI_TTS_POOL_SIZE", "1"))
+TTS_POOL_MAX_IDLE_SEC = float(os.environ.get("KYUTAI_TTS_POOL_MAX_IDLE_SEC", "60"))
+TTS_POOL_VOICE_TTL_SEC = float(os.environ.get("KYUTAI_TTS_POOL_VOICE_TTL_SEC", "300"))
+# Get a TTS connection and the LLM connection ready as soon as the user seems to be
+# done speaking, see `unmute.speculation`.
+SPECULATIVE_TURNS = os.environ.get("KYUTAI_SPECULATIVE_TURNS", "0") == "1"
+
+# Threads dedicated to Opus encoding/decoding, shared by all sessions of a process.
+OPUS_CODEC_WORKERS = int(os.environ.get("KYUTAI_OPUS_CODEC_WORKERS", "2"))
+
+# Per-turn latency traces, see `unmute.tracing`.
+TRACES_MAX_STORED = int(os.environ.get("KYUTAI_TRACES_MAX_STORED", "200"))
+_traces_file = os.environ.get("KYUTAI_TRACES_FILE")
+TRACES_FILE = Path(_traces_file) if _traces_file else None
+# An OTLP/HTTP collector, e.g. http://localhost:4318/v1/traces
+TRACES_OTLP_ENDPOINT = os.environ.get("KYUTAI_TRACES_OTLP_ENDPOINT")
+
+# Speech-to-text for WhisperSTT: "openai" for the hosted Whisper API, "local" to run
+# Whisper on the CPU with faster-whisper, see `unmute.stt.transcriber`.
+STT_BACKEND = os.environ.get("KYUTAI_STT_BACKEND", "openai")
+# A faster-whisper model name like "small" or "large-v3", or a path to a model.
+LOCAL_STT_MODEL = os.environ.get("KYUTAI_LOCAL_STT_MODEL", "small")
+# None to detect the language of each utterance.
+LOCAL_STT_LANGUAGE = os.environ.get("KYUTAI_LOCAL_STT_LANGUAGE")
+# Utterances of different sessions transcribed together.
+LOCAL_STT_MAX_BATCH_SIZE = int(os.environ.get("KYUTAI_LOCAL_STT_MAX_BATCH_SIZE", "8"))
+# 0 to use all the cores.
+LOCAL_STT_CPU_THREADS = int(os.environ.get("KYUTAI_LOCAL_STT_CPU_THREADS", "0"))
+# While the user speaks, transcribe the utterance so far every this many seconds of
+# audio, see `unmute.stt.partial_transcription`. Off if unset: with the hosted API,
+# each one is an extra paid request that competes with the final transcriptions.
+_stt_partial_interval_sec = os.environ.get("KYUTAI_STT_PARTIAL_INTERVAL_SEC")
+STT_PARTIAL_INTERVAL_SEC = (
+    float(_stt_partial_interval_sec) if _stt_partial_interval_sec else None
+)
+# Limits of the Whisper API requests of a process, see `unmute.stt.whisper_client`.
+WHISPER_MAX_CONCURRENT_REQUESTS = int(
+    os.environ.get("KYUTAI_WHISPER_MAX_CONCURRENT_REQUESTS", "16")
+)
+WHISPER_REQUESTS_PER_SEC = float(os.environ.get("KYUTAI_WHISPER_REQUESTS_PER_SEC", "8"))
+WHISPER_MAX_RETRIES = int(os.environ.get("KYUTAI_WHISPER_MAX_RETRIES", "3"))
+WHISPER_TIMEOUT_SEC = float(os.environ.get("KYUTAI_WHISPER_TIMEOUT_SEC", "30"))
 
 SAMPLE_RATE = 24000
 SAMPLES_PER_FRAME = 1920
 FRAME_TIME_SEC = SAMPLES_PER_FRAME / SAMPLE_RATE  # 0.08
 # TODO: make it so that we can read this from the ASR server?
 STT_DELAY_SEC = 0.5
+# "list", or "float32"/"int16" if the STT server accepts binary PCM, see
+# `unmute.stt.speech_to_text.STTPcmFormat`.
+STT_PCM_FORMAT = os.environ.get("KYUTAI_STT_PCM_FORMAT", "list")
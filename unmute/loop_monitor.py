@@ -0,0 +1,133 @@
+"""Process-wide monitoring of the asyncio event loop.
+
+When a worker is overloaded, the first thing to degrade is the event loop's lag: audio
+frames get sent late and the client hears choppy audio. `LoopMonitor` runs once per
+process and:
+
+- measures how late a periodic tick wakes up compared to when it was scheduled, and
+  exports it as a histogram;
+- detects callbacks that block the loop for too long. A watchdog thread notices that
+  the tick stopped and logs the stack of the event loop thread at that moment, which
+  points at the culprit;
+- periodically counts the tasks by name, to spot leaks.
+"""
+
+import asyncio
+import logging
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+from unmute import metrics as mt
+
+logger = logging.getLogger(__name__)
+
+# "Task-123" -> "Task", so that unnamed tasks don't blow up the metric cardinality.
+_TASK_NUMBER_RE = re.compile(r"-\d+$")
+
+
+def count_tasks_by_name() -> Counter[str]:
+    return Counter(
+        _TASK_NUMBER_RE.sub("", task.get_name()) for task in asyncio.all_tasks()
+    )
+
+
+class LoopMonitor:
+    """Measure the lag of the running event loop. Use as an async context manager.
+
+    Args:
+        tick_interval_sec: How often to measure the lag.
+        slow_callback_sec: Lag above which the loop is considered blocked.
+        task_count_interval_sec: How often to count the tasks.
+    """
+
+    def __init__(
+        self,
+        tick_interval_sec: float = 0.1,
+        slow_callback_sec: float = 0.1,
+        task_count_interval_sec: float = 10.0,
+    ):
+        self.tick_interval_sec = tick_interval_sec
+        self.slow_callback_sec = slow_callback_sec
+        self.task_count_interval_sec = task_count_interval_sec
+
+        self.last_tick = time.monotonic()
+        self.task: asyncio.Task[None] | None = None
+        self.loop_thread_id: int | None = None
+        self.stop_watchdog = threading.Event()
+        self.watchdog: threading.Thread | None = None
+        self.task_names: set[str] = set()
+
+    async def __aenter__(self) -> "LoopMonitor":
+        self.loop_thread_id = threading.get_ident()
+        self.last_tick = time.monotonic()
+        self.task = asyncio.create_task(self._run(), name="loop_monitor")
+        self.watchdog = threading.Thread(
+            target=self._watch, name="loop-monitor-watchdog", daemon=True
+        )
+        self.watchdog.start()
+        return self
+
+    async def __aexit__(self, *exc: object):
+        self.stop_watchdog.set()
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        if self.watchdog is not None:
+            self.watchdog.join()
+
+    async def _run(self):
+        last_task_count = time.monotonic()
+        while True:
+            expected = time.monotonic() + self.tick_interval_sec
+            await asyncio.sleep(self.tick_interval_sec)
+            now = time.monotonic()
+            self.last_tick = now
+
+            lag = max(0.0, now - expected)
+            mt.EVENT_LOOP_LAG.observe(lag)
+            if lag >= self.slow_callback_sec:
+                mt.EVENT_LOOP_SLOW_CALLBACKS.inc()
+                mt.EVENT_LOOP_SLOW_CALLBACK_DURATION.observe(lag)
+
+            if now - last_task_count >= self.task_count_interval_sec:
+                last_task_count = now
+                self._update_task_counts()
+
+    def _update_task_counts(self):
+        counts = count_tasks_by_name()
+        # Reset the names that disappeared, otherwise they'd be stuck at their last value
+        for name in self.task_names - counts.keys():
+            mt.EVENT_LOOP_TASKS.labels(name=name).set(0)
+        for name, count in counts.items():
+            mt.EVENT_LOOP_TASKS.labels(name=name).set(count)
+        self.task_names = set(counts)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Running tasks: {sum(counts.values())} {dict(counts)}")
+
+    def _watch(self):
+        """Runs on its own thread, so it keeps going while the loop is blocked."""
+        reported_tick = None
+
+        while not self.stop_watchdog.wait(self.slow_callback_sec / 2):
+            last_tick = self.last_tick
+            # A healthy loop ticks every `tick_interval_sec`.
+            blocked_sec = time.monotonic() - last_tick - self.tick_interval_sec
+            if blocked_sec < self.slow_callback_sec or reported_tick == last_tick:
+                continue
+
+            # Report each stall only once
+            reported_tick = last_tick
+            frame = sys._current_frames().get(self.loop_thread_id or 0)
+            stack = "".join(traceback.format_stack(frame)) if frame else "unknown"
+            logger.warning(
+                f"Event loop blocked for more than {blocked_sec * 1000:.0f} ms, "
+                f"currently running:\n{stack}"
+            )
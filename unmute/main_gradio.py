@@ -47,7 +47,7 @@ if __name__ == "__main__":
     # rtc_configuration = get_cloudflare_rtc_configuration()
 
     stream = Stream(
-        handler=UnmuteHandler(),
+        handler=UnmuteHandler(send_debug_plot=True),
         modality="audio",
         mode="send-receive",
         # rtc_configuration=rtc_configuration,
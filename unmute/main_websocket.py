@@ -2,12 +2,12 @@ import asyncio
 import base64
 import json
 import logging
+from contextlib import asynccontextmanager
 from functools import cache, partial
 from typing import Annotated
 
 import numpy as np
 import requests
-import sphn
 from fastapi import (
     FastAPI,
     File,
@@ -30,24 +30,37 @@ from starlette.responses import Response
 from starlette.types import ASGIApp
 
 import unmute.openai_realtime_api_events as ora
+from unmute import binary_audio_protocol as bap
+from unmute import client_event_decoding as ced
 from unmute import metrics as mt
+from unmute import server_event_encoding as see
+from unmute.admission import AdmissionController
+from unmute.emit_source import EmitSource, SignalingQueue
+from unmute.event_subscriptions import EVENT_SIZES
 from unmute.exceptions import (
     MissingServiceAtCapacity,
     MissingServiceTimeout,
+    ServerAtCapacity,
     WebSocketClosedError,
     make_ora_error,
 )
 from unmute.kyutai_constants import (
     KYUTAI_LLM_API_KEY,
     LLM_SERVER,
+    MAX_CLIENTS_PER_WORKER,
     MAX_VOICE_FILE_SIZE_MB,
+    MAX_WAITING_CLIENTS_PER_WORKER,
+    MAX_WAITING_TIME_SEC,
     SAMPLE_RATE,
     STT_SERVER,
     TTS_SERVER,
     VOICE_CLONING_SERVER,
 )
+from unmute.loop_monitor import LoopMonitor
+from unmute.opus_codec_service import get_opus_codec_service
 from unmute.service_discovery import async_ttl_cached
 from unmute.timer import Stopwatch
+from unmute.tracing import get_trace_store, to_otlp_request
 from unmute.tts.voice_cloning import clone_voice
 from unmute.tts.voice_donation import (
     VoiceDonationSubmission,
@@ -55,9 +68,17 @@ from unmute.tts.voice_donation import (
     submit_voice_donation,
 )
 from unmute.tts.voices import VoiceList
-from unmute.unmute_handler import UnmuteHandler
+from unmute.unmute_handler import HandlerOutput, UnmuteHandler
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One monitor for the whole process, not one per session.
+    async with LoopMonitor():
+        yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -67,9 +88,17 @@ logging.basicConfig(
 )
 
 # We prefer to scale this by running more instances of the server than having a single
-# server handle more. This is to avoid the GIL.
-MAX_CLIENTS = 4
-SEMAPHORE = asyncio.Semaphore(MAX_CLIENTS)
+# server handle more. This is to avoid the GIL. See `unmute.prefork` to run several
+# processes on the same port.
+MAX_CLIENTS = MAX_CLIENTS_PER_WORKER
+# Clients over the limit wait in line instead of blocking silently.
+ADMISSION = AdmissionController(
+    MAX_CLIENTS,
+    max_waiting=MAX_WAITING_CLIENTS_PER_WORKER,
+    max_wait_sec=MAX_WAITING_TIME_SEC,
+)
+# How often an idle emit loop wakes up to check for debug updates.
+DEBUG_UPDATE_INTERVAL_SEC = 1.0
 
 Instrumentator().instrument(app).expose(app)
 PROFILE_ACTIVE = False
@@ -126,14 +155,6 @@ def _check_server_status(server_url: str, headers: dict | None = None) -> bool:
         return False
 
 
-async def debug_running_tasks():
-    while True:
-        logger.debug(f"Running tasks: {len(asyncio.all_tasks())}")
-        for task in asyncio.all_tasks():
-            logger.debug(f"  Task: {task.get_name()} - {task.get_coro()}")
-        await asyncio.sleep(5)
-
-
 class HealthStatus(BaseModel):
     tts_up: bool
     stt_up: bool
@@ -199,6 +220,21 @@ async def get_health():
     return health
 
 
+@app.get("/v1/debug/traces")
+def debug_traces(limit: int = 50):
+    """Latency breakdown of the last turns handled by this process."""
+    return {"traces": [trace.summary() for trace in get_trace_store().recent(limit)]}
+
+
+@app.get("/v1/debug/traces/{trace_id}")
+def debug_trace(trace_id: str):
+    """A single trace, in the OTLP/JSON format of OpenTelemetry."""
+    trace = get_trace_store().get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return to_otlp_request([trace])
+
+
 @app.get("/v1/voices")
 def voices():
     # Note: Cache removed to allow voices.yaml updates without full restart
@@ -293,7 +329,6 @@ async def post_voice_donation(
 async def websocket_route(websocket: WebSocket):
     global _last_profile, _current_profile
     mt.SESSIONS.inc()
-    mt.ACTIVE_SESSIONS.inc()
     session_watch = Stopwatch()
     if PROFILE_ACTIVE and _current_profile is None:
         from pyinstrument import Profiler
@@ -307,30 +342,54 @@ async def websocket_route(websocket: WebSocket):
             frame = frame.f_back
         _current_profile.start(caller_frame=frame)
 
-    async with SEMAPHORE:
-        try:
-            # The `subprotocol` argument is important because the client specifies what
-            # protocol(s) it supports and OpenAI uses "realtime" as the value. If we
-            # don't set this, the client will think this is not the right endpoint and
-            # will not connect.
-            await websocket.accept(subprotocol="realtime")
-
-            handler = UnmuteHandler()
-            async with handler:
-                await handler.start_up()
-                await _run_route(websocket, handler)
-
-        except Exception as exc:
-            await _report_websocket_exception(websocket, exc)
-        finally:
-            if _current_profile is not None:
-                _current_profile.stop()
-                logger.info("Profiler saved.")
-                _last_profile = _current_profile
-                _current_profile = None
-
-            mt.ACTIVE_SESSIONS.dec()
-            mt.SESSION_DURATION.observe(session_watch.time())
+    try:
+        # The `subprotocol` argument is important because the client specifies what
+        # protocol(s) it supports and OpenAI uses "realtime" as the value. If we
+        # don't set this, the client will think this is not the right endpoint and
+        # will not connect. Clients that offer the binary subprotocol get the audio
+        # as raw binary frames instead, see `binary_audio_protocol.py`.
+        subprotocol = bap.choose_subprotocol(websocket.scope.get("subprotocols", []))
+        # Accept before admission so that waiting clients can be told where they are.
+        # Their messages are not read until they're admitted, so they stay queued.
+        await websocket.accept(subprotocol=subprotocol)
+
+        async with ADMISSION.admit(partial(_send_waiting_room_update, websocket)):
+            mt.ACTIVE_SESSIONS.inc()
+            try:
+                handler = UnmuteHandler()
+                async with handler:
+                    await handler.start_up()
+                    await _run_route(
+                        websocket,
+                        handler,
+                        binary_audio=subprotocol == bap.BINARY_SUBPROTOCOL,
+                    )
+            finally:
+                mt.ACTIVE_SESSIONS.dec()
+
+    except Exception as exc:
+        await _report_websocket_exception(websocket, exc)
+    finally:
+        if _current_profile is not None:
+            _current_profile.stop()
+            logger.info("Profiler saved.")
+            _last_profile = _current_profile
+            _current_profile = None
+
+        mt.SESSION_DURATION.observe(session_watch.time())
+
+
+async def _send_waiting_room_update(
+    websocket: WebSocket, position: int, estimated_wait_sec: float | None
+):
+    event = ora.UnmuteWaitingRoomUpdate(
+        position=position, estimated_wait_sec=estimated_wait_sec
+    )
+    try:
+        await websocket.send_text(event.model_dump_json())
+    except (WebSocketDisconnect, RuntimeError) as e:
+        # Give up our place in line.
+        raise WebSocketClosedError() from e
 
 
 async def _report_websocket_exception(websocket: WebSocket, exc: Exception):
@@ -340,9 +399,15 @@ async def _report_websocket_exception(websocket: WebSocket, exc: Exception):
         exceptions = [exc]
 
     error_message = None
+    error_code = None
+    close_code = status.WS_1011_INTERNAL_ERROR
 
     for exc in exceptions:
-        if isinstance(exc, (MissingServiceAtCapacity)):
+        if isinstance(exc, ServerAtCapacity):
+            error_message = exc.message
+            error_code = exc.code
+            close_code = status.WS_1013_TRY_AGAIN_LATER
+        elif isinstance(exc, (MissingServiceAtCapacity)):
             mt.FATAL_SERVICE_MISSES.inc()
             error_message = (
                 f"Too many people are connected to service '{exc.service}'. "
@@ -365,21 +430,22 @@ async def _report_websocket_exception(websocket: WebSocket, exc: Exception):
 
         try:
             await websocket.send_text(
-                make_ora_error(type="fatal", message=error_message).model_dump_json()
+                make_ora_error(
+                    type="fatal", message=error_message, code=error_code
+                ).model_dump_json()
             )
         except WebSocketDisconnect:
             logger.warning("Failed to send error message due to disconnect.")
 
         try:
-            await websocket.close(
-                code=status.WS_1011_INTERNAL_ERROR,
-                reason=error_message,
-            )
+            await websocket.close(code=close_code, reason=error_message)
         except RuntimeError:
             logger.warning("Socket already closed.")
 
 
-async def _run_route(websocket: WebSocket, handler: UnmuteHandler):
+async def _run_route(
+    websocket: WebSocket, handler: UnmuteHandler, binary_audio: bool = False
+):
     health = await get_health()
     if not health.ok:
         logger.info("Health check failed, closing WebSocket connection.")
@@ -389,22 +455,36 @@ async def _run_route(websocket: WebSocket, handler: UnmuteHandler):
         )
         return
 
-    emit_queue: asyncio.Queue[ora.ServerEvent] = asyncio.Queue()
+    emit_queue: asyncio.Queue[ora.ServerEvent] = SignalingQueue(handler.output_ready)
     try:
         async with asyncio.TaskGroup() as tg:
             tg.create_task(
                 receive_loop(websocket, handler, emit_queue), name="receive_loop()"
             )
             tg.create_task(
-                emit_loop(websocket, handler, emit_queue), name="emit_loop()"
+                emit_loop(websocket, handler, emit_queue, binary_audio=binary_audio),
+                name="emit_loop()",
             )
             tg.create_task(handler.quest_manager.wait(), name="quest_manager.wait()")
-            tg.create_task(debug_running_tasks(), name="debug_running_tasks()")
     finally:
         await handler.cleanup()
         logger.info("websocket_route() finished")
 
 
+async def _receive_message(websocket: WebSocket) -> str | bytes:
+    """Like `websocket.receive_text()`, but also accepts binary frames."""
+    if websocket.application_state != WebSocketState.CONNECTED:
+        raise RuntimeError('WebSocket is not connected. Need to call "accept" first.')
+
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message["code"], message.get("reason"))
+
+    if message.get("bytes") is not None:
+        return message["bytes"]
+    return message["text"]
+
+
 async def receive_loop(
     websocket: WebSocket,
     handler: UnmuteHandler,
@@ -414,11 +494,33 @@ async def receive_loop(
 
     Can decide to send messages via `emit_queue`.
     """
-    opus_reader = sphn.OpusStreamReader(SAMPLE_RATE)
+    opus_reader = get_opus_codec_service().open_reader(SAMPLE_RATE)
     wait_for_first_opus = True
+
+    async def receive_opus(opus_bytes: bytes) -> ora.ClientEvent | None:
+        """Decode and pass on the audio. Returns the event to record, if any."""
+        nonlocal wait_for_first_opus
+
+        if wait_for_first_opus:
+            # Somehow the UI is sending us potentially old messages from a previous
+            # connection on reconnect, so that we might get some old OGG packets,
+            # waiting for the bit set for first packet to feed to the decoder.
+            if bap.is_first_ogg_page(opus_bytes):
+                wait_for_first_opus = False
+            else:
+                return None
+        pcm = await opus_reader.append_bytes(opus_bytes)
+
+        if pcm.size:
+            await handler.receive((SAMPLE_RATE, pcm[np.newaxis, :]))
+
+        return ora.UnmuteInputAudioBufferAppendAnonymized(
+            number_of_samples=pcm.size,
+        )
+
     while True:
         try:
-            message_raw = await websocket.receive_text()
+            message_raw = await _receive_message(websocket)
         except WebSocketDisconnect as e:
             logger.info(
                 "receive_loop() stopped because WebSocket disconnected: "
@@ -433,6 +535,35 @@ async def receive_loop(
             logger.info("receive_loop() stopped because WebSocket disconnected.")
             raise WebSocketClosedError() from e
 
+        opus_bytes: bytes | None
+        if isinstance(message_raw, bytes):
+            try:
+                kind, opus_bytes = bap.decode_audio_frame(message_raw)
+                if kind != bap.INPUT_AUDIO:
+                    raise ValueError(f"Unexpected binary frame kind: {kind:#04x}")
+            except ValueError as e:
+                await emit_queue.put(
+                    ora.Error(
+                        error=ora.ErrorDetails(
+                            type="invalid_request_error",
+                            message=f"Invalid binary frame: {e}",
+                        )
+                    )
+                )
+                continue
+        else:
+            # Skip the pydantic validation for audio, which is most of the messages.
+            audio_base64 = ced.extract_input_audio(message_raw)
+            opus_bytes = (
+                base64.b64decode(audio_base64) if audio_base64 is not None else None
+            )
+
+        if opus_bytes is not None:
+            message_to_record = await receive_opus(opus_bytes)
+            if message_to_record is not None and handler.recorder is not None:
+                await handler.recorder.add_event("client", message_to_record)
+            continue
+
         try:
             message: ora.ClientEvent = ClientEventAdapter.validate_json(message_raw)
         except json.JSONDecodeError as e:
@@ -460,25 +591,21 @@ async def receive_loop(
         message_to_record = message
 
         if isinstance(message, ora.InputAudioBufferAppend):
-            opus_bytes = base64.b64decode(message.audio)
-            if wait_for_first_opus:
-                # Somehow the UI is sending us potentially old messages from a previous
-                # connection on reconnect, so that we might get some old OGG packets,
-                # waiting for the bit set for first packet to feed to the decoder.
-                if opus_bytes[5] & 2:
-                    wait_for_first_opus = False
-                else:
-                    continue
-            pcm = await asyncio.to_thread(opus_reader.append_bytes, opus_bytes)
-
-            message_to_record = ora.UnmuteInputAudioBufferAppendAnonymized(
-                number_of_samples=pcm.size,
-            )
-
-            if pcm.size:
-                await handler.receive((SAMPLE_RATE, pcm[np.newaxis, :]))
+            message_to_record = await receive_opus(base64.b64decode(message.audio))
         elif isinstance(message, ora.SessionUpdate):
-            await handler.update_session(message.session)
+            try:
+                await handler.update_session(message.session)
+            except ValueError as e:
+                await emit_queue.put(
+                    ora.Error(
+                        error=ora.ErrorDetails(
+                            type="invalid_request_error",
+                            message=str(e),
+                            param="session.event_subscriptions",
+                        )
+                    )
+                )
+                continue
             await emit_queue.put(ora.SessionUpdated(session=message.session))
 
         elif isinstance(message, ora.SessionUpdate):
@@ -493,6 +620,26 @@ async def receive_loop(
             await handler.handle_cordino_rilasciato()
             
         
+        elif isinstance(
+            message, (ora.UnmuteChatHistoryAck, ora.UnmuteChatHistoryResync)
+        ):
+            if handler.chat_history_sync is None:
+                await emit_queue.put(
+                    ora.Error(
+                        error=ora.ErrorDetails(
+                            type="invalid_request_error",
+                            message="Incremental chat history is not enabled",
+                            param="type",
+                        )
+                    )
+                )
+                continue
+            if isinstance(message, ora.UnmuteChatHistoryAck):
+                handler.chat_history_sync.ack(message.version)
+            else:
+                handler.resync_chat_history()
+            message_to_record = None
+
         elif isinstance(message, ora.UnmuteAdditionalOutputs):
             # Don't record this: it's a debugging message and can be verbose. Anything
             # important to store should be in the other event types.
@@ -527,11 +674,27 @@ async def emit_loop(
     websocket: WebSocket,
     handler: UnmuteHandler,
     emit_queue: asyncio.Queue[ora.ServerEvent],
+    binary_audio: bool = False,
 ):
-    """Send messages to the WebSocket."""
+    """Send messages to the WebSocket.
+
+    If `binary_audio` is set, the Opus audio is sent as binary frames instead of
+    `response.audio.delta` events.
+    """
     emit_debug_logger = EmitDebugLogger()
 
-    opus_writer = sphn.OpusStreamWriter(SAMPLE_RATE)
+    opus_writer = get_opus_codec_service().open_writer(SAMPLE_RATE)
+    # PCM that went into the encoder since it last output something.
+    pending_samples = 0
+
+    # The emit queue has priority over the handler. Sleeps until one of them has
+    # something, or until it's time for a debug update.
+    source: EmitSource[ora.ServerEvent | HandlerOutput] = EmitSource(
+        get_queues=lambda: [emit_queue, handler.output_queue],
+        ready=handler.output_ready,
+        timer_interval_sec=DEBUG_UPDATE_INTERVAL_SEC,
+        on_timer=handler.periodic_gradio_update,
+    )
 
     while True:
         if (
@@ -541,14 +704,14 @@ async def emit_loop(
             logger.info("emit_loop() stopped because WebSocket disconnected")
             raise WebSocketClosedError()
 
-        try:
-            to_emit = emit_queue.get_nowait()
-        except asyncio.QueueEmpty:
-            emitted_by_handler = await handler.emit()
+        emitted = await source.get()
 
-            if emitted_by_handler is None:
-                continue
-            elif isinstance(emitted_by_handler, AdditionalOutputs):
+        if isinstance(emitted, ora.ServerEvent):
+            to_emit = emitted
+        else:
+            emitted_by_handler = emitted
+
+            if isinstance(emitted_by_handler, AdditionalOutputs):
                 assert len(emitted_by_handler.args) == 1
                 to_emit = ora.UnmuteAdditionalOutputs(
                     args=emitted_by_handler.args[0],
@@ -557,27 +720,58 @@ async def emit_loop(
                 # Close here explicitly so that the receive loop stops too
                 await websocket.close()
                 break
-            elif isinstance(emitted_by_handler, ora.ServerEvent):
-                to_emit = emitted_by_handler
             else:
                 _sr, audio = emitted_by_handler
+                if not handler.event_filter.wants_audio(len(audio)):
+                    continue  # Don't even encode it
                 audio = audio_to_float32(audio)
-                opus_bytes = await asyncio.to_thread(opus_writer.append_pcm, audio)
+                opus_bytes = await opus_writer.append_pcm(audio)
+                pending_samples += len(audio)
                 # Due to buffering/chunking, Opus doesn't necessarily output something on every PCM added
-                if opus_bytes:
-                    to_emit = ora.ResponseAudioDelta(
-                        delta=base64.b64encode(opus_bytes).decode("utf-8"),
-                    )
-                else:
+                if not opus_bytes:
                     continue
 
-        emit_debug_logger.on_emit(to_emit)
+                if handler.turn_trace is not None:
+                    handler.turn_trace.end_span("emit.first_audio")
+
+                if binary_audio:
+                    to_emit = bap.encode_audio_frame(bap.OUTPUT_AUDIO, opus_bytes)
+                    if handler.recorder is not None:
+                        # Record the same event as in the JSON protocol
+                        await handler.recorder.add_event(
+                            "server",
+                            see.response_audio_delta(
+                                base64.b64encode(opus_bytes).decode("utf-8")
+                            ),
+                        )
+                else:
+                    to_emit = see.response_audio_delta(
+                        base64.b64encode(opus_bytes).decode("utf-8")
+                    )
 
-        if handler.recorder is not None:
-            await handler.recorder.add_event("server", to_emit)
+        if isinstance(to_emit, bytes):
+            to_send = to_emit
+        elif not handler.event_filter.wants(to_emit.type):
+            continue
+        else:
+            emit_debug_logger.on_emit(to_emit)
+
+            if handler.recorder is not None:
+                await handler.recorder.add_event("server", to_emit)
+
+            to_send = see.dump_server_event_json(to_emit)
+            EVENT_SIZES.observe(to_emit.type, len(to_send))
+        if pending_samples and (
+            isinstance(to_emit, bytes) or to_emit.type == "response.audio.delta"
+        ):
+            EVENT_SIZES.observe_audio(pending_samples, len(to_send))
+            pending_samples = 0
 
         try:
-            await websocket.send_text(to_emit.model_dump_json())
+            if isinstance(to_send, bytes):
+                await websocket.send_bytes(to_send)
+            else:
+                await websocket.send_text(to_send)
         except (WebSocketDisconnect, RuntimeError) as e:
             if isinstance(e, RuntimeError):
                 if "Unexpected ASGI message 'websocket.send'" in str(e):
@@ -57,23 +57,34 @@ NUM_WORDS_REQUEST_BINS = [
     6000.0,
     8000.0,
 ]
+TTS_POOL_CHECKOUT_BINS_MS = [0.1, 1.0, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0, 500.0]
+TTS_POOL_CHECKOUT_BINS = [x / 1000 for x in TTS_POOL_CHECKOUT_BINS_MS]
+TTS_LEAD_TIME_BINS = [0.0, 0.04, 0.08, 0.16, 0.24, 0.32, 0.48, 0.64, 0.96]
+STT_UPLOAD_BYTES_BINS = [1e3, 5e3, 10e3, 25e3, 50e3, 100e3, 250e3, 1e6]
+STT_LOCAL_BATCH_SIZE_BINS = [1, 2, 4, 8, 16, 32]
+STT_FINAL_AUDIO_BINS = [0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0]
+STT_FLUSH_DURATION_BINS = [0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0]
 NUM_WORDS_STT_BINS = [0.0, 50.0, 100.0, 200.0, 500.0, 1000.0, 2000.0, 4000.0]
 NUM_WORDS_REPLY_BINS = [5.0, 10.0, 25.0, 50.0, 100.0, 200.0]
 
+# With `unmute.prefork`, metrics are aggregated over the worker processes using the
+# multiprocess mode of prometheus_client. Gauges are summed over the live workers.
 SESSIONS = Counter("worker_sessions", "")
 SERVICE_MISSES = Counter("worker_service_misses", "")
 HARD_SERVICE_MISSES = Counter("worker_hard_service_misses", "")
 FORCE_DISCONNECTS = Counter("worker_force_disconnects", "")
 FATAL_SERVICE_MISSES = Counter("worker_fatal_service_misses", "")
 HARD_ERRORS = Counter("worker_hard_errors", "")
-ACTIVE_SESSIONS = Gauge("worker_active_sessions", "")
+ACTIVE_SESSIONS = Gauge("worker_active_sessions", "", multiprocess_mode="livesum")
 SESSION_DURATION = Histogram(
     "worker_session_duration", "", buckets=SESSION_DURATION_BINS
 )
 HEALTH_OK = Summary("worker_health_ok", "")
 
 STT_SESSIONS = Counter("worker_stt_sessions", "")
-STT_ACTIVE_SESSIONS = Gauge("worker_stt_active_sessions", "")
+STT_ACTIVE_SESSIONS = Gauge(
+    "worker_stt_active_sessions", "", multiprocess_mode="livesum"
+)
 STT_MISSES = Counter("worker_stt_misses", "")
 STT_HARD_MISSES = Counter("worker_stt_hard_misses", "")
 STT_SENT_FRAMES = Counter("worker_stt_sent_frames", "")
@@ -89,9 +100,47 @@ STT_AUDIO_DURATION = Histogram(
 )
 STT_NUM_WORDS = Histogram("worker_stt_num_words", "", buckets=NUM_WORDS_STT_BINS)
 STT_TTFT = Histogram("worker_stt_ttft", "", buckets=TTFT_BINS_STT)
+# From the end of the user's turn to when the STT has transcribed everything.
+STT_FLUSH_DURATION = Histogram(
+    "worker_stt_flush_duration", "", buckets=STT_FLUSH_DURATION_BINS
+)
+STT_BUFFER_OVERFLOWS = Counter("worker_stt_buffer_overflows", "")
+STT_UPLOAD_BYTES = Histogram(
+    "worker_stt_upload_bytes", "", buckets=STT_UPLOAD_BYTES_BINS
+)
+# Utterances with too little speech according to the VAD to be worth transcribing.
+STT_SKIPPED_UTTERANCES = Counter("worker_stt_skipped_utterances", "")
+STT_PARTIAL_TRANSCRIPTIONS = Counter("worker_stt_partial_transcriptions", "")
+STT_CONFIRMED_WORDS = Counter("worker_stt_confirmed_words", "")
+# Seconds of audio left to transcribe at the end of an utterance.
+STT_FINAL_AUDIO_DURATION = Histogram(
+    "worker_stt_final_audio_duration", "", buckets=STT_FINAL_AUDIO_BINS
+)
+# Whisper API requests, see `unmute.stt.whisper_client`.
+STT_API_IN_FLIGHT = Gauge("worker_stt_api_in_flight", "", multiprocess_mode="livesum")
+STT_API_QUEUE_TIME = Histogram(
+    "worker_stt_api_queue_time", "", buckets=GENERATION_DURATION_BINS
+)
+STT_API_LATENCY = Histogram(
+    "worker_stt_api_latency", "", buckets=GENERATION_DURATION_BINS
+)
+STT_API_RETRIES = Counter("worker_stt_api_retries", "", ["reason"])
+STT_API_ERRORS = Counter("worker_stt_api_errors", "")
+# Local STT backend, see `unmute.stt.local_transcriber`.
+STT_LOCAL_BATCH_SIZE = Histogram(
+    "worker_stt_local_batch_size", "", buckets=STT_LOCAL_BATCH_SIZE_BINS
+)
+STT_LOCAL_QUEUE_TIME = Histogram(
+    "worker_stt_local_queue_time", "", buckets=GENERATION_DURATION_BINS
+)
+STT_LOCAL_INFERENCE_TIME = Histogram(
+    "worker_stt_local_inference_time", "", buckets=GENERATION_DURATION_BINS
+)
 
 TTS_SESSIONS = Counter("worker_tts_sessions", "")
-TTS_ACTIVE_SESSIONS = Gauge("worker_tts_active_sessions", "")
+TTS_ACTIVE_SESSIONS = Gauge(
+    "worker_tts_active_sessions", "", multiprocess_mode="livesum"
+)
 TTS_MISSES = Counter("worker_tts_misses", "")
 TTS_HARD_MISSES = Counter("worker_hard_tts_misses", "")
 TTS_INTERRUPT = Counter("worker_tts_interrupt", "")
@@ -107,9 +156,22 @@ TTS_AUDIO_DURATION = Histogram(
 TTS_GEN_DURATION = Histogram(
     "worker_tts_gen_duration", "", buckets=GENERATION_DURATION_BINS
 )
+# Ready connections, see `unmute.tts.tts_pool`.
+TTS_POOL_CHECKOUTS = Counter("worker_tts_pool_checkouts", "", ["result"])
+TTS_POOL_CHECKOUT_TIME = Histogram(
+    "worker_tts_pool_checkout_time", "", buckets=TTS_POOL_CHECKOUT_BINS
+)
+TTS_POOL_READY = Gauge("worker_tts_pool_ready", "", multiprocess_mode="livesum")
+TTS_POOL_EVICTIONS = Counter("worker_tts_pool_evictions", "")
+# See `unmute.tts.jitter_buffer`. The lead time is observed for each frame sent.
+TTS_UNDERRUNS = Counter("worker_tts_underruns", "")
+TTS_LATE_FRAMES = Counter("worker_tts_late_frames", "")
+TTS_LEAD_TIME = Histogram("worker_tts_lead_time", "", buckets=TTS_LEAD_TIME_BINS)
 
 VLLM_SESSIONS = Counter("worker_vllm_sessions", "")
-VLLM_ACTIVE_SESSIONS = Gauge("worker_vllm_active_sessions", "")
+VLLM_ACTIVE_SESSIONS = Gauge(
+    "worker_vllm_active_sessions", "", multiprocess_mode="livesum"
+)
 VLLM_INTERRUPTS = Counter("worker_vllm_interrupt", "")
 VLLM_HARD_ERRORS = Counter("worker_vllm_hard_errors", "")
 VLLM_SENT_WORDS = Counter("worker_vllm_sent_words", "")
@@ -125,4 +187,54 @@ VLLM_GEN_DURATION = Histogram(
     "worker_vllm_gen_duration", "", buckets=GENERATION_DURATION_BINS
 )
 
+# See `unmute.speculation`. Outcomes: "hit", "resumed", "expired", "failed" and
+# "session_ended".
+SPECULATIONS = Counter("worker_speculations", "", ["outcome"])
+# From the start of a speculation to the start of the answer that used it.
+SPECULATION_LEAD_TIME = Histogram(
+    "worker_speculation_lead_time", "", buckets=GENERATION_DURATION_BINS
+)
+
 VOICE_DONATION_SUBMISSIONS = Counter("worker_voice_donation_submissions", "")
+
+WAITING_ROOM_WAIT_TIME_BINS = [0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0]
+
+WAITING_ROOM_LENGTH = Gauge(
+    "worker_waiting_room_length", "", multiprocess_mode="livesum"
+)
+WAITING_ROOM_WAIT_TIME = Histogram(
+    "worker_waiting_room_wait_time", "", buckets=WAITING_ROOM_WAIT_TIME_BINS
+)
+WAITING_ROOM_REJECTIONS = Counter("worker_waiting_room_rejections", "")
+WAITING_ROOM_TIMEOUTS = Counter("worker_waiting_room_timeouts", "")
+
+OPUS_CODEC_LATENCY_BINS_MS = [0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0]
+OPUS_CODEC_LATENCY_BINS = [x / 1000 for x in OPUS_CODEC_LATENCY_BINS_MS]
+OPUS_CODEC_BATCH_SIZE_BINS = [1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0]
+
+OPUS_CODEC_QUEUE_DEPTH = Gauge(
+    "worker_opus_codec_queue_depth", "", multiprocess_mode="livesum"
+)
+OPUS_CODEC_LATENCY = Histogram(
+    "worker_opus_codec_latency", "", buckets=OPUS_CODEC_LATENCY_BINS
+)
+OPUS_CODEC_BATCH_SIZE = Histogram(
+    "worker_opus_codec_batch_size", "", buckets=OPUS_CODEC_BATCH_SIZE_BINS
+)
+
+EVENT_LOOP_LAG_BINS_MS = [1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 250.0, 500.0, 1000.0]
+EVENT_LOOP_LAG_BINS = [x / 1000 for x in EVENT_LOOP_LAG_BINS_MS]
+
+EVENT_LOOP_LAG = Histogram("worker_event_loop_lag", "", buckets=EVENT_LOOP_LAG_BINS)
+EVENT_LOOP_SLOW_CALLBACKS = Counter("worker_event_loop_slow_callbacks", "")
+EVENT_LOOP_SLOW_CALLBACK_DURATION = Histogram(
+    "worker_event_loop_slow_callback_duration", "", buckets=EVENT_LOOP_LAG_BINS
+)
+EVENT_LOOP_TASKS = Gauge(
+    "worker_event_loop_tasks", "", ["name"], multiprocess_mode="livesum"
+)
+
+EVENTS_FILTERED = Counter("worker_events_filtered", "", ["type"])
+# Estimated from the average size of the events of the same type that were sent, and
+# for audio from the size of the Opus pages sent per sample of PCM.
+EVENT_BYTES_SAVED = Counter("worker_event_bytes_saved", "")
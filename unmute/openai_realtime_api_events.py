@@ -4,6 +4,7 @@ https://platform.openai.com/docs/api-reference/realtime-client-events
 https://platform.openai.com/docs/api-reference/realtime-server-events
 """
 
+import itertools
 import random
 from typing import (
     Any,
@@ -29,6 +30,19 @@ def random_id(prefix: str) -> str:
     return prefix + "_" + "".join(random.choices(alphabet, k=n_characters))
 
 
+# The random part makes the IDs unique across processes, the counter within a process.
+_monotonic_id_prefix = random_id("event")[:-9]
+_monotonic_id_counter = itertools.count()
+
+
+def monotonic_event_id() -> str:
+    """A cheaper alternative to `random_id("event")` for high-frequency events.
+
+    e.g. event_BJhGUIswO2u7000000042
+    """
+    return f"{_monotonic_id_prefix}{next(_monotonic_id_counter):09d}"
+
+
 class BaseEvent(BaseModel, Generic[T]):
     type: T = None  # type: ignore - will be set by validator below
     event_id: str = Field(default_factory=lambda: random_id("event"))
@@ -68,6 +82,12 @@ class SessionConfig(BaseModel):
     instructions: Instructions | None = None
     voice: str | None = None
     allow_recording: bool
+    # Unmute extension: the server event types or groups to send, everything if None.
+    # See `event_subscriptions.py`.
+    event_subscriptions: list[str] | None = None
+    # Unmute extension: send the chat history as `unmute.chat_history.update` events
+    # instead of in every `unmute.additional_outputs`. Unchanged if None.
+    incremental_chat_history: bool | None = None
 
 
 class SessionUpdate(BaseEvent[Literal["session.update"]]):
@@ -157,6 +177,34 @@ class UnmuteAdditionalOutputs(BaseEvent[Literal["unmute.additional_outputs"]]):
     args: Any
 
 
+class UnmuteChatMessageUpdate(BaseModel):
+    index: int
+    role: str
+    # Keep the first `offset` characters of the message and append `content`.
+    offset: int = 0
+    content: str
+
+
+class UnmuteChatHistoryUpdate(BaseEvent[Literal["unmute.chat_history.update"]]):
+    """Changes of the chat history, see `chat_history_sync.py`."""
+
+    version: int
+    # None for a full snapshot.
+    base_version: int | None
+    length: int
+    messages: list[UnmuteChatMessageUpdate]
+
+
+class UnmuteChatHistoryAck(BaseEvent[Literal["unmute.chat_history.ack"]]):
+    """The client has applied the chat history update of this version."""
+
+    version: int
+
+
+class UnmuteChatHistoryResync(BaseEvent[Literal["unmute.chat_history.resync"]]):
+    """The client missed a chat history update and wants a full snapshot."""
+
+
 class UnmuteResponseTextDeltaReady(
     BaseEvent[Literal["unmute.response.text.delta.ready"]]
 ):
@@ -173,6 +221,16 @@ class UnmuteInterruptedByVAD(BaseEvent[Literal["unmute.interrupted_by_vad"]]):
     """The VAD interrupted the response generation."""
 
 
+class UnmuteWaitingRoomUpdate(BaseEvent[Literal["unmute.waiting_room.update"]]):
+    """The server is at capacity and the client is waiting for a free spot.
+
+    Position 1 is the next in line, and position 0 means the session is starting.
+    """
+
+    position: int
+    estimated_wait_sec: float | None
+
+
 # === EVENTI CUSTOM BAMBOLA PARLANTE ===
 
 class UnmuteBambolaCordinoTirato(
@@ -230,6 +288,8 @@ ServerEvent = Union[
     UnmuteResponseTextDeltaReady,
     UnmuteResponseAudioDeltaReady,
     UnmuteInterruptedByVAD,
+    UnmuteWaitingRoomUpdate,
+    UnmuteChatHistoryUpdate,
     UnmuteBambolaBufferReady,              # <-- AGGIUNGI
     UnmuteBambolaPlaybackStarted,          # <-- AGGIUNGI
     UnmuteBambolaPlaybackCompleted,        # <-- AGGIUNGI
@@ -241,6 +301,8 @@ ClientEvent = Union[
     InputAudioBufferAppend,
     # Used internally for recording, we're not expecting the user to send this
     UnmuteInputAudioBufferAppendAnonymized,
+    UnmuteChatHistoryAck,
+    UnmuteChatHistoryResync,
     UnmuteBambolaCordinoTirato,            # <-- AGGIUNGI
     UnmuteBambolaCordinoRilasciato,        # <-- AGGIUNGI
 ]
@@ -0,0 +1,145 @@
+"""Opus encoding/decoding on dedicated threads shared by all the sessions of a process.
+
+Calling `asyncio.to_thread()` for every Opus packet means two hops through the default
+executor per frame per session, competing with everything else that uses it. Instead,
+each session's `sphn` reader/writer is pinned to one of a fixed number of codec
+workers. A worker wakes up, takes all the jobs that are pending for it (from any
+session), runs them in order and hands all the results back to the event loop at once.
+Pinning also guarantees that the jobs of a stream never run concurrently.
+"""
+
+import asyncio
+import itertools
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from functools import cache
+from typing import Any, Callable
+
+import numpy as np
+import sphn
+
+from unmute import metrics as mt
+from unmute.kyutai_constants import OPUS_CODEC_WORKERS, SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Job:
+    fn: Callable[[Any], Any]
+    arg: Any
+    future: asyncio.Future
+    loop: asyncio.AbstractEventLoop
+    enqueued_at: float
+
+
+class _CodecWorker:
+    def __init__(self, index: int):
+        self.jobs: queue.SimpleQueue[_Job | None] = queue.SimpleQueue()
+        self.thread = threading.Thread(
+            target=self._run, name=f"opus-codec-{index}", daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, fn: Callable[[Any], Any], arg: Any) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        mt.OPUS_CODEC_QUEUE_DEPTH.inc()
+        self.jobs.put(_Job(fn, arg, future, loop, time.perf_counter()))
+        return future
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            batch: list[_Job | None] = [job]
+            while True:
+                try:
+                    batch.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+
+            jobs = [job for job in batch if job is not None]
+            mt.OPUS_CODEC_QUEUE_DEPTH.dec(len(jobs))
+            mt.OPUS_CODEC_BATCH_SIZE.observe(len(jobs))
+
+            results: dict[asyncio.AbstractEventLoop, list[tuple[_Job, Any, Any]]] = {}
+            for job in jobs:
+                try:
+                    result, exc = job.fn(job.arg), None
+                except Exception as e:
+                    result, exc = None, e
+                mt.OPUS_CODEC_LATENCY.observe(time.perf_counter() - job.enqueued_at)
+                results.setdefault(job.loop, []).append((job, result, exc))
+
+            for loop, loop_results in results.items():
+                try:
+                    loop.call_soon_threadsafe(_deliver, loop_results)
+                except RuntimeError:
+                    # The loop was closed in the meantime, nobody is waiting anymore.
+                    pass
+
+            if len(jobs) < len(batch):
+                logger.debug("Opus codec worker stopping.")
+                return
+
+    def stop(self):
+        self.jobs.put(None)
+
+
+def _deliver(results: list[tuple[_Job, Any, Any]]):
+    for job, result, exc in results:
+        if job.future.cancelled():
+            continue
+        if exc is not None:
+            job.future.set_exception(exc)
+        else:
+            job.future.set_result(result)
+
+
+class PinnedOpusReader:
+    """Like `sphn.OpusStreamReader`, but decoding runs on a codec worker."""
+
+    def __init__(self, worker: _CodecWorker, sample_rate: int):
+        self._worker = worker
+        self._reader = sphn.OpusStreamReader(sample_rate)
+
+    async def append_bytes(self, opus_bytes: bytes) -> np.ndarray:
+        return await self._worker.submit(self._reader.append_bytes, opus_bytes)
+
+
+class PinnedOpusWriter:
+    """Like `sphn.OpusStreamWriter`, but encoding runs on a codec worker."""
+
+    def __init__(self, worker: _CodecWorker, sample_rate: int):
+        self._worker = worker
+        self._writer = sphn.OpusStreamWriter(sample_rate)
+
+    async def append_pcm(self, pcm: np.ndarray) -> bytes:
+        return await self._worker.submit(self._writer.append_pcm, pcm)
+
+
+class OpusCodecService:
+    def __init__(self, num_workers: int = OPUS_CODEC_WORKERS):
+        if num_workers < 1:
+            raise ValueError(f"Need at least one codec worker, got {num_workers=}")
+        self.workers = [_CodecWorker(i) for i in range(num_workers)]
+        self._next_worker = itertools.cycle(self.workers)
+
+    def open_reader(self, sample_rate: int = SAMPLE_RATE) -> PinnedOpusReader:
+        return PinnedOpusReader(next(self._next_worker), sample_rate)
+
+    def open_writer(self, sample_rate: int = SAMPLE_RATE) -> PinnedOpusWriter:
+        return PinnedOpusWriter(next(self._next_worker), sample_rate)
+
+    def shutdown(self):
+        for worker in self.workers:
+            worker.stop()
+
+
+@cache
+def get_opus_codec_service() -> OpusCodecService:
+    logger.info(f"Starting Opus codec service with {OPUS_CODEC_WORKERS} workers.")
+    return OpusCodecService()
@@ -0,0 +1,182 @@
+"""Run several backend worker processes on a single port.
+
+Because of the GIL, a single process can only handle a few sessions. Instead of running
+one container per process behind a load balancer, this forks `--workers` processes that
+each bind the same port with SO_REUSEPORT, so that the kernel balances the incoming
+connections between them.
+
+The Prometheus metrics of all the workers are aggregated using the multiprocess mode of
+prometheus_client, so `/metrics` on any worker reports the totals.
+
+Usage:
+    uv run python -m unmute.prefork --workers 8 --max-clients 32 --port 80
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import tempfile
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+APP = "unmute.main_websocket:app"
+RESTART_DELAY_SEC = 1.0
+
+
+def make_reuseport_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    return sock
+
+
+def max_clients_per_worker(max_clients: int, n_workers: int, index: int) -> int:
+    """The first workers get one more session each, so that they add up exactly."""
+    return max_clients // n_workers + (index < max_clients % n_workers)
+
+
+def prepare_multiprocess_dir(path: Path):
+    """prometheus_client needs an empty directory, shared by all the workers.
+
+    Only the `*.db` files of a previous run are deleted, a directory with anything
+    else in it is refused rather than emptied: it's likely not the one meant.
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    others = [p.name for p in path.iterdir() if not (p.is_file() and p.suffix == ".db")]
+    if others:
+        raise ValueError(
+            f"The metrics directory {path} contains other files than metrics: "
+            f"{', '.join(sorted(others)[:5])}"
+        )
+    for db_file in path.glob("*.db"):
+        db_file.unlink()
+    # Must be set before prometheus_client is imported, i.e. before forking.
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = str(path)
+
+
+def run_worker(index: int, host: str, port: int):
+    # Imported here so that the app is only loaded in the workers.
+    import uvicorn
+
+    logger.info(f"Worker {index} starting with pid {os.getpid()}")
+    sock = make_reuseport_socket(host, port)
+    config = uvicorn.Config(
+        APP,
+        # Per-message deflate slows down the replies by a few ms, see the Dockerfile.
+        ws_per_message_deflate=False,
+        log_level="info",
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def fork_worker(index: int, host: str, port: int, max_clients: int | None) -> int:
+    pid = os.fork()
+    if pid == 0:
+        if max_clients is not None:
+            os.environ["KYUTAI_MAX_CLIENTS_PER_WORKER"] = str(max_clients)
+        # Let uvicorn install its own signal handlers.
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        exit_code = 0
+        try:
+            run_worker(index, host, port)
+        except BaseException:
+            logger.exception(f"Worker {index} crashed")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--max-clients",
+        type=int,
+        default=None,
+        help="Total number of sessions for all workers. If not set, each worker uses "
+        "KYUTAI_MAX_CLIENTS_PER_WORKER.",
+    )
+    parser.add_argument(
+        "--metrics-dir",
+        type=Path,
+        default=Path(
+            os.environ.get(
+                "PROMETHEUS_MULTIPROC_DIR",
+                Path(tempfile.gettempdir()) / "unmute_prometheus",
+            )
+        ),
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO,
+    )
+
+    try:
+        prepare_multiprocess_dir(args.metrics_dir)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.max_clients is not None and args.max_clients < args.workers:
+        parser.error("--max-clients must be at least --workers")
+
+    def worker_max_clients(index: int) -> int | None:
+        if args.max_clients is None:
+            return None
+        return max_clients_per_worker(args.max_clients, args.workers, index)
+
+    from prometheus_client import multiprocess
+
+    workers: dict[int, int] = {}  # pid -> worker index
+    for i in range(args.workers):
+        pid = fork_worker(i, args.host, args.port, worker_max_clients(i))
+        workers[pid] = i
+
+    stopping = False
+
+    def stop(signum: int, _frame: object):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            os.kill(pid, signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+
+        index = workers.pop(pid, None)
+        if index is None:
+            continue
+        # Otherwise the gauges of the dead process would still be counted.
+        multiprocess.mark_process_dead(pid)
+
+        if not stopping:
+            logger.warning(
+                f"Worker {index} (pid {pid}) exited with status {status}, restarting."
+            )
+            # Don't spin if the workers crash right away.
+            time.sleep(RESTART_DELAY_SEC)
+            pid = fork_worker(index, args.host, args.port, worker_max_clients(index))
+            workers[pid] = index
+
+    logger.info("All workers stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+from typing import Any, TypeVar
+
+from pydantic import BaseModel
+
+M = TypeVar("M", bound=BaseModel)
+
+_object_setattr = object.__setattr__
+
+
+def construct(cls: type[M], values: dict[str, Any]) -> M:
+    """A leaner `cls.model_construct(**values)`: all fields must be given.
+
+    No validation and no defaults, only for the messages sent or received many times
+    per second, whose values are known to be valid.
+    """
+    model = cls.__new__(cls)
+    _object_setattr(model, "__dict__", values)
+    _object_setattr(model, "__pydantic_fields_set__", set(values))
+    _object_setattr(model, "__pydantic_extra__", None)
+    _object_setattr(model, "__pydantic_private__", None)
+    return model
@@ -0,0 +1,65 @@
+"""Measure how many incoming client messages per second a single core can dispatch,
+with the full pydantic validation vs. with `unmute.client_event_decoding`."""
+
+import argparse
+import base64
+import json
+import time
+from typing import Annotated, Callable
+
+from pydantic import Field, TypeAdapter
+
+import unmute.client_event_decoding as ced
+import unmute.openai_realtime_api_events as ora
+
+ClientEventAdapter = TypeAdapter(
+    Annotated[ora.ClientEvent, Field(discriminator="type")]
+)
+
+# Roughly the size of an Opus page for 40 ms of audio.
+AUDIO_MESSAGE = json.dumps(
+    {
+        "type": "input_audio_buffer.append",
+        "audio": base64.b64encode(bytes(range(256)) * 2).decode("ascii"),
+    }
+)
+
+
+def before(message_raw: str) -> bytes:
+    message = ClientEventAdapter.validate_json(message_raw)
+    assert isinstance(message, ora.InputAudioBufferAppend)
+    return base64.b64decode(message.audio)
+
+
+def after(message_raw: str) -> bytes:
+    audio = ced.extract_input_audio(message_raw)
+    assert audio is not None
+    return base64.b64decode(audio)
+
+
+def messages_per_sec(fn: Callable[[str], bytes], duration_sec: float) -> float:
+    n = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < duration_sec:
+        for _ in range(1000):
+            fn(AUDIO_MESSAGE)
+        n += 1000
+    return n / elapsed
+
+
+def main(duration_sec: float):
+    assert before(AUDIO_MESSAGE) == after(AUDIO_MESSAGE)
+    before_rate = messages_per_sec(before, duration_sec)
+    after_rate = messages_per_sec(after, duration_sec)
+    print(f"input_audio_buffer.append, {len(AUDIO_MESSAGE)} bytes per message")
+    print(f"  full validation: {before_rate:>12,.0f} messages/s")
+    print(f"  fast path:       {after_rate:>12,.0f} messages/s")
+    print(f"  speedup:         {after_rate / before_rate:>12.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration-sec", type=float, default=2.0)
+    args = parser.parse_args()
+
+    main(args.duration_sec)
@@ -0,0 +1,89 @@
+"""Measure the CPU cost of emit loops for connected-but-silent sessions.
+
+Compares the old loop, which polls the handler with a 0.1 s timeout (like fastrtc's
+`wait_for_item`), with the event-driven `EmitSource`.
+"""
+
+import argparse
+import asyncio
+import time
+
+from unmute.emit_source import EmitSource, SignalingQueue
+
+# Same as fastrtc's `wait_for_item`.
+POLLING_TIMEOUT_SEC = 0.1
+DEBUG_UPDATE_INTERVAL_SEC = 1.0
+
+
+async def polling_emit_loop(wakeups: list[int]):
+    emit_queue: asyncio.Queue[str] = asyncio.Queue()
+    output_queue: asyncio.Queue[str] = asyncio.Queue()
+
+    while True:
+        wakeups[0] += 1
+        try:
+            emit_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            try:
+                await asyncio.wait_for(output_queue.get(), timeout=POLLING_TIMEOUT_SEC)
+            except TimeoutError:
+                continue
+
+
+async def event_driven_emit_loop(wakeups: list[int]):
+    ready = asyncio.Event()
+    emit_queue: asyncio.Queue[str] = SignalingQueue(ready)
+    output_queue: asyncio.Queue[str] = SignalingQueue(ready)
+
+    def on_timer() -> None:
+        wakeups[0] += 1
+        return None
+
+    source: EmitSource[str] = EmitSource(
+        get_queues=lambda: [emit_queue, output_queue],
+        ready=ready,
+        timer_interval_sec=DEBUG_UPDATE_INTERVAL_SEC,
+        on_timer=on_timer,
+    )
+    while True:
+        await source.get()
+
+
+async def measure(kind: str, n_sessions: int, duration_sec: float) -> tuple[float, int]:
+    loop_fn = polling_emit_loop if kind == "polling" else event_driven_emit_loop
+    wakeups = [0]
+    tasks = [asyncio.create_task(loop_fn(wakeups)) for _ in range(n_sessions)]
+
+    # Let the loops settle before measuring.
+    await asyncio.sleep(0.5)
+    wakeups[0] = 0
+    cpu_start = time.process_time()
+    await asyncio.sleep(duration_sec)
+    cpu_used = time.process_time() - cpu_start
+    n_wakeups = wakeups[0]
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    return cpu_used / duration_sec, n_wakeups
+
+
+async def main(sessions: list[int], duration_sec: float):
+    print(f"{'sessions':>8} {'loop':>13} {'CPU %':>8} {'wakeups/s':>10}")
+    for n_sessions in sessions:
+        for kind in ["polling", "event-driven"]:
+            cpu_fraction, n_wakeups = await measure(kind, n_sessions, duration_sec)
+            print(
+                f"{n_sessions:>8} {kind:>13} {cpu_fraction * 100:>7.2f}%"
+                f" {n_wakeups / duration_sec:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("--duration-sec", type=float, default=5.0)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.sessions, args.duration_sec))
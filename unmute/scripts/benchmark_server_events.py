@@ -0,0 +1,67 @@
+"""Measure how many high-frequency server events per second a single core can create
+and serialize, with pydantic vs. with `unmute.server_event_encoding`."""
+
+import argparse
+import base64
+import time
+from typing import Callable
+
+import unmute.openai_realtime_api_events as ora
+import unmute.server_event_encoding as see
+
+# Roughly the size of an Opus page for 40 ms of audio.
+AUDIO_DELTA = base64.b64encode(bytes(range(256)) * 2).decode("utf-8")
+TEXT_DELTA = " bonjour"
+
+CASES: dict[str, tuple[Callable[[], str], Callable[[], str]]] = {
+    "response.audio.delta": (
+        lambda: ora.ResponseAudioDelta(delta=AUDIO_DELTA).model_dump_json(),
+        lambda: see.dump_server_event_json(see.response_audio_delta(AUDIO_DELTA)),
+    ),
+    "response.text.delta": (
+        lambda: ora.ResponseTextDelta(delta=TEXT_DELTA).model_dump_json(),
+        lambda: see.dump_server_event_json(see.response_text_delta(TEXT_DELTA)),
+    ),
+    "unmute.response.text.delta.ready": (
+        lambda: ora.UnmuteResponseTextDeltaReady(delta=TEXT_DELTA).model_dump_json(),
+        lambda: see.dump_server_event_json(
+            see.unmute_response_text_delta_ready(TEXT_DELTA)
+        ),
+    ),
+    "unmute.response.audio.delta.ready": (
+        lambda: ora.UnmuteResponseAudioDeltaReady(
+            number_of_samples=1920
+        ).model_dump_json(),
+        lambda: see.dump_server_event_json(see.unmute_response_audio_delta_ready(1920)),
+    ),
+}
+
+
+def events_per_sec(fn: Callable[[], str], duration_sec: float) -> float:
+    n = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < duration_sec:
+        for _ in range(1000):
+            fn()
+        n += 1000
+    return n / elapsed
+
+
+def main(duration_sec: float):
+    print(f"{'event':<36}{'pydantic/s':>14}{'fast/s':>14}{'speedup':>10}")
+    for name, (slow, fast) in CASES.items():
+        assert slow()[: len(name) + 10] == fast()[: len(name) + 10]
+        slow_rate = events_per_sec(slow, duration_sec)
+        fast_rate = events_per_sec(fast, duration_sec)
+        print(
+            f"{name:<36}{slow_rate:>14,.0f}{fast_rate:>14,.0f}"
+            f"{fast_rate / slow_rate:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration-sec", type=float, default=2.0)
+    args = parser.parse_args()
+
+    main(args.duration_sec)
@@ -0,0 +1,85 @@
+"""Measure how many STT messages per second a single core can encode and decode.
+
+Sending: one 80 ms frame of audio as `msgpack.packb(audio.tolist())`, which is what
+`SpeechToText` used to do, vs. `encode_audio_message` for each PCM format.
+Receiving: the `Step` and `Word` messages through pydantic vs. `decode_stt_message`.
+"""
+
+import argparse
+import time
+from typing import Callable
+
+import msgpack
+import numpy as np
+
+from unmute.kyutai_constants import SAMPLES_PER_FRAME
+from unmute.stt.speech_to_text import (
+    STTMessageAdapter,
+    decode_stt_message,
+    encode_audio_message,
+)
+
+AUDIO = np.random.default_rng(0).uniform(-0.5, 0.5, SAMPLES_PER_FRAME)
+AUDIO = AUDIO.astype(np.float32)
+
+ENCODE_CASES: dict[str, Callable[[], bytes]] = {
+    "msgpack tolist": lambda: msgpack.packb(  # type: ignore
+        {"type": "Audio", "pcm": AUDIO.tolist()},
+        use_bin_type=True,
+        use_single_float=True,
+    ),
+    "list": lambda: encode_audio_message(AUDIO, "list"),
+    "float32": lambda: encode_audio_message(AUDIO, "float32"),
+    "int16": lambda: encode_audio_message(AUDIO, "int16"),
+}
+
+MESSAGES: dict[str, bytes] = {
+    "Step": msgpack.packb(  # type: ignore
+        {"type": "Step", "step_idx": 12, "prs": [0.01, 0.2, 0.95, 0.99]},
+        use_single_float=True,
+    ),
+    "Word": msgpack.packb({"type": "Word", "text": "bonjour", "start_time": 1.84}),  # type: ignore
+}
+
+
+def per_sec(fn: Callable[[], object], duration_sec: float) -> float:
+    n = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < duration_sec:
+        for _ in range(100):
+            fn()
+        n += 100
+    return n / elapsed
+
+
+def main(duration_sec: float):
+    print(f"{'send':<20}{'frames/s':>12}{'bytes/frame':>14}{'speedup':>10}")
+    baseline = None
+    for name, encode in ENCODE_CASES.items():
+        rate = per_sec(encode, duration_sec)
+        baseline = baseline or rate
+        print(f"{name:<20}{rate:>12,.0f}{len(encode()):>14,}{rate / baseline:>9.1f}x")
+
+    print()
+    print(f"{'receive':<20}{'pydantic/s':>12}{'fast/s':>14}{'speedup':>10}")
+    for name, message in MESSAGES.items():
+        assert decode_stt_message(message) == STTMessageAdapter.validate_python(
+            msgpack.unpackb(message)
+        )
+        slow_rate = per_sec(
+            lambda m=message: STTMessageAdapter.validate_python(msgpack.unpackb(m)),
+            duration_sec,
+        )
+        fast_rate = per_sec(lambda m=message: decode_stt_message(m), duration_sec)
+        print(
+            f"{name:<20}{slow_rate:>12,.0f}{fast_rate:>14,.0f}"
+            f"{fast_rate / slow_rate:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration-sec", type=float, default=1.0)
+    args = parser.parse_args()
+
+    main(args.duration_sec)
@@ -0,0 +1,76 @@
+"""Measure how many TTS messages per second a single core can decode.
+
+For each 80 ms frame of audio, the TTS client used to unpack the message into a list
+of Python floats, validate it with pydantic and then convert it with `np.array`. This
+compares it to `decode_tts_message`, for audio encoded as float32 (what the TTS server
+sends) and float64 (e.g. `dummy_tts_server.py`), and for a text message.
+"""
+
+import argparse
+import time
+from typing import Callable
+
+import msgpack
+import numpy as np
+from pydantic import TypeAdapter
+
+from unmute.kyutai_constants import SAMPLES_PER_FRAME
+from unmute.tts.text_to_speech import TTSMessageAdapter, decode_tts_message
+
+AUDIO = np.random.default_rng(0).uniform(-0.5, 0.5, SAMPLES_PER_FRAME)
+AUDIO = AUDIO.astype(np.float32)
+
+MESSAGES: dict[str, bytes] = {
+    "Audio float32": msgpack.packb(  # type: ignore
+        {"type": "Audio", "pcm": AUDIO.tolist()}, use_single_float=True
+    ),
+    "Audio float64": msgpack.packb({"type": "Audio", "pcm": AUDIO.tolist()}),  # type: ignore
+    "Text": msgpack.packb(  # type: ignore
+        {"type": "Text", "text": "bonjour", "start_s": 1.84, "stop_s": 2.1}
+    ),
+}
+
+# `TTSAudioMessage.pcm` used to be a `list[float]`.
+FLOAT_LIST_ADAPTER = TypeAdapter(list[float])
+
+
+def decode_before(message_bytes: bytes) -> object:
+    data = msgpack.unpackb(message_bytes)
+    if data["type"] == "Audio":
+        return np.array(FLOAT_LIST_ADAPTER.validate_python(data["pcm"]), np.float32)
+    return TTSMessageAdapter.validate_python(data)
+
+
+def per_sec(fn: Callable[[], object], duration_sec: float) -> float:
+    n = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < duration_sec:
+        for _ in range(100):
+            fn()
+        n += 100
+    return n / elapsed
+
+
+def main(duration_sec: float):
+    print(f"{'receive':<20}{'before/s':>12}{'fast/s':>14}{'speedup':>10}")
+    for name, message in MESSAGES.items():
+        slow_rate = per_sec(lambda m=message: decode_before(m), duration_sec)
+        fast_rate = per_sec(lambda m=message: decode_tts_message(m), duration_sec)
+        print(
+            f"{name:<20}{slow_rate:>12,.0f}{fast_rate:>14,.0f}"
+            f"{fast_rate / slow_rate:>9.1f}x"
+        )
+
+    frames_per_sec = per_sec(
+        lambda: decode_tts_message(MESSAGES["Audio float32"]), duration_sec
+    )
+    # A session receives 12.5 frames per second.
+    print(f"\nOne core decodes the audio of {frames_per_sec / 12.5:,.0f} sessions")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration-sec", type=float, default=1.0)
+    args = parser.parse_args()
+
+    main(args.duration_sec)
@@ -0,0 +1,88 @@
+"""Compare the size and encoding time of Whisper uploads per second of speech.
+
+"wav 24k" is what used to be uploaded: the raw 24 kHz buffer as 16-bit WAV. The other
+rows go through `prepare_upload`, which also trims the silence around the speech.
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import sphn
+
+from unmute.stt.whisper_upload import UploadFormat, encode_wav, prepare_upload
+
+VOICES_DIR = Path(__file__).parents[1] / "loadtest" / "voices"
+SAMPLE_RATE = 24000
+SILENCE_THRESHOLD = 0.02
+# Like an utterance that ends when the user has been silent for 2 s.
+TRAILING_SILENCE_SEC = 2.0
+
+
+def load_utterances() -> list[np.ndarray]:
+    utterances = []
+    for path in sorted(VOICES_DIR.glob("*.mp3")):
+        data, sample_rate = sphn.read(str(path))
+        audio = sphn.resample(data[0], sample_rate, SAMPLE_RATE).astype(np.float32)
+        silence = np.zeros(int(TRAILING_SILENCE_SEC * SAMPLE_RATE), dtype=np.float32)
+        utterances.append(np.concatenate([audio, silence]))
+    return utterances
+
+
+def bench(
+    encode: Callable[[np.ndarray], bytes], utterances: list[np.ndarray], n: int
+) -> tuple[float, float]:
+    """Returns the bytes and encoding ms per second of buffered audio."""
+    total_bytes = 0
+    start = time.perf_counter()
+    for _ in range(n):
+        for audio in utterances:
+            total_bytes += len(encode(audio))
+    elapsed = time.perf_counter() - start
+
+    audio_sec = n * sum(len(audio) for audio in utterances) / SAMPLE_RATE
+    return total_bytes / audio_sec, elapsed * 1000 / audio_sec
+
+
+def main(duration_sec: float):
+    utterances = load_utterances()
+    audio_sec = sum(len(audio) for audio in utterances) / SAMPLE_RATE
+    print(f"{len(utterances)} utterances, {audio_sec:.1f}s of audio")
+
+    def upload_size(format: UploadFormat) -> Callable[[np.ndarray], bytes]:
+        def encode(audio: np.ndarray) -> bytes:
+            upload = prepare_upload(audio, SAMPLE_RATE, SILENCE_THRESHOLD, format)
+            return upload[1] if upload is not None else b""
+
+        return encode
+
+    cases: dict[str, Callable[[np.ndarray], bytes]] = {
+        "wav 24k": lambda audio: encode_wav(audio, SAMPLE_RATE),
+        "wav 16k trimmed": upload_size("wav"),
+        "opus 16k trimmed": upload_size("opus"),
+    }
+
+    print(f"{'format':<20}{'bytes/s':>12}{'encode ms/s':>14}{'size':>8}")
+    baseline = None
+    for name, encode in cases.items():
+        # Calibrate the number of repetitions to the requested duration.
+        start = time.perf_counter()
+        bench(encode, utterances, 1)
+        n = max(1, int(duration_sec / (time.perf_counter() - start)))
+
+        bytes_per_sec, ms_per_sec = bench(encode, utterances, n)
+        baseline = baseline or bytes_per_sec
+        print(
+            f"{name:<20}{bytes_per_sec:>12,.0f}{ms_per_sec:>14.2f}"
+            f"{bytes_per_sec / baseline:>8.1%}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration-sec", type=float, default=2.0)
+    args = parser.parse_args()
+
+    main(args.duration_sec)
@@ -0,0 +1,168 @@
+"""Evaluate the voice activity detectors on the loadtest voices mixed with noise.
+
+Each voice is surrounded by noise-only audio and mixed with noise at a given SNR. The
+reference speech is the part of the clean voice between its first and last loud frame.
+For each VAD, noise type and SNR, this prints:
+- recall: fraction of the reference speech classified as speech,
+- false alarms: fraction of the noise-only audio classified as speech,
+- end delay: from the end of the speech to when the VAD says it ended,
+- missed ends: voices whose end was not detected before the end of the audio,
+- triggers/min: speech onsets per minute of noise alone, each of which would
+  eventually cost a Whisper request.
+"""
+
+import argparse
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import sphn
+
+from unmute.stt.vad import EnergyVAD, FeatureVAD, VoiceActivityDetector
+from unmute.stt.whisper_upload import speech_bounds
+
+VOICES_DIR = Path(__file__).parents[1] / "loadtest" / "voices"
+SAMPLE_RATE = 24000
+CHUNK_SIZE = 1920  # What the handler receives
+SPEECH_RMS = 0.1  # -20 dBFS
+LEADING_NOISE_SEC = 2.0
+TRAILING_NOISE_SEC = 3.0
+NOISE_ONLY_SEC = 60.0
+
+VADS: dict[str, Callable[[int], VoiceActivityDetector]] = {
+    "energy": EnergyVAD,
+    "feature": FeatureVAD,
+}
+
+
+def white_noise(rng: np.random.Generator, n: int) -> np.ndarray:
+    return rng.standard_normal(n)
+
+
+def pink_noise(rng: np.random.Generator, n: int) -> np.ndarray:
+    spectrum = np.fft.rfft(rng.standard_normal(n))
+    spectrum /= np.sqrt(np.maximum(1, np.arange(len(spectrum))))
+    return np.fft.irfft(spectrum, n)
+
+
+def hum_noise(rng: np.random.Generator, n: int) -> np.ndarray:
+    t = np.arange(n) / SAMPLE_RATE
+    hum = sum(np.sin(2 * np.pi * 50 * k * t) / k for k in range(1, 6))
+    return hum + 0.1 * rng.standard_normal(n)
+
+
+def babble_noise(rng: np.random.Generator, n: int) -> np.ndarray:
+    """Several of the voices at once, like a crowd."""
+    voices = [load_voice(path) for path in sorted(VOICES_DIR.glob("*.mp3"))]
+    babble = np.zeros(n)
+    for voice in voices:
+        start = rng.integers(len(voice))
+        babble += np.resize(np.roll(voice, -start), n)
+    return babble
+
+
+NOISES: dict[str, Callable[[np.random.Generator, int], np.ndarray]] = {
+    "white": white_noise,
+    "pink": pink_noise,
+    "hum": hum_noise,
+    "babble": babble_noise,
+}
+
+
+def load_voice(path: Path) -> np.ndarray:
+    data, sample_rate = sphn.read(str(path))
+    voice = sphn.resample(data[0], sample_rate, SAMPLE_RATE).astype(np.float64)
+    start, end = speech_bounds(voice, SAMPLE_RATE, threshold=0.01)
+    voice = voice[start:end]
+    return voice * SPEECH_RMS / np.sqrt(np.mean(voice**2))
+
+
+def run_vad(vad: VoiceActivityDetector, audio: np.ndarray) -> np.ndarray:
+    """Whether each chunk is speech."""
+    audio = audio.astype(np.float32)
+    return np.array(
+        [
+            vad.process(audio[i : i + CHUNK_SIZE]).is_speech
+            for i in range(0, len(audio) - CHUNK_SIZE + 1, CHUNK_SIZE)
+        ]
+    )
+
+
+def evaluate(
+    make_vad: Callable[[int], VoiceActivityDetector],
+    make_noise: Callable[[np.random.Generator, int], np.ndarray],
+    snr_db: float,
+    voices: list[np.ndarray],
+    seed: int,
+) -> dict[str, float]:
+    rng = np.random.default_rng(seed)
+    noise_rms = SPEECH_RMS * 10 ** (-snr_db / 20)
+    chunk_sec = CHUNK_SIZE / SAMPLE_RATE
+
+    def noise(n: int) -> np.ndarray:
+        x = make_noise(rng, n)
+        return x * noise_rms / np.sqrt(np.mean(x**2))
+
+    recalls, false_alarms, end_delays = [], [], []
+    missed_ends = 0
+    for voice in voices:
+        lead = int(LEADING_NOISE_SEC * SAMPLE_RATE)
+        trail = int(TRAILING_NOISE_SEC * SAMPLE_RATE)
+        clean = np.concatenate([np.zeros(lead), voice, np.zeros(trail)])
+        decisions = run_vad(make_vad(SAMPLE_RATE), clean + noise(len(clean)))
+
+        speech_start = lead // CHUNK_SIZE
+        speech_end = (lead + len(voice)) // CHUNK_SIZE
+        recalls.append(decisions[speech_start:speech_end].mean())
+        false_alarms.append(decisions[:speech_start].mean())
+
+        after = decisions[speech_end:]
+        if after.all():
+            missed_ends += 1
+        else:
+            # Last chunk classified as speech after the end of the voice.
+            last_speech = np.flatnonzero(after)
+            n_chunks = last_speech[-1] + 1 if last_speech.size else 0
+            end_delays.append(n_chunks * chunk_sec)
+
+    decisions = run_vad(make_vad(SAMPLE_RATE), noise(int(NOISE_ONLY_SEC * SAMPLE_RATE)))
+    onsets = np.count_nonzero(np.diff(decisions.astype(int)) == 1) + decisions[0]
+
+    return {
+        "recall": float(np.mean(recalls)),
+        "false_alarms": float(np.mean(false_alarms)),
+        "end_delay_ms": float(np.mean(end_delays)) * 1000 if end_delays else np.nan,
+        "missed_ends": missed_ends,
+        "triggers_per_min": onsets * 60 / NOISE_ONLY_SEC,
+    }
+
+
+def main(snrs_db: list[float], noises: list[str], seed: int):
+    voices = [load_voice(path) for path in sorted(VOICES_DIR.glob("*.mp3"))]
+    print(f"{len(voices)} voices, {sum(map(len, voices)) / SAMPLE_RATE:.1f}s")
+
+    print(
+        f"{'noise':<8}{'snr':>5}{'vad':>9}{'recall':>8}{'false al.':>11}"
+        f"{'end delay':>11}{'missed ends':>13}{'triggers/min':>14}"
+    )
+    for noise_name in noises:
+        for snr_db in snrs_db:
+            for vad_name, make_vad in VADS.items():
+                r = evaluate(make_vad, NOISES[noise_name], snr_db, voices, seed)
+                print(
+                    f"{noise_name:<8}{snr_db:>5.0f}{vad_name:>9}{r['recall']:>8.1%}"
+                    f"{r['false_alarms']:>11.1%}{r['end_delay_ms']:>9.0f}ms"
+                    f"{r['missed_ends']:>13}{r['triggers_per_min']:>14.1f}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snr-db", type=float, nargs="+", default=[20, 10, 5])
+    parser.add_argument(
+        "--noise", choices=list(NOISES), nargs="+", default=list(NOISES)
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    main(args.snr_db, args.noise, args.seed)
@@ -71,7 +71,7 @@ class TTSHandler(AsyncStreamHandler):
                     )
 
                 if isinstance(message, TTSAudioMessage):
-                    audio = np.array(message.pcm, dtype=np.float32)
+                    audio = message.pcm
                     assert self.output_sample_rate == SAMPLE_RATE
 
                     assert len(audio) % OUTPUT_FRAME_SIZE == 0, (
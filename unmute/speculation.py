@@ -0,0 +1,99 @@
+"""Getting ready for the answer before the user's turn is known to be over.
+
+Between the moment the user stops speaking and the moment the answer starts (the pause
+is confirmed, or the button is pulled), nothing happens: the TTS connection is only
+opened once the answer starts, and the connection to the LLM may have been closed
+since the last turn. With `SPECULATIVE_TURNS`, the handler starts a `TurnSpeculation`
+as soon as the pause prediction rises: it takes a TTS connection for the voice and
+opens the connection to the LLM, so that both overlap with the end of the turn.
+
+If the user goes on speaking, the speculation is cancelled and the TTS connection,
+which was never used, goes back to the pool for the next turn. So a wrong guess costs
+little more than an HTTP request to the LLM server.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from unmute import metrics as mt
+from unmute.timer import Stopwatch
+from unmute.tts.tts_pool import ConnectionPool, PooledConnection
+
+logger = logging.getLogger(__name__)
+
+# A speculation holds a TTS server slot, so it doesn't wait for the answer forever.
+SPECULATION_MAX_AGE_SEC = 10.0
+
+C = TypeVar("C", bound=PooledConnection)
+
+
+class TurnSpeculation(Generic[C]):
+    def __init__(
+        self,
+        pool: ConnectionPool[C],
+        voice: str | None,
+        warm_up_llm: Callable[[], Awaitable[object]] | None = None,
+        max_age_sec: float = SPECULATION_MAX_AGE_SEC,
+    ):
+        """Start getting a TTS connection for `voice` and calling `warm_up_llm`."""
+        self.pool = pool
+        self.voice = voice
+        self.max_age_sec = max_age_sec
+        self.stopwatch = Stopwatch()
+        self._connection = asyncio.create_task(
+            pool.checkout(voice), name="speculative_tts"
+        )
+        self._warm_up = (
+            asyncio.create_task(self._warm_up_llm(warm_up_llm), name="warm_up_llm")
+            if warm_up_llm is not None
+            else None
+        )
+
+    @staticmethod
+    async def _warm_up_llm(warm_up_llm: Callable[[], Awaitable[object]]):
+        try:
+            await warm_up_llm()
+        except Exception as e:
+            # Only an optimization, the answer makes its own request anyway.
+            logger.debug(f"LLM warm-up failed: {e!r}")
+
+    def is_expired(self) -> bool:
+        return self.stopwatch.time() > self.max_age_sec
+
+    async def commit(self, voice: str | None) -> C | None:
+        """The TTS connection for the answer, or None if it must connect by itself."""
+        if voice != self.voice:
+            await self.cancel("failed")
+            return None
+
+        try:
+            connection = await self._connection
+        except Exception as e:
+            logger.warning(f"Speculative TTS connection failed: {e!r}")
+            mt.SPECULATIONS.labels(outcome="failed").inc()
+            return None
+
+        if connection.state() != "connected":
+            # It waited for up to `max_age_sec`, the TTS server may have closed it.
+            logger.warning("Speculative TTS connection was closed, connecting again")
+            mt.SPECULATIONS.labels(outcome="failed").inc()
+            await connection.shutdown()
+            return None
+
+        mt.SPECULATIONS.labels(outcome="hit").inc()
+        mt.SPECULATION_LEAD_TIME.observe(self.stopwatch.time())
+        return connection
+
+    async def cancel(self, outcome: str = "resumed"):
+        """Give up, e.g. because the user resumed speaking."""
+        mt.SPECULATIONS.labels(outcome=outcome).inc()
+        if self._warm_up is not None:
+            self._warm_up.cancel()
+
+        task = self._connection
+        task.cancel()
+        await asyncio.wait([task])
+        # It may have been done already, then it wasn't cancelled.
+        if not task.cancelled() and task.exception() is None:
+            self.pool.checkin(self.voice, task.result())
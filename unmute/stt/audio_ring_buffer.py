@@ -0,0 +1,115 @@
+"""Fixed-size buffer of audio samples.
+
+Storing samples in a `deque` of Python floats costs an object per sample and a full
+conversion every time the audio is needed as an array. `AudioRingBuffer` preallocates
+a numpy array instead and appends whole frames at once.
+
+Each sample is written twice, at `i` and `i + capacity`, so that the buffered audio is
+always a contiguous slice of the array: `view()` never copies, even after the write
+position wrapped around. Writing twice is cheap compared to copying the whole buffer.
+"""
+
+from typing import Literal
+
+import numpy as np
+
+OverflowPolicy = Literal["drop_oldest", "drop_newest", "error"]
+
+
+class AudioBufferOverflow(Exception):
+    """Appending would exceed the capacity of an `AudioRingBuffer`."""
+
+
+class AudioRingBuffer:
+    """Preallocated mono audio buffer.
+
+    Args:
+        capacity: Maximum number of samples.
+        dtype: Type of the stored samples, e.g. float32 or int16. Appended frames are
+            cast to it.
+        overflow: What to do when appending more than fits. "drop_oldest" keeps the
+            most recent samples, "drop_newest" ignores what doesn't fit and "error"
+            raises `AudioBufferOverflow` without appending anything. The number of
+            samples dropped is counted in `dropped_samples`.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        dtype: type[np.floating] | type[np.integer] = np.float32,
+        overflow: OverflowPolicy = "error",
+    ):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+
+        self.capacity = capacity
+        self.overflow = overflow
+        self._data = np.zeros(2 * capacity, dtype=dtype)
+        self._start = 0
+        self._length = 0
+        self.dropped_samples = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self._length
+
+    def append(self, frame: np.ndarray):
+        frame = frame.reshape(-1)
+        n = frame.shape[0]
+
+        if n > self.free:
+            if self.overflow == "error":
+                raise AudioBufferOverflow(
+                    f"Can't append {n} samples, only {self.free} free "
+                    f"out of {self.capacity}"
+                )
+            elif self.overflow == "drop_newest":
+                self.dropped_samples += n - self.free
+                frame = frame[: self.free]
+                n = frame.shape[0]
+            else:
+                if n > self.capacity:
+                    self.dropped_samples += n - self.capacity
+                    frame = frame[-self.capacity :]
+                    n = self.capacity
+                to_drop = n - self.free
+                self.dropped_samples += to_drop
+                self._start = (self._start + to_drop) % self.capacity
+                self._length -= to_drop
+
+        self._write((self._start + self._length) % self.capacity, frame)
+        self._length += n
+
+    def _write(self, position: int, frame: np.ndarray):
+        n = frame.shape[0]
+        first = min(n, self.capacity - position)
+        mirror = position + self.capacity
+        self._data[position : position + first] = frame[:first]
+        self._data[mirror : mirror + first] = frame[:first]
+
+        rest = n - first
+        if rest:
+            self._data[:rest] = frame[first:]
+            self._data[self.capacity : self.capacity + rest] = frame[first:]
+
+    def view(self) -> np.ndarray:
+        """The buffered samples, oldest first, without copying.
+
+        The view is read-only and only valid until the next `append()` or `clear()`.
+        """
+        view = self._data[self._start : self._start + self._length]
+        view.flags.writeable = False
+        return view
+
+    def discard(self, n: int):
+        """Drop the `n` oldest samples."""
+        n = min(n, self._length)
+        self._start = (self._start + n) % self.capacity
+        self._length -= n
+
+    def clear(self):
+        self._start = 0
+        self._length = 0
@@ -5,6 +5,7 @@ latency.
 """
 
 import asyncio
+import math
 from logging import getLogger
 from typing import AsyncIterator, Literal
 
@@ -45,6 +46,13 @@ class DummySpeechToText(ServiceWithStartup):
     async def send_audio(self, audio: np.ndarray) -> None:
         self.current_time += FRAME_TIME_SEC
 
+    async def flush(self) -> asyncio.Future[None]:
+        num_frames = int(math.ceil(self.delay_sec / FRAME_TIME_SEC)) + 1
+        self.current_time += num_frames * FRAME_TIME_SEC
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        return future
+
     async def send_marker(self, id: int) -> None:
         return
 
@@ -0,0 +1,253 @@
+"""Whisper running on the CPU, shared by all the sessions of the process.
+
+Needs faster-whisper (`pip install faster-whisper`), which runs Whisper with
+CTranslate2. The model is downloaded and loaded on the first transcription.
+
+Whisper's encoder always processes 30 s of audio, however short the utterance, so
+transcribing utterances one by one wastes most of the CPU time. Instead, the
+`TranscriptionScheduler` groups the utterances waiting from all the sessions into
+batches of up to `LOCAL_STT_MAX_BATCH_SIZE`, which cost little more than a single
+utterance. Batches run one after the other in a dedicated thread, using all the cores,
+so the event loop is never blocked. While a batch runs, new utterances wait and form
+the next batch.
+"""
+
+import asyncio
+import bisect
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import cache
+from typing import Callable, Protocol
+
+import numpy as np
+import sphn
+
+from unmute import metrics as mt
+from unmute.kyutai_constants import (
+    LOCAL_STT_CPU_THREADS,
+    LOCAL_STT_LANGUAGE,
+    LOCAL_STT_MAX_BATCH_SIZE,
+    LOCAL_STT_MODEL,
+)
+
+logger = logging.getLogger(__name__)
+
+ENGINE_SAMPLE_RATE = 16000
+# How long to wait for other utterances to batch with one that arrives alone.
+BATCH_WAIT_SEC = 0.01
+# Silence between the utterances of a batch, see `FasterWhisperEngine`.
+CLIP_GAP_SEC = 1.0
+
+
+class TranscriptionEngine(Protocol):
+    def transcribe_batch(
+        self, audios: list[np.ndarray], prompts: list[str]
+    ) -> list[str]:
+        """Transcribe float32 mono audios at 16 kHz. Blocking."""
+        ...
+
+
+class FasterWhisperEngine:
+    def __init__(
+        self,
+        model: str = LOCAL_STT_MODEL,
+        language: str | None = LOCAL_STT_LANGUAGE,
+        cpu_threads: int = LOCAL_STT_CPU_THREADS,
+    ):
+        from faster_whisper import BatchedInferencePipeline, WhisperModel
+
+        logger.info(f"Loading Whisper model {model!r} on the CPU")
+        self.pipeline = BatchedInferencePipeline(
+            WhisperModel(
+                model, device="cpu", compute_type="int8", cpu_threads=cpu_threads
+            )
+        )
+        self.language = language
+
+    def transcribe_batch(
+        self, audios: list[np.ndarray], prompts: list[str]
+    ) -> list[str]:
+        # The pipeline takes a single prompt. Without partial transcriptions, which
+        # `LocalTranscriber` doesn't do, they are all empty anyway.
+        by_prompt: dict[str, list[int]] = {}
+        for i, prompt in enumerate(prompts):
+            by_prompt.setdefault(prompt, []).append(i)
+
+        texts = [""] * len(audios)
+        for prompt, indices in by_prompt.items():
+            group = self._transcribe_clips([audios[i] for i in indices], prompt)
+            for i, text in zip(indices, group, strict=True):
+                texts[i] = text
+        return texts
+
+    def _transcribe_clips(self, audios: list[np.ndarray], prompt: str) -> list[str]:
+        """Transcribe the audios in a single batch of the pipeline.
+
+        The pipeline batches the clips of one audio, so the utterances are put one
+        after the other, with some silence in between to tell their segments apart.
+        """
+        gap = np.zeros(int(CLIP_GAP_SEC * ENGINE_SAMPLE_RATE), dtype=np.float32)
+        parts: list[np.ndarray] = []
+        starts: list[float] = []
+        clips: list[dict[str, float]] = []
+        offset = 0
+        for audio in audios:
+            start = offset / ENGINE_SAMPLE_RATE
+            starts.append(start)
+            clips.append(
+                {"start": start, "end": start + len(audio) / ENGINE_SAMPLE_RATE}
+            )
+            parts += [audio, gap]
+            offset += len(audio) + len(gap)
+
+        segments, _info = self.pipeline.transcribe(
+            np.concatenate(parts),
+            language=self.language,
+            # Sessions may speak different languages, detect it for each utterance.
+            multilingual=self.language is None,
+            initial_prompt=prompt or None,
+            clip_timestamps=clips,
+            vad_filter=False,
+            batch_size=len(audios),
+            beam_size=1,
+        )
+
+        texts: list[list[str]] = [[] for _ in audios]
+        for segment in segments:
+            i = bisect.bisect_right(starts, segment.start + CLIP_GAP_SEC / 2) - 1
+            texts[max(i, 0)].append(segment.text)
+        return ["".join(text).strip() for text in texts]
+
+
+@dataclass
+class _Request:
+    audio: np.ndarray
+    sample_rate: int
+    prompt: str
+    future: asyncio.Future[str]
+    submitted_at: float
+
+
+class TranscriptionScheduler:
+    def __init__(
+        self,
+        engine_factory: Callable[[], TranscriptionEngine],
+        max_batch_size: int = LOCAL_STT_MAX_BATCH_SIZE,
+        batch_wait_sec: float = BATCH_WAIT_SEC,
+    ):
+        """Batch the transcriptions of the process.
+
+        Args:
+            engine_factory: Creates the engine, in the inference thread since loading
+                a model is slow.
+            max_batch_size: Maximum number of utterances transcribed together.
+            batch_wait_sec: How long to wait for more utterances before running a
+                batch that isn't full.
+        """
+        self.engine_factory = engine_factory
+        self.engine: TranscriptionEngine | None = None
+        self.max_batch_size = max_batch_size
+        self.batch_wait_sec = batch_wait_sec
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stt")
+        self._queue: asyncio.Queue[_Request] | None = None
+        self._scheduler_task: asyncio.Task[None] | None = None
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        task = self._scheduler_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._scheduler_task = loop.create_task(
+                self._schedule(self._queue), name="stt_batch_scheduler"
+            )
+
+    async def transcribe(self, audio: np.ndarray, sample_rate: int, prompt: str) -> str:
+        self._ensure_started()
+        assert self._queue is not None
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(
+            _Request(audio, sample_rate, prompt, future, time.perf_counter())
+        )
+        return await future
+
+    async def _next_batch(self, queue: asyncio.Queue[_Request]) -> list[_Request]:
+        batch = [await queue.get()]
+        deadline = time.perf_counter() + self.batch_wait_sec
+        while len(batch) < self.max_batch_size:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except TimeoutError:
+                break
+
+        # The session may have ended in the meantime.
+        return [request for request in batch if not request.future.done()]
+
+    async def _schedule(self, queue: asyncio.Queue[_Request]):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch(queue)
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            for request in batch:
+                mt.STT_LOCAL_QUEUE_TIME.observe(start - request.submitted_at)
+            mt.STT_LOCAL_BATCH_SIZE.observe(len(batch))
+
+            try:
+                texts = await loop.run_in_executor(
+                    self._executor, self._transcribe_batch, batch
+                )
+            except Exception as e:
+                logger.error(f"Local transcription of {len(batch)} utterances failed")
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+
+            mt.STT_LOCAL_INFERENCE_TIME.observe(time.perf_counter() - start)
+            for request, text in zip(batch, texts, strict=True):
+                if not request.future.done():
+                    request.future.set_result(text)
+
+    def _transcribe_batch(self, batch: list[_Request]) -> list[str]:
+        """Runs in the inference thread."""
+        if self.engine is None:
+            self.engine = self.engine_factory()
+
+        audios = [
+            request.audio
+            if request.sample_rate == ENGINE_SAMPLE_RATE
+            else sphn.resample(request.audio, request.sample_rate, ENGINE_SAMPLE_RATE)
+            for request in batch
+        ]
+        return self.engine.transcribe_batch(audios, [r.prompt for r in batch])
+
+
+@cache
+def get_transcription_scheduler() -> TranscriptionScheduler:
+    """The scheduler shared by all the sessions of the process."""
+    return TranscriptionScheduler(FasterWhisperEngine)
+
+
+class LocalTranscriber:
+    # Not a `WordTranscriber`: partial transcriptions are not needed, there is no
+    # network round trip, and the CPU is better spent on the end of the utterances.
+
+    def __init__(self, scheduler: TranscriptionScheduler | None = None):
+        self.scheduler = scheduler or get_transcription_scheduler()
+
+    async def transcribe(self, audio: np.ndarray, sample_rate: int, prompt: str) -> str:
+        if audio.size == 0:
+            return ""
+        # A copy, the caller's buffer may be reused while the request waits.
+        return await self.scheduler.transcribe(audio.copy(), sample_rate, prompt)
@@ -0,0 +1,63 @@
+"""Confirm the words of repeated transcriptions of an utterance in progress.
+
+Whisper isn't a streaming model: transcribing the audio received so far gives a
+hypothesis whose last words change as more audio comes in. A word is confirmed once
+two consecutive hypotheses agree on it, the "local agreement" policy of
+whisper_streaming. Confirmed words are final: they are sent to the client and the
+audio they cover is dropped, so the next window starts after the last confirmed word.
+The unconfirmed tail is transcribed again with more audio after it, so consecutive
+windows overlap, and the confirmed words are passed as a prompt to keep the context.
+
+At the end of the utterance, only the audio after the last confirmed word is left to
+transcribe, which is much faster than transcribing the whole utterance.
+"""
+
+import re
+from dataclasses import dataclass
+
+# How many confirmed words to pass as the prompt of the next transcription.
+PROMPT_WORDS = 50
+
+
+@dataclass
+class TimedWord:
+    text: str
+    start: float  # In seconds, from the start of the transcribed window
+    end: float
+
+
+def normalize_word(word: str) -> str:
+    """Ignore case and punctuation, which change between hypotheses."""
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+class TranscriptStabilizer:
+    def __init__(self):
+        # Unconfirmed words of the last hypothesis, normalized.
+        self.previous: list[str] = []
+        self.confirmed: list[str] = []
+
+    def update(self, words: list[TimedWord]) -> list[TimedWord]:
+        """Compare the hypothesis for the audio after the confirmed words with the
+        previous one.
+
+        Returns:
+            The newly confirmed words: the common prefix of the two hypotheses.
+        """
+        n_agreeing = 0
+        for previous, word in zip(self.previous, words, strict=False):
+            if previous != normalize_word(word.text):
+                break
+            n_agreeing += 1
+
+        confirmed = words[:n_agreeing]
+        self.previous = [normalize_word(word.text) for word in words[n_agreeing:]]
+        self.confirmed.extend(word.text for word in confirmed)
+        return confirmed
+
+    def prompt(self) -> str:
+        return " ".join(self.confirmed[-PROMPT_WORDS:])
+
+    def reset(self):
+        self.previous = []
+        self.confirmed = []
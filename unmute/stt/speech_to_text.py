@@ -1,7 +1,9 @@
 import asyncio
+import math
 import random
+from collections import deque
 from logging import getLogger
-from typing import AsyncIterator, Literal, Union
+from typing import AsyncIterator, Literal, Union, get_args
 
 import msgpack
 import numpy as np
@@ -15,10 +17,13 @@ from unmute.kyutai_constants import (
     FRAME_TIME_SEC,
     HEADERS,
     SAMPLE_RATE,
+    SAMPLES_PER_FRAME,
     SPEECH_TO_TEXT_PATH,
     STT_DELAY_SEC,
+    STT_PCM_FORMAT,
     STT_SERVER,
 )
+from unmute.pydantic_utils import construct
 from unmute.service_discovery import ServiceWithStartup
 from unmute.stt.exponential_moving_average import ExponentialMovingAverage
 from unmute.timer import Stopwatch
@@ -68,13 +73,93 @@ STTMessage = Union[
 ]
 STTMessageAdapter = TypeAdapter(STTMessage)
 
+# How the audio is sent to the STT server:
+# - "list": a msgpack array of float32, what the Kyutai STT server expects,
+# - "float32", "int16": the little-endian samples as msgpack bin, with a "pcm_format"
+#   field. 20% and 60% smaller and cheaper to encode, but the server must support it.
+STTPcmFormat = Literal["list", "float32", "int16"]
+
+_AUDIO_MESSAGE_PREFIX = msgpack.packb({"type": "Audio", "pcm": []})[:-1]  # type: ignore
+# A msgpack float32: the 0xca marker, then the big-endian value.
+_MSGPACK_FLOAT32 = np.dtype([("marker", "u1"), ("value", ">f4")])
+
+
+def _msgpack_array_header(n: int) -> bytes:
+    if n < 16:
+        return bytes([0x90 | n])
+    elif n < 2**16:
+        return b"\xdc" + n.to_bytes(2, "big")
+    else:
+        return b"\xdd" + n.to_bytes(4, "big")
+
+
+def encode_audio_message(audio: np.ndarray, pcm_format: STTPcmFormat = "list") -> bytes:
+    """The msgpack "Audio" message for float32 mono audio."""
+    if pcm_format == "list":
+        # The same bytes as `msgpack.packb` of `audio.tolist()`, but without creating
+        # a Python float for each sample.
+        packed = np.empty(audio.size, dtype=_MSGPACK_FLOAT32)
+        packed["marker"] = 0xCA
+        packed["value"] = audio
+        return (
+            _AUDIO_MESSAGE_PREFIX + _msgpack_array_header(audio.size) + packed.tobytes()
+        )
+    elif pcm_format == "float32":
+        pcm = audio.astype("<f4", copy=False).tobytes()
+    elif pcm_format == "int16":
+        pcm = (audio * 32767).clip(-32767, 32767).astype("<i2").tobytes()
+    else:
+        raise ValueError(f"Unknown PCM format {pcm_format!r}")
+
+    return msgpack.packb(  # type: ignore
+        {"type": "Audio", "pcm": pcm, "pcm_format": pcm_format}, use_bin_type=True
+    )
+
+
+def _is_float_list(value: object) -> bool:
+    return type(value) is list and all(type(x) is float for x in value)
+
+
+def decode_stt_message(message_bytes: bytes) -> STTMessage:
+    """Unpack and validate a message from the STT server.
+
+    The frequent messages, `Step` (every 80 ms) and `Word`, are checked by hand and
+    constructed without going through pydantic, everything else is validated.
+    """
+    data = msgpack.unpackb(message_bytes)
+    if type(data) is dict:
+        message_type = data.get("type")
+        if message_type == "Step":
+            step_idx, prs = data.get("step_idx"), data.get("prs")
+            if type(step_idx) is int and _is_float_list(prs):
+                return construct(
+                    STTStepMessage, {"type": "Step", "step_idx": step_idx, "prs": prs}
+                )
+        elif message_type == "Word":
+            text, start_time = data.get("text"), data.get("start_time")
+            if type(text) is str and type(start_time) is float:
+                return construct(
+                    STTWordMessage,
+                    {"type": "Word", "text": text, "start_time": start_time},
+                )
+
+    return STTMessageAdapter.validate_python(data)
+
 
 class SpeechToText(ServiceWithStartup):
     def __init__(
-        self, stt_instance: str = STT_SERVER, delay_sec: float = STT_DELAY_SEC
+        self,
+        stt_instance: str = STT_SERVER,
+        delay_sec: float = STT_DELAY_SEC,
+        pcm_format: str = STT_PCM_FORMAT,
     ):
+        if pcm_format not in get_args(STTPcmFormat):
+            raise ValueError(
+                f"Unknown PCM format {pcm_format!r}, use one of {get_args(STTPcmFormat)}"
+            )
         self.stt_instance = stt_instance
         self.delay_sec = delay_sec
+        self.pcm_format: STTPcmFormat = pcm_format  # type: ignore
         self.websocket: websockets.ClientConnection | None = None
         self.sent_samples = 0
         self.received_words = 0
@@ -88,6 +173,10 @@ class SpeechToText(ServiceWithStartup):
             attack_time=0.01, release_time=0.01, initial_value=1.0
         )
 
+        # Pending flushes: the time they are done at, their future, when they started.
+        self._flushes: deque[tuple[float, asyncio.Future[None], Stopwatch]] = deque()
+        self._flush_message: bytes | None = None
+
         self.shutdown_complete = asyncio.Event()
 
     def state(self) -> WebsocketState:
@@ -113,7 +202,32 @@ class SpeechToText(ServiceWithStartup):
         self.time_since_first_audio_sent.start_if_not_started()
         mt.STT_SENT_FRAMES.inc()
 
-        await self._send({"type": "Audio", "pcm": audio.tolist()})
+        await self._send_bytes(encode_audio_message(audio, self.pcm_format))
+
+    async def flush(self) -> asyncio.Future[None]:
+        """Push the audio sent so far through the delay of the STT.
+
+        The silence this takes is sent as a single message. Returns a future that is
+        resolved once the STT has processed it, i.e. sent all the words of the audio.
+        """
+        num_frames = int(math.ceil(self.delay_sec / FRAME_TIME_SEC)) + 1  # A margin
+        if self._flush_message is None:
+            silence = np.zeros(num_frames * SAMPLES_PER_FRAME, dtype=np.float32)
+            self._flush_message = encode_audio_message(silence, self.pcm_format)
+
+        future = asyncio.get_running_loop().create_future()
+        self._flushes.append((self.current_time + self.delay_sec, future, Stopwatch()))
+        self.sent_samples += num_frames * SAMPLES_PER_FRAME
+        mt.STT_SENT_FRAMES.inc(num_frames)
+        await self._send_bytes(self._flush_message)
+        return future
+
+    def _resolve_flushes(self):
+        while self._flushes and self.current_time > self._flushes[0][0]:
+            _, future, stopwatch = self._flushes.popleft()
+            mt.STT_FLUSH_DURATION.observe(stopwatch.time())
+            if not future.done():
+                future.set_result(None)
 
     async def send_marker(self, id: int) -> None:
         await self._send({"type": "Marker", "id": id})
@@ -121,7 +235,9 @@ class SpeechToText(ServiceWithStartup):
     async def _send(self, data: dict) -> None:
         """Send an arbitrary message to the STT server."""
         to_send = msgpack.packb(data, use_bin_type=True, use_single_float=True)
+        await self._send_bytes(to_send)  # type: ignore
 
+    async def _send_bytes(self, to_send: bytes) -> None:
         if self.websocket:
             await self.websocket.send(to_send)
         else:
@@ -136,8 +252,7 @@ class SpeechToText(ServiceWithStartup):
 
         try:
             message_bytes = await self.websocket.recv()
-            message_dict = msgpack.unpackb(message_bytes)  # type: ignore
-            message = STTMessageAdapter.validate_python(message_dict)
+            message = decode_stt_message(message_bytes)  # type: ignore
             if isinstance(message, STTReadyMessage):
                 mt.STT_ACTIVE_SESSIONS.inc()
                 return
@@ -185,9 +300,8 @@ class SpeechToText(ServiceWithStartup):
 
         try:
             async for message_bytes in self.websocket:
-                data = msgpack.unpackb(message_bytes)  # type: ignore
-                logger.debug(f"{my_id} {self.pause_prediction.value} got {data}")
-                message: STTMessage = STTMessageAdapter.validate_python(data)
+                message: STTMessage = decode_stt_message(message_bytes)  # type: ignore
+                logger.debug(f"{my_id} {self.pause_prediction.value} got {message}")
 
                 match message:
                     case STTWordMessage():
@@ -200,6 +314,7 @@ class SpeechToText(ServiceWithStartup):
                     case STTStepMessage():
                         self.current_time += FRAME_TIME_SEC
                         mt.STT_RECV_FRAMES.inc()
+                        self._resolve_flushes()
                         if (
                             self.waiting_first_step
                             and self.time_since_first_audio_sent.started
@@ -225,6 +340,9 @@ class SpeechToText(ServiceWithStartup):
             # up as a websockets.ConnectionClosedError.
             pass
         finally:
+            for _, future, _ in self._flushes:
+                future.cancel()
+            self._flushes.clear()
             self.shutdown_complete.set()
             
     # Importa Whisper STT
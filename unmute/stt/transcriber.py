@@ -0,0 +1,105 @@
+"""The speech recognition behind `WhisperSTT`.
+
+`WhisperSTT` decides when and what to transcribe: it runs the VAD, buffers the
+utterances and stabilizes partial transcriptions. A `Transcriber` only turns a chunk
+of audio into text. Which one is used is chosen with `KYUTAI_STT_BACKEND`:
+- "openai": the hosted Whisper API, see `OpenAITranscriber`,
+- "local": a Whisper model running on the CPU of this machine, with the requests of
+  all the sessions of the process batched together, see `local_transcriber.py`.
+"""
+
+import asyncio
+from typing import Protocol, runtime_checkable
+
+import numpy as np
+from openai import NOT_GIVEN
+
+from unmute import metrics as mt
+from unmute.kyutai_constants import STT_BACKEND
+from unmute.stt.partial_transcription import TimedWord
+from unmute.stt.whisper_client import WhisperClient, get_whisper_client
+from unmute.stt.whisper_upload import UploadFormat, prepare_upload
+
+WHISPER_UPLOAD_FORMAT: UploadFormat = "opus"
+
+
+class Transcriber(Protocol):
+    async def transcribe(self, audio: np.ndarray, sample_rate: int, prompt: str) -> str:
+        """Transcribe float32 mono audio.
+
+        `prompt` is the text that comes before the audio, it can be empty.
+        """
+        ...
+
+
+@runtime_checkable
+class WordTranscriber(Transcriber, Protocol):
+    """A `Transcriber` with word timestamps, needed for partial transcriptions."""
+
+    async def transcribe_words(
+        self, audio: np.ndarray, sample_rate: int, prompt: str
+    ) -> list[TimedWord]:
+        """Like `transcribe`, with the time of each word in the audio."""
+        ...
+
+
+class OpenAITranscriber:
+    def __init__(self, client: WhisperClient | None = None):
+        # Shared by all the sessions, for the connections and the rate limits.
+        self.client = client or get_whisper_client()
+
+    async def _upload(
+        self, audio: np.ndarray, sample_rate: int
+    ) -> tuple[str, bytes, str] | None:
+        # The VAD already selected the speech, so no need to trim it. Not trimming
+        # also keeps the word timestamps aligned with `audio`.
+        upload = await asyncio.to_thread(
+            prepare_upload, audio, sample_rate, None, WHISPER_UPLOAD_FORMAT
+        )
+        if upload is not None:
+            mt.STT_UPLOAD_BYTES.observe(len(upload[1]))
+        return upload
+
+    async def transcribe(self, audio: np.ndarray, sample_rate: int, prompt: str) -> str:
+        upload = await self._upload(audio, sample_rate)
+        if upload is None:
+            return ""
+
+        # Directly from memory
+        return await self.client.transcribe(
+            model="whisper-1",
+            file=upload,
+            response_format="text",
+            prompt=prompt or NOT_GIVEN,
+        )
+
+    async def transcribe_words(
+        self, audio: np.ndarray, sample_rate: int, prompt: str
+    ) -> list[TimedWord]:
+        upload = await self._upload(audio, sample_rate)
+        if upload is None:
+            return []
+
+        transcription = await self.client.transcribe(
+            model="whisper-1",
+            file=upload,
+            response_format="verbose_json",
+            timestamp_granularities=["word"],
+            prompt=prompt or NOT_GIVEN,
+        )
+        return [
+            TimedWord(text=word.word, start=word.start, end=word.end)
+            for word in transcription.words or []
+        ]
+
+
+def make_transcriber(backend: str = STT_BACKEND) -> Transcriber:
+    if backend == "openai":
+        return OpenAITranscriber()
+    elif backend == "local":
+        # Imported here, the local backend has optional dependencies.
+        from unmute.stt.local_transcriber import LocalTranscriber
+
+        return LocalTranscriber()
+    else:
+        raise ValueError(f"Unknown STT backend {backend!r}, use 'openai' or 'local'.")
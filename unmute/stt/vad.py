@@ -0,0 +1,190 @@
+"""Voice activity detection for the Whisper STT.
+
+A single RMS threshold can't tell speech from background noise: in a noisy room the
+noise is above the threshold and the end of the utterance is never detected, and
+short noises trigger transcriptions of nothing. `FeatureVAD` instead compares the
+energy to a noise floor that adapts to the room, and rejects frames whose spectrum is
+too flat or which cross zero too often, as noise does. A hangover keeps the speech
+state during the short gaps between words, and a minimum speech length ignores clicks.
+
+The features are computed for all the subframes of a chunk at once with numpy, only
+the small state machine runs per subframe.
+"""
+
+from dataclasses import dataclass
+from typing import Protocol
+
+import numpy as np
+
+# Resolution of the decisions. 20 ms gives a usable spectrum for the flatness.
+SUBFRAME_SEC = 0.02
+# How far above the noise floor the energy of speech is.
+SNR_THRESHOLD_DB = 7.5
+# Frames quieter than this are never speech, whatever the noise floor.
+MIN_SPEECH_ENERGY_DB = -45.0
+# Noise has a flat spectrum (white noise: ~0.55), voiced speech a peaky one (< 0.1).
+MAX_SPECTRAL_FLATNESS = 0.35
+# Fraction of consecutive samples with different signs. White noise: ~0.5.
+MAX_ZERO_CROSSING_RATE = 0.35
+# Time for the noise floor to move halfway to the energy of non-speech frames.
+NOISE_FLOOR_RISE_SEC = 1.0
+NOISE_FLOOR_FALL_SEC = 0.1
+# The noise floor is at least this percentile of the energy over the window, so that
+# it catches up with a louder or fluctuating noise, like a crowd, even if that noise is
+# classified as speech.
+NOISE_FLOOR_WINDOW_SEC = 5.0
+NOISE_FLOOR_PERCENTILE = 35
+# Low, the percentile brings it up to the actual noise in the first chunk.
+NOISE_FLOOR_INITIAL_DB = -70.0
+# Speech must last this long to count, and ends after this much non-speech.
+MIN_SPEECH_SEC = 0.1
+HANGOVER_SEC = 0.3
+
+
+@dataclass
+class VadResult:
+    is_speech: bool
+    """Whether the user is speaking at the end of the chunk."""
+    speech_sec: float
+    """How much of the chunk is speech."""
+
+
+class VoiceActivityDetector(Protocol):
+    def process(self, audio: np.ndarray) -> VadResult:
+        """Classify the next chunk of float32 mono audio."""
+        ...
+
+    def reset(self) -> None:
+        """Forget the speech state, but not what was learned about the noise."""
+        ...
+
+
+class EnergyVAD:
+    """Speech if the RMS of the chunk is above a fixed threshold."""
+
+    def __init__(self, sample_rate: int, threshold: float = 0.02):
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+
+    def process(self, audio: np.ndarray) -> VadResult:
+        rms = np.sqrt(np.dot(audio, audio) / max(1, audio.size))
+        is_speech = bool(rms >= self.threshold)
+        return VadResult(is_speech, audio.size / self.sample_rate if is_speech else 0.0)
+
+    def reset(self):
+        pass
+
+
+def frame_features(frames: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """The energy in dBFS, spectral flatness and zero-crossing rate of each row."""
+    frame_size = frames.shape[1]
+    energy = np.einsum("ij,ij->i", frames, frames) / frame_size
+    energy_db = 10 * np.log10(energy + 1e-10)
+
+    power = np.abs(np.fft.rfft(frames * np.hanning(frame_size), axis=1)[:, 1:]) ** 2
+    power += 1e-12
+    flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+
+    crossings = np.count_nonzero(np.diff(np.signbit(frames), axis=1), axis=1)
+    zero_crossing_rate = crossings / (frame_size - 1)
+
+    return energy_db, flatness, zero_crossing_rate
+
+
+class FeatureVAD:
+    def __init__(
+        self,
+        sample_rate: int,
+        snr_threshold_db: float = SNR_THRESHOLD_DB,
+        max_spectral_flatness: float = MAX_SPECTRAL_FLATNESS,
+        max_zero_crossing_rate: float = MAX_ZERO_CROSSING_RATE,
+        min_speech_sec: float = MIN_SPEECH_SEC,
+        hangover_sec: float = HANGOVER_SEC,
+    ):
+        self.sample_rate = sample_rate
+        self.snr_threshold_db = snr_threshold_db
+        self.max_spectral_flatness = max_spectral_flatness
+        self.max_zero_crossing_rate = max_zero_crossing_rate
+        self.min_speech_sec = min_speech_sec
+        self.hangover_sec = hangover_sec
+
+        self.subframe_size = int(SUBFRAME_SEC * sample_rate)
+        self.subframe_sec = self.subframe_size / sample_rate
+        # Samples that didn't fill a subframe yet.
+        self._pending = np.zeros(0, dtype=np.float32)
+
+        self.noise_floor_db = NOISE_FLOOR_INITIAL_DB
+        window_size = int(NOISE_FLOOR_WINDOW_SEC / self.subframe_sec)
+        self._recent_energy_db = np.zeros(window_size)
+        self._n_recent = 0
+
+        self.is_speech = False
+        self._speech_run_sec = 0.0
+        self._silence_run_sec = 0.0
+
+    def reset(self):
+        self._pending = self._pending[:0]
+        self.is_speech = False
+        self._speech_run_sec = 0.0
+        self._silence_run_sec = 0.0
+
+    def process(self, audio: np.ndarray) -> VadResult:
+        if self._pending.size:
+            audio = np.concatenate([self._pending, audio])
+        n_frames = audio.shape[0] // self.subframe_size
+        self._pending = audio[n_frames * self.subframe_size :].copy()
+        if n_frames == 0:
+            return VadResult(self.is_speech, 0.0)
+
+        frames = audio[: n_frames * self.subframe_size].reshape(n_frames, -1)
+        energy_db, flatness, zero_crossing_rate = frame_features(frames)
+
+        is_voice = (
+            (energy_db - self.noise_floor_db > self.snr_threshold_db)
+            & (energy_db > MIN_SPEECH_ENERGY_DB)
+            & (flatness < self.max_spectral_flatness)
+            & (zero_crossing_rate < self.max_zero_crossing_rate)
+        )
+        self._update_noise_floor(energy_db, is_voice)
+
+        speech_sec = 0.0
+        for voice in is_voice:
+            if voice:
+                self._speech_run_sec += self.subframe_sec
+                self._silence_run_sec = 0.0
+                if self._speech_run_sec >= self.min_speech_sec:
+                    self.is_speech = True
+            else:
+                # Leaky, so that a few noisy subframes don't delay the onset.
+                self._speech_run_sec = max(
+                    0.0, self._speech_run_sec - self.subframe_sec
+                )
+                self._silence_run_sec += self.subframe_sec
+                if self._silence_run_sec >= self.hangover_sec:
+                    self.is_speech = False
+            if self.is_speech:
+                speech_sec += self.subframe_sec
+
+        return VadResult(self.is_speech, speech_sec)
+
+    def _update_noise_floor(self, energy_db: np.ndarray, is_voice: np.ndarray):
+        noise_db = energy_db[~is_voice]
+        if noise_db.size:
+            target = float(noise_db.mean())
+            dt = noise_db.size * self.subframe_sec
+            half_life = (
+                NOISE_FLOOR_RISE_SEC
+                if target > self.noise_floor_db
+                else NOISE_FLOOR_FALL_SEC
+            )
+            alpha = 1 - 2 ** (-dt / half_life)
+            self.noise_floor_db += alpha * (target - self.noise_floor_db)
+
+        window_size = len(self._recent_energy_db)
+        indices = (self._n_recent + np.arange(energy_db.size)) % window_size
+        self._recent_energy_db[indices] = energy_db
+        self._n_recent += energy_db.size
+        recent = self._recent_energy_db[: min(self._n_recent, window_size)]
+        self.noise_floor_db = max(
+            self.noise_floor_db, float(np.percentile(recent, NOISE_FLOOR_PERCENTILE))
+        )
@@ -0,0 +1,180 @@
+"""The Whisper API client shared by all the sessions of a process.
+
+With one `AsyncOpenAI` client per session, every session opened its own connections,
+with their TLS handshakes, and nothing limited how many transcriptions the process
+sent at once. Under a burst, the API answered 429, and the errors turned into failed
+turns. `WhisperClient` keeps a single pool of keep-alive connections, and each request:
+- waits for one of `WHISPER_MAX_CONCURRENT_REQUESTS` slots,
+- waits for a token of a bucket refilled at `WHISPER_REQUESTS_PER_SEC`,
+- is retried on 429, 5xx and connection errors, after a random backoff so that the
+  sessions that failed together don't retry together. `Retry-After` is respected.
+
+The limits are per process: with `unmute.prefork`, divide by the number of workers.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from functools import cache
+from typing import Any
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+from unmute import metrics as mt
+from unmute.kyutai_constants import (
+    WHISPER_MAX_CONCURRENT_REQUESTS,
+    WHISPER_MAX_RETRIES,
+    WHISPER_REQUESTS_PER_SEC,
+    WHISPER_TIMEOUT_SEC,
+)
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE_SEC = 0.25
+BACKOFF_MAX_SEC = 4.0
+# Idle connections are kept this long, users pause between utterances.
+KEEPALIVE_EXPIRY_SEC = 60.0
+
+
+class TokenBucket:
+    def __init__(self, rate_per_sec: float, burst: float | None = None):
+        """Allow `rate_per_sec` acquisitions per second on average.
+
+        Args:
+            rate_per_sec: How fast the bucket refills.
+            burst: Size of the bucket, how many acquisitions can happen at once after
+                a quiet period. Defaults to one second worth of tokens.
+        """
+        self.rate_per_sec = rate_per_sec
+        self.capacity = max(1.0, burst if burst is not None else rate_per_sec)
+        self.tokens = self.capacity
+        self._updated_at = time.monotonic()
+        # First come, first served.
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated_at) * self.rate_per_sec
+        )
+        self._updated_at = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate_per_sec)
+                self._refill()
+            self.tokens -= 1
+
+
+def _retry_reason(error: Exception) -> str | None:
+    """Why the request is worth retrying, None if it isn't."""
+    if isinstance(error, openai.RateLimitError):
+        return "429"
+    elif isinstance(error, openai.InternalServerError):
+        return "5xx"
+    elif isinstance(error, openai.APIConnectionError):  # Includes timeouts
+        return "connection"
+    return None
+
+
+def _retry_after_sec(error: Exception) -> float | None:
+    if not isinstance(error, openai.APIStatusError):
+        return None
+    try:
+        return float(error.response.headers.get("retry-after", ""))
+    except ValueError:
+        return None
+
+
+def backoff_sec(attempt: int, retry_after_sec: float | None = None) -> float | None:
+    """How long to wait before retrying, "full jitter" exponential backoff.
+
+    None if the server asks to wait for longer than `BACKOFF_MAX_SEC`: a live turn
+    can't wait that long, better give up.
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX_SEC, BACKOFF_BASE_SEC * 2**attempt))
+    if retry_after_sec is not None:
+        if retry_after_sec > BACKOFF_MAX_SEC:
+            return None
+        delay = max(delay, retry_after_sec)
+    return delay
+
+
+class WhisperClient:
+    def __init__(
+        self,
+        client: AsyncOpenAI | None = None,
+        max_concurrent_requests: int = WHISPER_MAX_CONCURRENT_REQUESTS,
+        requests_per_sec: float = WHISPER_REQUESTS_PER_SEC,
+        max_retries: int = WHISPER_MAX_RETRIES,
+    ):
+        if client is None:
+            # The API key comes from OPENAI_API_KEY. We retry ourselves, so that the
+            # retries also go through the limits.
+            client = AsyncOpenAI(
+                max_retries=0,
+                timeout=WHISPER_TIMEOUT_SEC,
+                http_client=openai.DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=max_concurrent_requests,
+                        max_keepalive_connections=max_concurrent_requests,
+                        keepalive_expiry=KEEPALIVE_EXPIRY_SEC,
+                    )
+                ),
+            )
+        self.client = client
+        self.max_retries = max_retries
+        self._slots = asyncio.Semaphore(max_concurrent_requests)
+        self._bucket = TokenBucket(requests_per_sec)
+
+    @asynccontextmanager
+    async def _slot(self):
+        queued_at = time.perf_counter()
+        async with self._slots:
+            await self._bucket.acquire()
+            mt.STT_API_QUEUE_TIME.observe(time.perf_counter() - queued_at)
+            mt.STT_API_IN_FLIGHT.inc()
+            try:
+                yield
+            finally:
+                mt.STT_API_IN_FLIGHT.dec()
+
+    async def transcribe(self, **kwargs: Any) -> Any:
+        """Call `audio.transcriptions.create` with the limits and retries."""
+        attempt = 0
+        while True:
+            async with self._slot():
+                start = time.perf_counter()
+                try:
+                    result = await self.client.audio.transcriptions.create(**kwargs)
+                except Exception as e:
+                    error = e
+                else:
+                    mt.STT_API_LATENCY.observe(time.perf_counter() - start)
+                    return result
+
+            # Wait outside of the slot, for other requests to use it.
+            reason = _retry_reason(error)
+            delay = backoff_sec(attempt, _retry_after_sec(error))
+            if reason is None or attempt >= self.max_retries or delay is None:
+                mt.STT_API_ERRORS.inc()
+                raise error
+
+            logger.warning(
+                f"Whisper request failed ({reason}), retrying in {delay:.2f}s: {error}"
+            )
+            mt.STT_API_RETRIES.labels(reason=reason).inc()
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+@cache
+def get_whisper_client() -> WhisperClient:
+    """The client shared by all the sessions of the process."""
+    return WhisperClient()
@@ -1,42 +1,130 @@
 import asyncio
 import logging
-import os
-from collections import deque
+import time
 from dataclasses import dataclass
+from functools import partial
+from typing import AsyncIterator, Awaitable, Callable
 
 import numpy as np
-from openai import AsyncOpenAI
 
+from unmute import metrics as mt
+from unmute.kyutai_constants import STT_PARTIAL_INTERVAL_SEC
+from unmute.stt.audio_ring_buffer import AudioRingBuffer
+from unmute.stt.partial_transcription import TranscriptStabilizer
 from unmute.stt.speech_to_text import STTMarkerMessage
+from unmute.stt.transcriber import Transcriber, WordTranscriber, make_transcriber
+from unmute.stt.vad import FeatureVAD, VoiceActivityDetector
+from unmute.timer import Stopwatch
+from unmute.tracing import TurnTrace
 
 logger = logging.getLogger(__name__)
 
+# Longer utterances are transcribed in several parts.
+MAX_UTTERANCE_SEC = 30.0
+# Partial transcriptions are off by default, see `STT_PARTIAL_INTERVAL_SEC`.
+PARTIAL_TRANSCRIPTION_INTERVAL_SEC = STT_PARTIAL_INTERVAL_SEC
+# Partial transcriptions are only useful while the user is speaking.
+PARTIAL_TRANSCRIPTION_MAX_SILENCE_SEC = 0.5
+# Silence that ends the utterance.
+END_OF_UTTERANCE_SILENCE_SEC = 2.0
+# Utterances with less speech than this, according to the VAD, are not transcribed.
+MIN_UTTERANCE_SPEECH_SEC = 0.3
+# Audio kept before and after the speech, for the VAD's onset and hangover delays.
+SPEECH_PADDING_SEC = 0.5
+
 
 @dataclass
 class WhisperTranscription:
     """Messaggio con trascrizione da Whisper"""
     text: str
     start_time: float
+    # For the end of an utterance, in `time.time_ns()`: when the pause was detected
+    # or the flush requested, and when the transcription started.
+    pause_ns: int | None = None
+    transcription_start_ns: int | None = None
+
+    @property
+    def ends_utterance(self) -> bool:
+        """False for partial transcriptions."""
+        return self.transcription_start_ns is not None
+
+
+def record_transcription_spans(trace: TurnTrace, transcription: WhisperTranscription):
+    """Add the time it took to transcribe the end of an utterance to `trace`.
+
+    Meant to be called when the transcription is handled, which ends "stt.transcript".
+    """
+    if transcription.transcription_start_ns is None:
+        return
+    if transcription.pause_ns is not None:
+        # The turn started with the pause, even if the trace was started after.
+        trace.root.start_ns = min(trace.root.start_ns, transcription.pause_ns)
+        trace.add_span(
+            "stt.pause", transcription.pause_ns, transcription.transcription_start_ns
+        )
+    trace.add_span("stt.transcript", transcription.transcription_start_ns)
+
+
+@dataclass
+class _Flush:
+    future: asyncio.Future[None]
+    stopwatch: Stopwatch
+    requested_ns: int
 
 
 class WhisperSTT:
-    """Speech-to-Text usando OpenAI Whisper API"""
+    """Speech-to-Text usando Whisper, hosted or local depending on `transcriber`
+
+    `send_audio` never waits for Whisper: when an utterance ends, its buffer is
+    handed to a background task and the audio keeps going to the other buffer.
+    Transcriptions are read by iterating over the instance, like `SpeechToText`.
+    With `partial_interval_sec`, the words are also sent while the user speaks.
+    """
     
-    def __init__(self, sample_rate: int = 16000):
-        self.client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        partial_interval_sec: float | None = PARTIAL_TRANSCRIPTION_INTERVAL_SEC,
+        vad: VoiceActivityDetector | None = None,
+        transcriber: Transcriber | None = None,
+    ):
+        self.transcriber = transcriber or make_transcriber()
+        # Partial transcriptions need word timestamps.
+        self.word_transcriber = (
+            self.transcriber if isinstance(self.transcriber, WordTranscriber) else None
+        )
         self.sample_rate = sample_rate
-        self.audio_buffer = deque(maxlen=160000)
+        # Double buffering: one buffer receives audio while the other is transcribed.
+        self.audio_buffer = AudioRingBuffer(
+            int(MAX_UTTERANCE_SEC * sample_rate), overflow="drop_oldest"
+        )
+        self.spare_buffer = AudioRingBuffer(
+            int(MAX_UTTERANCE_SEC * sample_rate), overflow="drop_oldest"
+        )
+        self.transcription_task: asyncio.Task[None] | None = None
+        self.flush_tasks: set[asyncio.Task[None]] = set()
+        self.results: asyncio.Queue[WhisperTranscription | _Flush | None] = (
+            asyncio.Queue()
+        )
+        self.partial_interval_sec = (
+            partial_interval_sec if self.word_transcriber is not None else None
+        )
+        self.samples_since_partial = 0
+        self.stabilizer = TranscriptStabilizer()
+        # Incremented when the utterance ends, to ignore partial results that are late.
+        self.utterance_id = 0
         self.current_time = 0.0
-        self.is_processing = False
         self.last_transcription_time = 0.0
         self.bot_speaking = False  # <-- AGGIUNGI QUESTA RIGA
         
-        # VAD simulato
-        self.silence_threshold = 0.02
-        self.silence_duration = 0
-        self.min_audio_duration = 1.0  # Minimum audio before considering transcription
+        self.vad = vad or FeatureVAD(sample_rate)
+        self.silence_duration = 0.0
+        # How much speech the VAD detected in the current utterance.
+        self.utterance_speech_sec = 0.0
+        # When the silence that ended the utterance was detected.
+        self.end_of_utterance_ns: int | None = None
         
-        # Aggiungi pause_prediction per compatibilità
+        # Aggiungi pause_prediction per compatibilità, driven by the VAD
         from unmute.stt.exponential_moving_average import ExponentialMovingAverage
         self.pause_prediction = ExponentialMovingAverage(0.5, 0.5)  # (attack_time, release_time)
         
@@ -47,8 +135,20 @@ class WhisperSTT:
         logger.info("WhisperSTT inizializzato")
             
     
-    async def send_audio(self, audio: np.ndarray):
-        """Riceve audio chunk e accumula nel buffer"""
+    @property
+    def is_processing(self) -> bool:
+        return self.transcription_task is not None
+
+    @property
+    def has_speech(self) -> bool:
+        """Whether there is enough speech since the last transcription to transcribe."""
+        return self.utterance_speech_sec >= MIN_UTTERANCE_SPEECH_SEC
+
+    async def send_audio(self, audio: np.ndarray) -> None:
+        """Riceve audio chunk e accumula nel buffer
+
+        Doesn't wait for the transcription, see `__aiter__`.
+        """
         self.current_time += len(audio) / self.sample_rate
         self.sent_samples += len(audio)
 
@@ -57,96 +157,287 @@ class WhisperSTT:
             if len(self.audio_buffer) > 0:
                 logger.debug(f"🔇 STT ignoring audio: bot is speaking (cleared {len(self.audio_buffer)} samples)")
             self.audio_buffer.clear()
+            self._end_utterance()
+            self.vad.reset()
             self.silence_duration = 0
             self.pause_prediction.value = 1.0  # High value = not speaking
-            return None
+            return
 
         # Accumula audio solo quando il bot NON sta parlando
-        self.audio_buffer.extend(audio.flatten())
+        if audio.size > self.audio_buffer.free:
+            mt.STT_BUFFER_OVERFLOWS.inc()
+            if not self.is_processing:
+                # Rather than dropping the start of the utterance, transcribe it.
+                logger.warning(
+                    f"Utterance longer than {MAX_UTTERANCE_SEC}s, "
+                    "transcribing it in parts"
+                )
+                self._start_transcription()
+            else:
+                logger.warning(
+                    "Audio buffer full while Whisper is busy, dropping the oldest audio"
+                )
+        self.audio_buffer.append(audio)
+        self.samples_since_partial += len(audio)
 
         # Rileva silenzio
-        rms = np.sqrt(np.mean(audio ** 2))
-        if rms < self.silence_threshold:
-            self.silence_duration += len(audio) / self.sample_rate
-            self.pause_prediction.value = 0.8
-        else:
+        dt = len(audio) / self.sample_rate
+        vad_result = self.vad.process(audio)
+        self.utterance_speech_sec += vad_result.speech_sec
+        if vad_result.is_speech:
             self.silence_duration = 0
-            self.pause_prediction.value = 0.2
+        else:
+            self.silence_duration += dt
+        self.pause_prediction.update(
+            dt=dt, new_value=0.0 if vad_result.is_speech else 1.0
+        )
+
+        if self.utterance_speech_sec == 0:
+            # Nothing said yet: only keep what the VAD may not have recognized yet.
+            padding = int(SPEECH_PADDING_SEC * self.sample_rate)
+            self.audio_buffer.discard(max(0, len(self.audio_buffer) - padding))
+            self.samples_since_partial = 0
+            return
 
-        # Se c'è silenzio > 2.0s e abbastanza audio, trascrivi
+        # Se c'è silenzio > 2.0s, trascrivi
         # Aumentato a 2.0s per dare più tempo all'utente di finire di parlare
-        if (self.silence_duration > 2.0 and
-            len(self.audio_buffer) > self.sample_rate * self.min_audio_duration and
-            not self.is_processing):
-            logger.info(f"🎤 Silence detected ({self.silence_duration:.1f}s), transcribing {len(self.audio_buffer)} samples")
-            return await self._transcribe_buffer()
+        if (
+            self.silence_duration > END_OF_UTTERANCE_SILENCE_SEC
+            and self.end_of_utterance_ns is None
+        ):
+            # Whisper may be busy with a partial transcription, so it starts later.
+            self.end_of_utterance_ns = time.time_ns()
+        if self.silence_duration > END_OF_UTTERANCE_SILENCE_SEC and not self.is_processing:
+            if self.utterance_speech_sec < MIN_UTTERANCE_SPEECH_SEC:
+                logger.debug(
+                    f"Only {self.utterance_speech_sec:.2f}s of speech, not transcribing"
+                )
+                mt.STT_SKIPPED_UTTERANCES.inc()
+                self._end_utterance()
+            else:
+                logger.info(f"🎤 Silence detected ({self.silence_duration:.1f}s), transcribing {len(self.audio_buffer)} samples")
+                self._start_transcription()
+        elif self._wants_partial_transcription():
+            self._start_partial_transcription()
 
-        return None
-    
-    async def _transcribe_buffer(self):
-        """Trascrivi il buffer audio con Whisper"""
-        if self.is_processing:
-            return
-        
-        self.is_processing = True
-        
+    async def flush(self) -> asyncio.Future[None]:
+        """End the utterance now, instead of waiting for the silence that ends it.
+
+        Returns a future that is resolved once the transcription of the audio sent so
+        far has gone through `__aiter__`, i.e. has been handled by the consumer.
+        """
+        future = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(
+            self._flush(_Flush(future, Stopwatch(), time.time_ns())),
+            name="whisper_flush",
+        )
+        self.flush_tasks.add(task)
+        task.add_done_callback(self.flush_tasks.discard)
+        return future
+
+    async def _wait_for_transcription(self):
+        while (task := self.transcription_task) is not None:
+            await asyncio.wait([task])
+
+    async def _flush(self, flush: _Flush):
         try:
-            # Converti buffer in array
-            audio_data = np.array(self.audio_buffer, dtype=np.float32)
-            
-            # Salva in file temporaneo (Whisper API richiede file)
-            import tempfile
-            import wave
-            
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
-                tmp_path = tmp_file.name
-                
-                # Scrivi WAV
-                with wave.open(tmp_path, 'wb') as wav_file:
-                    wav_file.setnchannels(1)
-                    wav_file.setsampwidth(2)  # 16-bit
-                    wav_file.setframerate(self.sample_rate)
-                    # Converti float32 in int16
-                    audio_int16 = (audio_data * 32767).astype(np.int16)
-                    wav_file.writeframes(audio_int16.tobytes())
-            
-            # Chiamata a Whisper API
-            with open(tmp_path, 'rb') as audio_file:
-                transcription = await self.client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    response_format="text"
+            # A partial transcription may be running, the rest of the audio comes after.
+            await self._wait_for_transcription()
+            if self.has_speech:
+                self._start_transcription(pause_ns=flush.requested_ns)
+                await self._wait_for_transcription()
+        except asyncio.CancelledError:
+            flush.future.cancel()
+            raise
+        # After the transcription in the queue, see `__aiter__`.
+        self.results.put_nowait(flush)
+
+    def _end_utterance(self) -> str:
+        """Forget the partial transcriptions. Returns the prompt they gave."""
+        prompt = self.stabilizer.prompt()
+        self.stabilizer.reset()
+        self.utterance_id += 1
+        self.samples_since_partial = 0
+        self.utterance_speech_sec = 0.0
+        self.end_of_utterance_ns = None
+        return prompt
+
+    def _start_transcription(self, pause_ns: int | None = None):
+        """Swap the buffers and transcribe the full one in the background.
+
+        `pause_ns` is when the utterance was ended by a flush, if it was.
+        """
+        assert self.transcription_task is None
+        if self.end_of_utterance_ns is not None:
+            pause_ns = self.end_of_utterance_ns
+        buffer = self.audio_buffer
+        self.audio_buffer, self.spare_buffer = self.spare_buffer, buffer
+        prompt = self._end_utterance()
+        # No need to upload the silence that ended the utterance.
+        trailing_silence = int(
+            max(0.0, self.silence_duration - SPEECH_PADDING_SEC) * self.sample_rate
+        )
+        n_samples = max(0, len(buffer) - trailing_silence)
+        mt.STT_FINAL_AUDIO_DURATION.observe(n_samples / self.sample_rate)
+        self.transcription_task = asyncio.create_task(
+            self._transcription_task(
+                partial(
+                    self._transcribe_buffer,
+                    buffer,
+                    n_samples,
+                    prompt,
+                    pause_ns=pause_ns,
+                    transcription_start_ns=time.time_ns(),
                 )
-            
-            # Cleanup
-            os.unlink(tmp_path)
+            ),
+            name="whisper_transcription",
+        )
+
+    def _wants_partial_transcription(self) -> bool:
+        return (
+            self.partial_interval_sec is not None
+            and not self.is_processing
+            and self.samples_since_partial
+            >= self.partial_interval_sec * self.sample_rate
+            and self.silence_duration < PARTIAL_TRANSCRIPTION_MAX_SILENCE_SEC
+            and self.utterance_speech_sec >= MIN_UTTERANCE_SPEECH_SEC
+        )
+
+    def _start_partial_transcription(self):
+        """Transcribe the audio after the last confirmed word, in the background."""
+        self.samples_since_partial = 0
+        # A copy, since the buffer keeps receiving audio.
+        window = self.audio_buffer.view().copy()
+        window_start = self.sent_samples - len(window)
+        self.transcription_task = asyncio.create_task(
+            self._transcription_task(
+                partial(
+                    self._transcribe_partial,
+                    window,
+                    window_start,
+                    self.utterance_id,
+                    self.stabilizer.prompt(),
+                )
+            ),
+            name="whisper_partial_transcription",
+        )
+
+    async def _transcription_task(
+        self, transcribe: Callable[[], Awaitable[WhisperTranscription | None]]
+    ):
+        try:
+            result = await transcribe()
+            if result is not None:
+                self.results.put_nowait(result)
+        finally:
+            self.transcription_task = None
+
+    async def _transcribe_partial(
+        self, window: np.ndarray, window_start: int, utterance_id: int, prompt: str
+    ) -> WhisperTranscription | None:
+        if self.word_transcriber is None:
+            return None
+        try:
+            mt.STT_PARTIAL_TRANSCRIPTIONS.inc()
+            words = await self.word_transcriber.transcribe_words(
+                window, self.sample_rate, prompt
+            )
+        except Exception as e:
+            # Not fatal, the audio is transcribed at the end of the utterance anyway.
+            logger.error(f"Errore Whisper (partial): {e}")
+            return None
+
+        if utterance_id != self.utterance_id:
+            return None  # The utterance ended in the meantime
+
+        confirmed = self.stabilizer.update(words)
+        if not confirmed:
+            return None
+
+        # The next window starts after the last confirmed word.
+        confirmed_end = window_start + int(confirmed[-1].end * self.sample_rate)
+        buffer_start = self.sent_samples - len(self.audio_buffer)
+        self.audio_buffer.discard(max(0, confirmed_end - buffer_start))
+        mt.STT_CONFIRMED_WORDS.inc(len(confirmed))
+
+        text = " ".join(word.text for word in confirmed)
+        logger.info(f"Whisper (partial): '{text}'")
+        return WhisperTranscription(
+            text=text,
+            start_time=(window_start / self.sample_rate) + confirmed[0].start,
+        )
+
+    async def _transcribe_buffer(
+        self,
+        buffer: AudioRingBuffer,
+        n_samples: int,
+        prompt: str = "",
+        pause_ns: int | None = None,
+        transcription_start_ns: int | None = None,
+    ) -> WhisperTranscription | None:
+        """Trascrivi il buffer audio con Whisper
+
+        Only the first `n_samples` of the buffer are transcribed. `prompt` is the text
+        of the utterance that was already confirmed by partial transcriptions, if any.
+        Only the rest of the utterance is in `buffer`.
+        """
+        start_time = self.current_time
+
+        try:
+            # No copy: audio goes to the other buffer until this one is cleared.
+            audio_data = buffer.view()[:n_samples]
+
+            # Chiamata a Whisper
+            transcription = await self.transcriber.transcribe(
+                audio_data, self.sample_rate, prompt
+            )
             
             # Invia trascrizione
             if transcription and transcription.strip():
                 # AGGIUNGI QUESTO FILTRO:
-                if len(transcription.strip()) < 3:  # Ignora parole troppo corte
+                # (not for the end of an utterance that was partially transcribed)
+                if len(transcription.strip()) < 3 and not prompt:  # Ignora parole troppo corte
                     logger.debug(f"Whisper: trascrizione troppo corta ignorata: '{transcription}'")
                     return None
                 
                 logger.info(f"Whisper: '{transcription}'")
                 return WhisperTranscription(
                     text=transcription,
-                    start_time=self.current_time
+                    start_time=start_time,
+                    pause_ns=pause_ns,
+                    transcription_start_ns=transcription_start_ns,
                 )
             
         except Exception as e:
             logger.error(f"Errore Whisper: {e}")
         
         finally:
-            self.audio_buffer.clear()
-            self.is_processing = False
+            buffer.clear()
             self.last_transcription_time = self.current_time
         
         return None
+
+    async def __aiter__(self) -> AsyncIterator[WhisperTranscription]:
+        """Transcriptions in order, until `shutdown()`."""
+        while True:
+            result = await self.results.get()
+            if result is None:
+                return
+            elif isinstance(result, _Flush):
+                mt.STT_FLUSH_DURATION.observe(result.stopwatch.time())
+                if not result.future.done():
+                    result.future.set_result(None)
+            else:
+                yield result
     
     async def shutdown(self):
         """Chiudi connessione"""
         logger.info("WhisperSTT shutdown")
+        if self.transcription_task is not None:
+            self.transcription_task.cancel()
+        for task in self.flush_tasks:
+            task.cancel()
+        self.results.put_nowait(None)
     
     def state(self) -> str:
         """Stato corrente"""
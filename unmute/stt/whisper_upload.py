@@ -0,0 +1,116 @@
+"""Prepare the audio of an utterance for the Whisper API.
+
+Whisper works at 16 kHz internally and accepts compressed formats, so there is no
+point in uploading 24 kHz PCM. The audio is trimmed of its leading and trailing
+silence, resampled to 16 kHz and encoded to Opus in memory, which is more than ten
+times smaller than WAV. Nothing touches the disk.
+"""
+
+import io
+import wave
+from typing import Literal
+
+import numpy as np
+import sphn
+
+WHISPER_SAMPLE_RATE = 16000
+
+# Silence kept around the speech so that the first and last words aren't cut.
+SILENCE_PADDING_SEC = 0.2
+# Granularity of the silence detection.
+SILENCE_FRAME_SEC = 0.01
+# Opus encodes 20 ms frames, this flushes the last incomplete one.
+OPUS_FLUSH_SEC = 0.04
+
+UploadFormat = Literal["opus", "wav"]
+
+_CONTENT_TYPES: dict[UploadFormat, tuple[str, str]] = {
+    "opus": ("audio.ogg", "audio/ogg"),
+    "wav": ("audio.wav", "audio/wav"),
+}
+
+
+def speech_bounds(
+    audio: np.ndarray, sample_rate: int, threshold: float
+) -> tuple[int, int]:
+    """The (start, end) samples of the audio without its leading and trailing frames
+    whose RMS is below `threshold`, padded by `SILENCE_PADDING_SEC`.
+
+    Both are 0 if it's all silence.
+    """
+    frame_size = max(1, int(SILENCE_FRAME_SEC * sample_rate))
+    n_frames = audio.shape[0] // frame_size
+    if n_frames == 0:
+        return 0, 0
+
+    frames = audio[: n_frames * frame_size].reshape(n_frames, frame_size)
+    # Mean of squares per frame, without a temporary array of squares.
+    energy = np.einsum("ij,ij->i", frames, frames) / frame_size
+    loud = np.flatnonzero(energy >= threshold**2)
+    if loud.size == 0:
+        return 0, 0
+
+    padding = int(SILENCE_PADDING_SEC * sample_rate)
+    start = max(0, loud[0] * frame_size - padding)
+    end = min(audio.shape[0], (loud[-1] + 1) * frame_size + padding)
+    return int(start), int(end)
+
+
+def trim_silence(audio: np.ndarray, sample_rate: int, threshold: float) -> np.ndarray:
+    """Remove the leading and trailing silence, see `speech_bounds`.
+
+    Returns a view of `audio`, empty if it's all silence.
+    """
+    start, end = speech_bounds(audio, sample_rate, threshold)
+    return audio[start:end]
+
+
+def encode_opus(audio: np.ndarray, sample_rate: int) -> bytes:
+    writer = sphn.OpusStreamWriter(sample_rate)
+    flush = np.zeros(int(OPUS_FLUSH_SEC * sample_rate), dtype=np.float32)
+    return writer.append_pcm(np.concatenate([audio, flush]))
+
+
+def encode_wav(audio: np.ndarray, sample_rate: int) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)  # 16-bit
+        wav_file.setframerate(sample_rate)
+        audio_int16 = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        wav_file.writeframes(audio_int16.tobytes())
+    return buffer.getvalue()
+
+
+def prepare_upload(
+    audio: np.ndarray,
+    sample_rate: int,
+    silence_threshold: float | None,
+    format: UploadFormat = "opus",
+) -> tuple[str, bytes, str] | None:
+    """Trim, resample and encode float32 audio for upload.
+
+    CPU-bound, so better run in a thread. With `silence_threshold=None`, the audio is
+    uploaded as is: use it when a VAD already selected the speech, or when the
+    timestamps returned by Whisper must match the audio.
+
+    Returns:
+        The (filename, content, content type) tuple that the OpenAI client accepts as
+        a file, or None if there is only silence.
+    """
+    if silence_threshold is not None:
+        start, end = speech_bounds(audio, sample_rate, silence_threshold)
+        audio = audio[start:end]
+    if audio.size == 0:
+        return None
+
+    if sample_rate != WHISPER_SAMPLE_RATE:
+        audio = sphn.resample(audio, sample_rate, WHISPER_SAMPLE_RATE)
+
+    if format == "opus":
+        content = encode_opus(audio, WHISPER_SAMPLE_RATE)
+    else:
+        content = encode_wav(audio, WHISPER_SAMPLE_RATE)
+
+    filename, content_type = _CONTENT_TYPES[format]
+    return filename, content, content_type
@@ -0,0 +1,327 @@
+"""Span-based latency tracing of conversational turns.
+
+Each turn (from the end of the user's speech to the first audio sent back) gets a
+`TurnTrace` made of spans such as the STT flush, the time to the first LLM token, the
+connection to the TTS and the time to its first audio. Finished traces are kept in a
+bounded in-memory `TraceStore`, browsable at `/v1/debug/traces`, and optionally
+exported in the OTLP/JSON format of OpenTelemetry:
+
+- to a file, one `ExportTraceServiceRequest` per line, if `KYUTAI_TRACES_FILE` is set;
+- to a collector over OTLP/HTTP, if `KYUTAI_TRACES_OTLP_ENDPOINT` is set, e.g.
+  `http://localhost:4318/v1/traces`.
+
+Exporting happens on a background thread so that it never blocks the event loop.
+The store is per-process: with `unmute.prefork`, each worker only shows its own traces.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import cache
+from pathlib import Path
+from typing import Any, Iterator
+
+import requests
+
+from unmute.kyutai_constants import (
+    TRACES_FILE,
+    TRACES_MAX_STORED,
+    TRACES_OTLP_ENDPOINT,
+)
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "unmute-backend"
+EXPORT_TIMEOUT_SEC = 5.0
+
+# OTLP status codes
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, **attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.attributes: dict[str, Any] = attributes
+        self.error: str | None = None
+
+    @property
+    def ended(self) -> bool:
+        return self.end_ns is not None
+
+    def end(self, **attributes):
+        """End the span. Does nothing if it already ended."""
+        if self.end_ns is not None:
+            return
+        self.attributes.update(attributes)
+        self.end_ns = time.time_ns()
+
+    def duration_sec(self) -> float | None:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def to_otlp(self) -> dict[str, Any]:
+        span: dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": STATUS_UNSET},
+        }
+        if self.parent_id is not None:
+            span["parentSpanId"] = self.parent_id
+        if self.error is not None:
+            span["status"] = {"code": STATUS_ERROR, "message": self.error}
+        return span
+
+
+class TurnTrace:
+    """The spans of a single conversational turn.
+
+    Spans are identified by name: a turn only has one span of each kind, so the code
+    that ends a span doesn't need a reference to the code that started it. Starting or
+    ending a span that's already started or ended does nothing.
+    """
+
+    def __init__(
+        self,
+        name: str = "turn",
+        store: "TraceStore | None" = None,
+        start_ns: int | None = None,
+        **attrs,
+    ):
+        """`start_ns` is when the turn started, if it was before the trace."""
+        self.trace_id = os.urandom(16).hex()
+        self.root = Span(name, self.trace_id, parent_id=None, **attrs)
+        if start_ns is not None:
+            self.root.start_ns = start_ns
+        self.spans: dict[str, Span] = {}
+        self.store = store
+
+    @property
+    def ended(self) -> bool:
+        return self.root.ended
+
+    def start_span(self, name: str, **attributes) -> Span:
+        if self.root.ended:
+            # Late work from a turn that was interrupted, don't record it.
+            return Span(name, self.trace_id, self.root.span_id, **attributes)
+        if name not in self.spans:
+            self.spans[name] = Span(
+                name, self.trace_id, self.root.span_id, **attributes
+            )
+        return self.spans[name]
+
+    def add_span(
+        self, name: str, start_ns: int, end_ns: int | None = None, **attributes
+    ) -> Span:
+        """Record a span that started before, and ended at `end_ns` or now.
+
+        For work whose start was timed by code that doesn't know about the turn.
+        """
+        span = self.start_span(name, **attributes)
+        if not span.ended:
+            span.start_ns = start_ns
+            span.end()
+            if end_ns is not None:
+                span.end_ns = end_ns
+        return span
+
+    def end_span(self, name: str, **attributes):
+        """End the span if it was started."""
+        span = self.spans.get(name)
+        if span is not None:
+            span.end(**attributes)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        span = self.start_span(name, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            span.end()
+
+    def end(self, **attributes):
+        """End the turn and all the spans still open, then hand it to the store."""
+        if self.root.ended:
+            return
+
+        for span in self.spans.values():
+            if not span.ended:
+                span.attributes["unfinished"] = True
+                span.end()
+        self.root.end(**attributes)
+
+        if self.store is not None:
+            self.store.add(self)
+
+    def all_spans(self) -> list[Span]:
+        return [self.root, *self.spans.values()]
+
+    def summary(self) -> dict[str, Any]:
+        """A human-readable view, with times in ms relative to the start of the turn."""
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "start_time": self.root.start_ns / 1e9,
+            "duration_ms": _ms(self.root.duration_sec()),
+            "attributes": self.root.attributes,
+            "spans": [
+                {
+                    "name": span.name,
+                    "start_ms": _ms((span.start_ns - self.root.start_ns) / 1e9),
+                    "duration_ms": _ms(span.duration_sec()),
+                    "attributes": span.attributes,
+                    "error": span.error,
+                }
+                for span in sorted(self.spans.values(), key=lambda s: s.start_ns)
+            ],
+        }
+
+
+class TraceStore:
+    """Keeps the last `max_traces` finished traces and passes them on to exporting."""
+
+    def __init__(self, max_traces: int, exporter: "TraceExporter | None" = None):
+        self.traces: deque[TurnTrace] = deque(maxlen=max_traces)
+        self.exporter = exporter
+
+    def add(self, trace: TurnTrace):
+        self.traces.append(trace)
+        if self.exporter is not None:
+            self.exporter.export(trace)
+
+    def recent(self, limit: int) -> list[TurnTrace]:
+        """The last `limit` traces, newest first."""
+        return list(reversed(self.traces))[:limit]
+
+    def get(self, trace_id: str) -> TurnTrace | None:
+        for trace in self.traces:
+            if trace.trace_id == trace_id:
+                return trace
+        return None
+
+
+class TraceExporter:
+    """Writes traces to a file and/or posts them to an OTLP/HTTP collector.
+
+    Runs on its own thread. If the exporter can't keep up, traces are dropped rather
+    than piling up in memory.
+    """
+
+    def __init__(
+        self,
+        file: Path | None = None,
+        otlp_endpoint: str | None = None,
+        max_pending: int = 1000,
+    ):
+        self.file = file
+        self.otlp_endpoint = otlp_endpoint
+        self.pending: queue.Queue[TurnTrace | None] = queue.Queue(max_pending)
+        self.thread = threading.Thread(
+            target=self._run, name="trace-exporter", daemon=True
+        )
+        self.thread.start()
+
+    def export(self, trace: TurnTrace):
+        try:
+            self.pending.put_nowait(trace)
+        except queue.Full:
+            logger.warning(f"Trace export queue full, dropping trace {trace.trace_id}")
+
+    def shutdown(self):
+        self.pending.put(None)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            trace = self.pending.get()
+            if trace is None:
+                return
+            payload = json.dumps(to_otlp_request([trace]))
+            try:
+                if self.file is not None:
+                    with self.file.open("a") as f:
+                        f.write(payload + "\n")
+                if self.otlp_endpoint is not None:
+                    response = requests.post(
+                        self.otlp_endpoint,
+                        data=payload,
+                        headers={"Content-Type": "application/json"},
+                        timeout=EXPORT_TIMEOUT_SEC,
+                    )
+                    response.raise_for_status()
+            except Exception as e:
+                logger.warning(f"Failed to export trace {trace.trace_id}: {e}")
+
+
+def to_otlp_request(traces: list[TurnTrace]) -> dict[str, Any]:
+    """Build an OTLP/JSON `ExportTraceServiceRequest`."""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": _otlp_attributes(
+                        {"service.name": SERVICE_NAME, "process.pid": os.getpid()}
+                    )
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": __name__},
+                        "spans": [
+                            span.to_otlp()
+                            for trace in traces
+                            for span in trace.all_spans()
+                        ],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+@cache
+def get_trace_store() -> TraceStore:
+    exporter = None
+    if TRACES_FILE is not None or TRACES_OTLP_ENDPOINT is not None:
+        exporter = TraceExporter(file=TRACES_FILE, otlp_endpoint=TRACES_OTLP_ENDPOINT)
+    return TraceStore(TRACES_MAX_STORED, exporter)
+
+
+def _otlp_attributes(attributes: dict[str, Any]) -> list[dict[str, Any]]:
+    return [
+        {"key": key, "value": _otlp_value(value)} for key, value in attributes.items()
+    ]
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    elif isinstance(value, int):
+        # int64 is a string in OTLP/JSON
+        return {"intValue": str(value)}
+    elif isinstance(value, float):
+        return {"doubleValue": value}
+    else:
+        return {"stringValue": str(value)}
+
+
+def _ms(sec: float | None) -> float | None:
+    return None if sec is None else round(sec * 1000, 1)
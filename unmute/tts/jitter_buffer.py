@@ -0,0 +1,191 @@
+"""Jitter buffer for the audio of the TTS, and the text that goes with it.
+
+The TTS server sends audio in bursts, usually faster than real time, and the text
+with timestamps on the timeline of the audio. The client plays the audio as soon as
+it gets it, so the buffer decides when to send what:
+- Audio is sent such that `lead_sec` of it is queued on the client, to absorb the
+  jitter of the TTS. More would make interruptions slower, since what was sent plays
+  anyway.
+- Text is sent when the audio it goes with starts playing.
+
+To do so, it keeps track of what the client is playing. A frame that arrives when the
+client has less than the lead time queued is late, one that arrives when the client
+has nothing left to play is an underrun: the user hears a gap. The lead time follows
+the rate at which the TTS generates audio, it grows when the TTS is slower than real
+time. After an underrun, the audio is held until the lead time is buffered again, or
+for at most the lead time, so that a TTS that can't keep up is heard as a few pauses
+rather than as constant stutter.
+
+Audio and text each arrive in order, so the two timelines are plain deques.
+"""
+
+from collections import deque
+from typing import Callable, Generic, TypeVar
+
+from unmute import metrics as mt
+from unmute.kyutai_constants import FRAME_TIME_SEC, SAMPLE_RATE
+from unmute.timer import get_time as default_get_time
+
+# The lead time when the TTS is faster than real time, and at most. If it's too low,
+# it might cause stuttering. If it's too high, the audio plays for longer after an
+# interruption and WebRTC may buffer it on its own, which desynchronizes the text.
+JITTER_BASE_LEAD_SEC = FRAME_TIME_SEC * 4
+JITTER_MAX_LEAD_SEC = FRAME_TIME_SEC * 12
+# How much the lead time grows with the generation rate: if the TTS only generates
+# 0.8 s of audio per second, the lead time is the base one + 0.2 * this.
+JITTER_RATE_HORIZON_SEC = 2.0
+# The generation rate is measured over this many frames.
+JITTER_RATE_WINDOW = 8
+# For the timestamps that are exactly at the start of a frame.
+_EPSILON_SEC = 1e-6
+
+A = TypeVar("A")
+T = TypeVar("T")
+
+
+class AudioJitterBuffer(Generic[A, T]):
+    def __init__(
+        self,
+        sample_rate: int = SAMPLE_RATE,
+        base_lead_sec: float = JITTER_BASE_LEAD_SEC,
+        max_lead_sec: float = JITTER_MAX_LEAD_SEC,
+        get_time: Callable[[], float] | None = None,
+    ):
+        self.sample_rate = sample_rate
+        self.base_lead_sec = base_lead_sec
+        self.max_lead_sec = max_lead_sec
+        self.get_time = get_time or default_get_time
+        self.lead_sec = base_lead_sec
+
+        self._audio: deque[tuple[A, float]] = deque()
+        self._audio_sec = 0.0  # In `_audio`
+        self._text: deque[tuple[float, T]] = deque()
+        self._arrivals: deque[tuple[float, float]] = deque(maxlen=JITTER_RATE_WINDOW)
+
+        self.received_sec = 0.0
+        self.released_sec = 0.0
+        # When the client is done playing what was released, None before the start.
+        self._played_until: float | None = None
+        # Whether the client had the lead time queued since the last underrun.
+        self._filled = False
+        # Set after an underrun, while the audio is held.
+        self._rebuffering_since: float | None = None
+        self.closed = False
+
+        self.n_late_frames = 0
+        self.n_underruns = 0
+
+    def put_audio(self, item: A, n_samples: int):
+        now = self.get_time()
+        duration = n_samples / self.sample_rate
+        self.received_sec += duration
+        self._arrivals.append((now, self.received_sec))
+        self._update_lead()
+
+        if self._played_until is not None and not self._audio:
+            queued = self._queued_sec(now)
+            if queued <= 0 and self._rebuffering_since is None:
+                self.n_underruns += 1
+                mt.TTS_UNDERRUNS.inc()
+                self._rebuffering_since = now
+                self._filled = False
+            if self._filled and queued < self.lead_sec:
+                self.n_late_frames += 1
+                mt.TTS_LATE_FRAMES.inc()
+
+        self._audio.append((item, duration))
+        self._audio_sec += duration
+
+    def put_text(self, item: T, time: float):
+        """Add text that goes with the audio `time` seconds from the start."""
+        if self._text and time < self._text[-1][0]:
+            # Not supposed to happen, but the text must not overtake earlier text.
+            time = self._text[-1][0]
+        self._text.append((time, item))
+
+    def close(self):
+        """Nothing more will be put: send what is held back without waiting."""
+        self.closed = True
+
+    def empty(self) -> bool:
+        return not self._audio and not self._text
+
+    def _update_lead(self):
+        (start, start_sec), (end, end_sec) = self._arrivals[0], self._arrivals[-1]
+        if end > start:
+            rate = (end_sec - start_sec) / (end - start)
+            lead = self.base_lead_sec + max(0.0, 1 - rate) * JITTER_RATE_HORIZON_SEC
+            self.lead_sec = min(self.max_lead_sec, lead)
+
+    def _queued_sec(self, now: float) -> float:
+        """How much audio the client has left to play."""
+        if self._played_until is None:
+            return 0.0
+        return max(0.0, self._played_until - now)
+
+    def _playing_sec(self, now: float) -> float:
+        """What the client is playing, in seconds from the start of the audio."""
+        return self.released_sec - self._queued_sec(now)
+
+    def _text_is_due(self, time: float, now: float) -> bool:
+        if self._played_until is None:
+            return self.closed and not self._audio
+        # Once its audio was sent, when the client starts playing it.
+        if time < self.released_sec - _EPSILON_SEC:
+            return time <= self._playing_sec(now) + _EPSILON_SEC
+        # Text past the end of the audio goes once all of it has been played.
+        return self.closed and not self._audio and now >= self._played_until
+
+    def pop_ready(self) -> list[A | T]:
+        """The audio and text to send now."""
+        now = self.get_time()
+        ready: list[A | T] = []
+
+        if self._rebuffering_since is not None and (
+            self.closed
+            or self._audio_sec >= self.lead_sec
+            or now >= self._rebuffering_since + self.lead_sec
+        ):
+            self._rebuffering_since = None
+        if self._rebuffering_since is None:
+            # Like the text, a frame is due when the lead time is left before it plays.
+            while self._audio and self._queued_sec(now) <= self.lead_sec + _EPSILON_SEC:
+                item, duration = self._audio.popleft()
+                self._audio_sec -= duration
+                queued = self._queued_sec(now)
+                mt.TTS_LEAD_TIME.observe(queued)
+                self._played_until = now + queued + duration
+                self.released_sec += duration
+                ready.append(item)
+            if self._queued_sec(now) >= self.lead_sec:
+                self._filled = True
+
+        while self._text and self._text_is_due(self._text[0][0], now):
+            ready.append(self._text.popleft()[1])
+        return ready
+
+    def time_until_next(self) -> float | None:
+        """How long until `pop_ready` has something, None if it takes a `put`."""
+        now = self.get_time()
+        times: list[float] = []
+
+        if self._audio:
+            if self._rebuffering_since is None:
+                times.append(now + self._queued_sec(now) - self.lead_sec)
+            elif self.closed:
+                times.append(now)
+            else:
+                times.append(self._rebuffering_since + self.lead_sec)
+
+        if self._text and self._played_until is not None:
+            time = self._text[0][0]
+            if time < self.released_sec - _EPSILON_SEC:
+                times.append(self._played_until - (self.released_sec - time))
+            elif self.closed and not self._audio:
+                times.append(self._played_until)
+        elif self._text and self.closed and not self._audio:
+            times.append(now)
+
+        if not times:
+            return None
+        return max(0.0, min(times) - now)
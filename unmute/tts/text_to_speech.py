@@ -1,26 +1,28 @@
 import asyncio
 import urllib.parse
+from functools import cache, partial
 from logging import getLogger
-from typing import Annotated, Any, AsyncIterator, Callable, Literal, Union, cast
+from typing import Annotated, AsyncIterator, Callable, Literal, Union
 
 import msgpack
+import numpy as np
 import websockets
-from pydantic import BaseModel, Field, TypeAdapter
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, TypeAdapter
 
-import unmute.openai_realtime_api_events as ora
 from unmute import metrics as mt
+from unmute import server_event_encoding as see
 from unmute.exceptions import MissingServiceAtCapacity
 from unmute.kyutai_constants import (
-    FRAME_TIME_SEC,
     HEADERS,
     SAMPLE_RATE,
     TEXT_TO_SPEECH_PATH,
     TTS_SERVER,
 )
 from unmute.recorder import Recorder
-from unmute.service_discovery import ServiceWithStartup
+from unmute.service_discovery import ServiceWithStartup, find_instance
 from unmute.timer import Stopwatch
-from unmute.tts.realtime_queue import RealtimeQueue
+from unmute.tts.jitter_buffer import AudioJitterBuffer
+from unmute.tts.tts_pool import ConnectionPool
 from unmute.tts.voice_cloning import voice_embeddings_cache
 from unmute.websocket_utils import WebsocketState
 
@@ -60,9 +62,16 @@ class TTSTextMessage(BaseModel):
     stop_s: float
 
 
+def _as_float32(pcm: object) -> np.ndarray:
+    return np.asarray(pcm, dtype=np.float32)
+
+
 class TTSAudioMessage(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     type: Literal["Audio"]
-    pcm: list[float]
+    # Mono float32 audio, the server sends it as a list of floats.
+    pcm: Annotated[np.ndarray, BeforeValidator(_as_float32)]
 
 
 class TTSErrorMessage(BaseModel):
@@ -80,20 +89,61 @@ TTSMessage = Annotated[
 ]
 TTSMessageAdapter = TypeAdapter(TTSMessage)
 
+# What an "Audio" message starts with, before the header of the `pcm` array.
+_AUDIO_MESSAGE_PREFIX: bytes = msgpack.packb({"type": "Audio", "pcm": []})[:-1]  # type: ignore
+# The samples of the `pcm` array as msgpack encodes them, a marker byte then the value.
+_MSGPACK_FLOATS = {
+    0xCA: np.dtype([("marker", "u1"), ("value", ">f4")]),
+    0xCB: np.dtype([("marker", "u1"), ("value", ">f8")]),
+}
+
+
+def _decode_msgpack_floats(data: bytes, offset: int) -> np.ndarray | None:
+    """The float array at `offset` as float32, or None if it isn't only floats."""
+    header = data[offset]
+    if header & 0xF0 == 0x90:
+        n, offset = header & 0x0F, offset + 1
+    elif header == 0xDC:
+        n, offset = int.from_bytes(data[offset + 1 : offset + 3], "big"), offset + 3
+    elif header == 0xDD:
+        n, offset = int.from_bytes(data[offset + 1 : offset + 5], "big"), offset + 5
+    else:
+        return None
+
+    if n == 0:
+        return np.empty(0, dtype=np.float32) if offset == len(data) else None
+    marker = data[offset]
+    dtype = _MSGPACK_FLOATS.get(marker)
+    # The array must end the message, otherwise it's not the message we expect.
+    if dtype is None or len(data) - offset != n * dtype.itemsize:
+        return None
+
+    samples = np.frombuffer(data, dtype=dtype, count=n, offset=offset)
+    if not (samples["marker"] == marker).all():
+        return None
+    # The single copy: from big-endian, one sample every 5 bytes, to native float32.
+    return samples["value"].astype(np.float32)
+
+
+def decode_tts_message(message_bytes: bytes) -> TTSMessage:
+    """Unpack and validate a message from the TTS server.
+
+    The `Audio` messages (12.5 per second) are read directly from the msgpack bytes
+    into a NumPy array, without a Python float for each sample or going through
+    pydantic. Everything else is unpacked and validated.
+    """
+    if message_bytes.startswith(_AUDIO_MESSAGE_PREFIX):
+        pcm = _decode_msgpack_floats(message_bytes, len(_AUDIO_MESSAGE_PREFIX))
+        if pcm is not None:
+            return TTSAudioMessage.model_construct(type="Audio", pcm=pcm)
+
+    return TTSMessageAdapter.validate_python(msgpack.unpackb(message_bytes))
+
 
 def url_escape(value: object) -> str:
     return urllib.parse.quote(str(value), safe="")
 
 
-# Only release the audio such that it's AUDIO_BUFFER_SEC ahead of real time.
-# If the value it's too low, it might cause stuttering.
-# If it's too high, it's difficult to control the synchronization of the text and the
-# audio, because that's controlled by emit() and WebRTC. Note that some
-# desynchronization can still occur if the TTS is less than real-time, because WebRTC
-# will decide to do some buffering of the audio on the fly.
-AUDIO_BUFFER_SEC = FRAME_TIME_SEC * 4
-
-
 def prepare_text_for_tts(text: str) -> str:
     text = text.strip()
 
@@ -161,10 +211,13 @@ class TextToSpeech(ServiceWithStartup):
         )
 
         # self.query_parameters = f"?voice={self.voice}&cfg_alpha=2&format=PcmMessagePack"
-        self.text_output_queue = RealtimeQueue(get_time=get_time)
+        self.get_time = get_time
 
         self.shutdown_lock = asyncio.Lock()
         self.shutdown_complete = asyncio.Event()
+        # Connections kept ready in the pool may be closed without ever being used,
+        # they don't count in the session metrics.
+        self.used = False
 
     def state(self) -> WebsocketState:
         if not self.websocket:
@@ -226,8 +279,7 @@ class TextToSpeech(ServiceWithStartup):
             for _ in range(10):
                 # Due to some race condition in the TTS, we might get packets from a previous TTS client.
                 message_bytes = await self.websocket.recv(decode=False)
-                message_dict = msgpack.unpackb(message_bytes)
-                message = TTSMessageAdapter.validate_python(message_dict)
+                message = decode_tts_message(message_bytes)
                 if isinstance(message, TTSReadyMessage):
                     return
                 elif isinstance(message, TTSErrorMessage):
@@ -249,8 +301,9 @@ class TextToSpeech(ServiceWithStartup):
         async with self.shutdown_lock:
             if self.shutdown_complete.is_set():
                 return
-            mt.TTS_ACTIVE_SESSIONS.dec()
-            mt.TTS_AUDIO_DURATION.observe(self.received_samples / SAMPLE_RATE)
+            if self.used:
+                mt.TTS_ACTIVE_SESSIONS.dec()
+                mt.TTS_AUDIO_DURATION.observe(self.received_samples / SAMPLE_RATE)
             if self.time_since_first_text_sent.started:
                 mt.TTS_GEN_DURATION.observe(self.time_since_first_text_sent.time())
 
@@ -269,67 +322,69 @@ class TextToSpeech(ServiceWithStartup):
             raise RuntimeError("TTS websocket not connected")
         mt.TTS_SESSIONS.inc()
         mt.TTS_ACTIVE_SESSIONS.inc()
+        self.used = True
 
-        output_queue: RealtimeQueue[TTSMessage] = RealtimeQueue()
+        # Sends the audio a bit ahead of real time and the text along with it.
+        buffer: AudioJitterBuffer[TTSAudioMessage, TTSTextMessage] = AudioJitterBuffer(
+            get_time=self.get_time
+        )
+        websocket = self.websocket
 
         try:
-            async for message_bytes in self.websocket:
-                message_dict = msgpack.unpackb(cast(Any, message_bytes))
-                message: TTSMessage = TTSMessageAdapter.validate_python(message_dict)
-
-                if isinstance(message, TTSAudioMessage):
-                    # Use `yield message` if you want to to release the audio
-                    # as fast as it's being generated. However, it might desynchronize
-                    # the text and the audio.
-                    mt.TTS_RECV_FRAMES.inc()
-                    if (
-                        self.waiting_first_audio
-                        and self.time_since_first_text_sent.started
-                    ):
-                        self.waiting_first_audio = False
-                        ttft = self.time_since_first_text_sent.time()
-                        mt.TTS_TTFT.observe(ttft)
-                        logger.info("Time to first token is %.1f ms", ttft * 1000)
-                    output_queue.start_if_not_started()
-                    output_queue.put(
-                        message, self.received_samples / SAMPLE_RATE - AUDIO_BUFFER_SEC
+            while True:
+                try:
+                    message_bytes = await asyncio.wait_for(
+                        websocket.recv(decode=False), buffer.time_until_next()
                     )
-                    self.received_samples += len(message.pcm)
-
-                    if self.recorder is not None:
-                        await self.recorder.add_event(
-                            "server",
-                            ora.UnmuteResponseAudioDeltaReady(
-                                number_of_samples=len(message.pcm)
-                            ),
-                        )
-
-                elif isinstance(message, TTSTextMessage):
-                    mt.TTS_RECV_WORDS.inc()
-                    if message == TTSTextMessage(
-                        type="Text", text="", start_s=0, stop_s=0
-                    ):
-                        # Always emitted by the TTS server, but we don't need it
-                        continue
-
-                    # There are two reasons why we don't send the text messages
-                    # immediately:
-                    # - The text messages have timestamps "from the future" because the
-                    # audio stream is delayed by 2s.
-                    # - Even so, we receive the audio/text faster than real time. It
-                    #   seems difficult to keep track of how much audio data has already
-                    #   been streamed (.emit() eats up the inputs immediately,
-                    #   apparently it has some internal buffering) so we only send the
-                    #   text messages at the real time when they're actually supposed to
-                    #   be displayed. Precise timing/buffering is less important here.
-                    # We use start_s instead of stop_s because otherwise we might miss the
-                    # last word.
-                    output_queue.put(message, message.start_s)
-
-                for _, message in output_queue.get_nowait():
+                except TimeoutError:
+                    message_bytes = None  # Time to send some of the buffer
+
+                if message_bytes is not None:
+                    message = decode_tts_message(message_bytes)
+                    if isinstance(message, TTSAudioMessage):
+                        # Use `yield message` if you want to to release the audio
+                        # as fast as it's being generated. However, it might
+                        # desynchronize the text and the audio.
+                        mt.TTS_RECV_FRAMES.inc()
+                        if (
+                            self.waiting_first_audio
+                            and self.time_since_first_text_sent.started
+                        ):
+                            self.waiting_first_audio = False
+                            ttft = self.time_since_first_text_sent.time()
+                            mt.TTS_TTFT.observe(ttft)
+                            logger.info("Time to first token is %.1f ms", ttft * 1000)
+                        buffer.put_audio(message, len(message.pcm))
+                        self.received_samples += len(message.pcm)
+
+                        if self.recorder is not None:
+                            await self.recorder.add_event(
+                                "server",
+                                see.unmute_response_audio_delta_ready(len(message.pcm)),
+                            )
+
+                    elif isinstance(message, TTSTextMessage):
+                        mt.TTS_RECV_WORDS.inc()
+                        if message == TTSTextMessage(
+                            type="Text", text="", start_s=0, stop_s=0
+                        ):
+                            # Always emitted by the TTS server, but we don't need it
+                            continue
+
+                        # There are two reasons why we don't send the text messages
+                        # immediately:
+                        # - The text messages have timestamps "from the future"
+                        #   because the audio stream is delayed by 2s.
+                        # - Even so, we receive the audio/text faster than real time,
+                        #   and the audio is only sent a bit ahead of real time.
+                        # So the buffer sends each word when its audio starts playing.
+                        # We use start_s instead of stop_s because otherwise we might
+                        # miss the last word.
+                        buffer.put_text(message, message.start_s)
+
+                for message in buffer.pop_ready():
                     if isinstance(message, TTSAudioMessage):
                         self.received_samples_yielded += len(message.pcm)
-
                     yield message
 
         except websockets.ConnectionClosedOK:
@@ -342,14 +397,25 @@ class TextToSpeech(ServiceWithStartup):
             else:
                 raise
 
-        # Empty the queue if the connection is closed - we're releasing the messages
+        # Empty the buffer if the connection is closed - we're releasing the messages
         # in real time, see above.
-        async for _, message in output_queue:
-            if self.shutdown_complete.is_set():
-                break
-            if isinstance(message, TTSAudioMessage):
-                self.received_samples_yielded += len(message.pcm)
-            yield message
+        buffer.close()
+        while not buffer.empty() and not self.shutdown_complete.is_set():
+            for message in buffer.pop_ready():
+                if isinstance(message, TTSAudioMessage):
+                    self.received_samples_yielded += len(message.pcm)
+                yield message
+            await asyncio.sleep(buffer.time_until_next() or 0)
 
         logger.debug("TTS __aiter__() finished")
         await self.shutdown()
+
+
+async def _connect(voice: str | None) -> TextToSpeech:
+    return await find_instance("tts", partial(TextToSpeech, voice=voice))
+
+
+@cache
+def get_tts_pool() -> ConnectionPool[TextToSpeech]:
+    """The ready TTS connections of the process, see `tts_pool.py`."""
+    return ConnectionPool(_connect)
@@ -0,0 +1,207 @@
+"""TTS connections opened in advance, shared by all the sessions of a process.
+
+Each assistant turn needs a new TTS connection: resolving the instances, connecting
+the websocket and waiting for the server to be ready takes a visible part of the time
+to first audio. The `ConnectionPool` keeps `TTS_POOL_SIZE` ready connections for each
+voice used recently, so that a turn can take one right away. Taking one starts
+opening its replacement in the background. If none is ready, the turn connects
+itself, as before.
+
+A connection is used by a single turn, it never goes back to the pool after. Ready
+connections hold a slot on the TTS server, so they are closed when they get old, and
+the voices that nobody used for `TTS_POOL_VOICE_TTL_SEC` are not kept ready anymore.
+Custom voices are never pooled, they belong to a single user. A connection that was
+taken but not used, e.g. by a speculation that didn't happen, can be given back.
+"""
+
+import asyncio
+import logging
+import time
+import weakref
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Generic, Protocol, TypeVar
+
+from unmute import metrics as mt
+from unmute.kyutai_constants import (
+    TTS_POOL_MAX_IDLE_SEC,
+    TTS_POOL_SIZE,
+    TTS_POOL_VOICE_TTL_SEC,
+)
+from unmute.timer import Stopwatch
+from unmute.websocket_utils import WebsocketState
+
+logger = logging.getLogger(__name__)
+
+# How often old connections and unused voices are cleaned up.
+JANITOR_INTERVAL_SEC = 5.0
+
+
+class PooledConnection(Protocol):
+    def state(self) -> WebsocketState: ...
+
+    async def shutdown(self) -> None: ...
+
+
+C = TypeVar("C", bound=PooledConnection)
+
+
+@dataclass
+class _Ready(Generic[C]):
+    connection: C
+    connected_at: float
+
+
+class ConnectionPool(Generic[C]):
+    def __init__(
+        self,
+        connect: Callable[[str | None], Awaitable[C]],
+        size_per_voice: int = TTS_POOL_SIZE,
+        max_idle_sec: float = TTS_POOL_MAX_IDLE_SEC,
+        voice_ttl_sec: float = TTS_POOL_VOICE_TTL_SEC,
+    ):
+        """Keep connections ready for the voices in use.
+
+        Args:
+            connect: Opens a ready connection for a voice, raises if it can't.
+            size_per_voice: Connections kept ready for each voice, 0 disables the pool.
+            max_idle_sec: Ready connections older than this are replaced.
+            voice_ttl_sec: Voices not used for this long are not kept ready anymore.
+        """
+        self.connect = connect
+        self.size_per_voice = size_per_voice
+        self.max_idle_sec = max_idle_sec
+        self.voice_ttl_sec = voice_ttl_sec
+
+        self._ready: dict[str | None, deque[_Ready[C]]] = {}
+        self._last_used: dict[str | None, float] = {}
+        self._refills: dict[str | None, asyncio.Task[None]] = {}
+        self._closing: set[asyncio.Task[None]] = set()
+        self._janitor: asyncio.Task[None] | None = None
+        # Of the connections checked out, so that they can be given back.
+        self._connected_at: weakref.WeakKeyDictionary[C, float] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def is_pooled(self, voice: str | None) -> bool:
+        return self.size_per_voice > 0 and not (
+            voice is not None and voice.startswith("custom:")
+        )
+
+    def n_ready(self, voice: str | None) -> int:
+        return len(self._ready.get(voice, ()))
+
+    async def checkout(self, voice: str | None) -> C:
+        """A ready connection for `voice`, from the pool if possible."""
+        stopwatch = Stopwatch()
+        if not self.is_pooled(voice):
+            return await self.connect(voice)
+
+        self._last_used[voice] = time.monotonic()
+        self._ensure_janitor()
+        ready = self._take(voice)
+        self._ensure_refill(voice)
+
+        if ready is not None:
+            mt.TTS_POOL_CHECKOUTS.labels(result="hit").inc()
+        else:
+            mt.TTS_POOL_CHECKOUTS.labels(result="miss").inc()
+            ready = _Ready(await self.connect(voice), time.monotonic())
+        mt.TTS_POOL_CHECKOUT_TIME.observe(stopwatch.time())
+        self._connected_at[ready.connection] = ready.connected_at
+        return ready.connection
+
+    def checkin(self, voice: str | None, connection: C):
+        """Give back a connection from `checkout` that wasn't used."""
+        connected_at = self._connected_at.pop(connection, time.monotonic())
+        ready = _Ready(connection, connected_at)
+        if (
+            voice in self._last_used
+            and self.n_ready(voice) < self.size_per_voice
+            and self._is_usable(ready, time.monotonic())
+        ):
+            self._ready.setdefault(voice, deque()).appendleft(ready)
+            mt.TTS_POOL_READY.inc()
+        else:
+            self._close(connection)
+
+    def _is_usable(self, ready: _Ready[C], now: float) -> bool:
+        return (
+            ready.connection.state() == "connected"
+            and now - ready.connected_at < self.max_idle_sec
+        )
+
+    def _take(self, voice: str | None) -> _Ready[C] | None:
+        queue = self._ready.get(voice)
+        now = time.monotonic()
+        while queue:
+            ready = queue.popleft()
+            mt.TTS_POOL_READY.dec()
+            if self._is_usable(ready, now):
+                return ready
+            self._close(ready.connection)
+        return None
+
+    def _ensure_refill(self, voice: str | None):
+        task = self._refills.get(voice)
+        if task is None or task.done():
+            self._refills[voice] = asyncio.create_task(
+                self._refill(voice), name=f"tts_pool_refill_{voice}"
+            )
+
+    async def _refill(self, voice: str | None):
+        while voice in self._last_used and self.n_ready(voice) < self.size_per_voice:
+            try:
+                connection = await self.connect(voice)
+            except Exception as e:
+                # Turns connect by themselves until the next checkout tries again.
+                logger.warning(f"Could not open a TTS connection for the pool: {e!r}")
+                return
+
+            if voice not in self._last_used:
+                self._close(connection)  # The voice expired in the meantime
+                return
+            self._ready.setdefault(voice, deque()).append(
+                _Ready(connection, time.monotonic())
+            )
+            mt.TTS_POOL_READY.inc()
+
+    def _close(self, connection: C):
+        mt.TTS_POOL_EVICTIONS.inc()
+        task = asyncio.create_task(connection.shutdown(), name="tts_pool_close")
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def _ensure_janitor(self):
+        loop = asyncio.get_running_loop()
+        task = self._janitor
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._janitor = loop.create_task(self._clean_up(), name="tts_pool_janitor")
+
+    async def _clean_up(self):
+        while self._last_used:
+            await asyncio.sleep(JANITOR_INTERVAL_SEC)
+            self.clean_up()
+
+    def clean_up(self):
+        """Close the old connections and those of the voices not used anymore."""
+        now = time.monotonic()
+        for voice, last_used in list(self._last_used.items()):
+            expired = now - last_used > self.voice_ttl_sec
+            if expired:
+                del self._last_used[voice]
+
+            keep: deque[_Ready[C]] = deque()
+            for ready in self._ready.get(voice, ()):
+                if not expired and self._is_usable(ready, now):
+                    keep.append(ready)
+                else:
+                    mt.TTS_POOL_READY.dec()
+                    self._close(ready.connection)
+            self._ready[voice] = keep
+
+            if expired:
+                del self._ready[voice]
+                self._refills.pop(voice, None)
+            elif len(keep) < self.size_per_voice:
+                self._ensure_refill(voice)
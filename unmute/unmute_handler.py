@@ -1,5 +1,4 @@
 import asyncio
-import math
 from functools import partial
 from logging import getLogger
 from pathlib import Path
@@ -18,13 +17,18 @@ from pydantic import BaseModel
 
 import unmute.openai_realtime_api_events as ora
 from unmute import metrics as mt
+from unmute import server_event_encoding as see
 from unmute.audio_input_override import AudioInputOverride
+from unmute.chat_history_sync import ChatHistorySync
+from unmute.debug_plot_buffer import DebugPlotBuffer
+from unmute.emit_source import SignalingQueue
+from unmute.event_subscriptions import ALL_EVENTS, EventFilter
 from unmute.exceptions import make_ora_error
 from unmute.kyutai_constants import (
-    FRAME_TIME_SEC,
     RECORDINGS_DIR,
     SAMPLE_RATE,
     SAMPLES_PER_FRAME,
+    SPECULATIVE_TURNS,
 )
 from unmute.llm.chatbot import Chatbot
 from unmute.llm.llm_utils import (
@@ -36,15 +40,21 @@ from unmute.llm.llm_utils import (
 )
 from unmute.quest_manager import Quest, QuestManager
 from unmute.recorder import Recorder
-from unmute.service_discovery import find_instance
+from unmute.speculation import TurnSpeculation
 from unmute.stt.speech_to_text import SpeechToText, STTMarkerMessage
-from unmute.stt.whisper_stt import WhisperSTT, WhisperTranscription
+from unmute.stt.whisper_stt import (
+    WhisperSTT,
+    WhisperTranscription,
+    record_transcription_spans,
+)
 from unmute.timer import Stopwatch
+from unmute.tracing import TurnTrace, get_trace_store
 from unmute.tts.text_to_speech import (
     TextToSpeech,
     TTSAudioMessage,
     TTSClientEosMessage,
     TTSTextMessage,
+    get_tts_pool,
 )
 
 
@@ -97,6 +107,9 @@ TTS_DEBUGGING_TEXT = None
 # AUDIO_INPUT_OVERRIDE: Path | None = Path.home() / "audio/dog-or-cat-3.mp3"
 AUDIO_INPUT_OVERRIDE: Path | None = None
 DEBUG_PLOT_HISTORY_SEC = 10.0
+# Points kept for the debug plot, and how many input frames are averaged into one.
+DEBUG_PLOT_CAPACITY = 1024
+DEBUG_PLOT_DECIMATION = 4
 
 USER_SILENCE_TIMEOUT = 7.0
 FIRST_MESSAGE_TEMPERATURE = 0.7
@@ -107,6 +120,13 @@ FURTHER_MESSAGES_TEMPERATURE = 0.7
 # first message.
 # A word from the ASR can still interrupt the bot.
 UNINTERRUPTIBLE_BY_VAD_TIME_SEC = 3
+# How long the button waits for the transcription of what the user just said.
+STT_FLUSH_TIMEOUT_SEC = 5.0
+# With SPECULATIVE_TURNS, start getting ready for the answer when the pause prediction
+# goes above this, before the pause is confirmed, and give up when it goes back below
+# the other threshold because the user speaks again.
+SPECULATION_START_THRESHOLD = 0.4
+SPECULATION_CANCEL_THRESHOLD = 0.2
 
 logger = getLogger(__name__)
 
@@ -122,7 +142,9 @@ class GradioUpdate(BaseModel):
 
 
 class UnmuteHandler(AsyncStreamHandler):
-    def __init__(self) -> None:
+    def __init__(
+        self, send_debug_plot: bool = False, incremental_chat_history: bool = False
+    ) -> None:
         super().__init__(
             input_sample_rate=SAMPLE_RATE,
             # IMPORTANT! If set to a higher value, will lead to choppy audio. 🤷‍♂️
@@ -130,29 +152,51 @@ class UnmuteHandler(AsyncStreamHandler):
             output_sample_rate=SAMPLE_RATE,
         )
         self.n_samples_received = 0  # Used for measuring time
-        self.output_queue: asyncio.Queue[HandlerOutput] = asyncio.Queue()
+        # Set whenever something is put in `output_queue`, see `emit_source.py`.
+        self.output_ready = asyncio.Event()
+        self.output_queue: asyncio.Queue[HandlerOutput] = SignalingQueue(
+            self.output_ready
+        )
         self.recorder = Recorder(RECORDINGS_DIR) if RECORDINGS_DIR else None
 
         self.quest_manager = QuestManager()
 
         self.stt_last_message_time: float = 0
-        self.stt_end_of_flush_time: float | None = None
+        # Set while the STT is being flushed at the end of the user's turn.
+        self.stt_flush: asyncio.Future[None] | None = None
         self.stt_flush_timer = Stopwatch()
+        # Set while getting ready for an answer that may come, see `speculation.py`.
+        self.speculation: TurnSpeculation[TextToSpeech] | None = None
+        # Don't speculate again until the user speaks, after one expired.
+        self.speculation_expired = False
+        # Set while the button waits for the transcription before answering, see
+        # `handle_cordino_tirato`. Cancelled if the user speaks again after a pause.
+        self.cordino_quest: Quest[None] | None = None
+        self.cordino_paused = False
 
         self.tts_voice: str | None = None  # Stored separately because TTS is restarted
         self.tts_output_stopwatch = Stopwatch()
 
         self.chatbot = Chatbot()
+        # If set, the chat history is sent as incremental updates instead of being part
+        # of every Gradio update.
+        self.chat_history_sync = ChatHistorySync() if incremental_chat_history else None
+        # What the client subscribed to, see `event_subscriptions.py`.
+        self.event_filter: EventFilter = ALL_EVENTS
         self.openai_client = get_openai_client()
 
         self.turn_transition_lock = asyncio.Lock()
+        # Latency spans of the current turn, see `unmute.tracing`.
+        self.turn_trace: TurnTrace | None = None
 
         self.debug_dict: dict[str, Any] = {
             "timing": {},
             "connection": {},
             "chatbot": {},
         }
-        self.debug_plot_data: list[dict] = []
+        self.debug_plot = DebugPlotBuffer(DEBUG_PLOT_CAPACITY, DEBUG_PLOT_DECIMATION)
+        # Off by default because it makes every Gradio update much bigger.
+        self.send_debug_plot = send_debug_plot
         self.last_additional_output_update = self.audio_received_sec()
 
 #        self.stt: WhisperSTT | None = None 
@@ -165,6 +209,10 @@ class UnmuteHandler(AsyncStreamHandler):
         self.bambola_buffer = BambolaBufferState()            
 
     async def cleanup(self):
+        self.end_turn_trace(session_ended=True)
+        if self.speculation is not None:
+            await self.speculation.cancel("session_ended")
+            self.speculation = None
         if self.recorder is not None:
             await self.recorder.shutdown()
 
@@ -184,7 +232,14 @@ class UnmuteHandler(AsyncStreamHandler):
             return None
         return cast(Quest[TextToSpeech], quest).get_nowait()
 
-    def get_gradio_update(self):
+    def get_gradio_update(self) -> AdditionalOutputs | None:
+        """None if the client isn't subscribed to debug updates."""
+        if self.chat_history_sync is not None:
+            self.queue_chat_history_update()
+
+        if not self.event_filter.wants("unmute.additional_outputs"):
+            return None
+
         self.debug_dict["conversation_state"] = self.chatbot.conversation_state()
         self.debug_dict["connection"]["stt"] = self.stt.state() if self.stt else "none"
         self.debug_dict["connection"]["tts"] = self.tts.state() if self.tts else "none"
@@ -193,23 +248,43 @@ class UnmuteHandler(AsyncStreamHandler):
             self.stt.pause_prediction.value if self.stt else -1
         )
 
-        # This gets verbose
-        # cutoff_time = self.audio_received_sec() - DEBUG_PLOT_HISTORY_SEC
-        # self.debug_plot_data = [x for x in self.debug_plot_data if x["t"] > cutoff_time]
+        if self.send_debug_plot:
+            cutoff_time = self.audio_received_sec() - DEBUG_PLOT_HISTORY_SEC
+            debug_plot_data = self.debug_plot.snapshot(since=cutoff_time)
+        else:
+            debug_plot_data = []
+
+        if self.chat_history_sync is not None:
+            chat_history = []  # Sent separately
+        else:
+            chat_history = self.visible_chat_history()
 
         return AdditionalOutputs(
             GradioUpdate(
-                chat_history=[
-                    # Not trying to hide the system prompt, just making it less verbose
-                    m
-                    for m in self.chatbot.chat_history
-                    if m["role"] != "system"
-                ],
+                chat_history=chat_history,
                 debug_dict=self.debug_dict,
-                debug_plot_data=[],
+                debug_plot_data=debug_plot_data,
             )
         )
 
+    def visible_chat_history(self) -> list[dict[str, str]]:
+        # Not trying to hide the system prompt, just making it less verbose
+        return [m for m in self.chatbot.chat_history if m["role"] != "system"]
+
+    def queue_chat_history_update(self):
+        """Send what changed in the chat history since the client's last version."""
+        assert self.chat_history_sync is not None
+        if not self.event_filter.wants("unmute.chat_history.update"):
+            return
+        update = self.chat_history_sync.make_update(self.visible_chat_history())
+        if update is not None:
+            self.output_queue.put_nowait(update)
+
+    def resync_chat_history(self):
+        assert self.chat_history_sync is not None
+        self.chat_history_sync.resync()
+        self.queue_chat_history_update()
+
     async def add_chat_message_delta(
         self,
         delta: str,
@@ -222,7 +297,25 @@ class UnmuteHandler(AsyncStreamHandler):
 
         return is_new_message
 
+    def start_turn_trace(self, trigger: str, start_ns: int | None = None) -> TurnTrace:
+        self.end_turn_trace(superseded=True)
+        self.turn_trace = TurnTrace(
+            store=get_trace_store(),
+            start_ns=start_ns,
+            trigger=trigger,
+            voice=self.tts_voice or "none",
+            turn=len(self.chatbot.chat_history),
+        )
+        return self.turn_trace
+
+    def end_turn_trace(self, **attributes):
+        if self.turn_trace is not None:
+            self.turn_trace.end(**attributes)
+            self.turn_trace = None
+
     async def _generate_response(self):
+        if self.turn_trace is None:
+            self.start_turn_trace("generate_response")
         # Empty message to signal we've started responding.
         # Do it here in the lock to avoid race conditions
         await self.add_chat_message_delta("", "assistant")
@@ -231,6 +324,7 @@ class UnmuteHandler(AsyncStreamHandler):
 
     async def _generate_response_task(self):
         generating_message_i = len(self.chatbot.chat_history)
+        trace = self.turn_trace or self.start_turn_trace("generate_response")
         
         logger.info("=== INIZIO GENERAZIONE RISPOSTA ===")
         logger.info(f"self.stt exists: {self.stt is not None}")
@@ -241,19 +335,22 @@ class UnmuteHandler(AsyncStreamHandler):
             logger.info("🔇 Whisper disabilitato durante risposta")
 
         
-        await self.output_queue.put(
-            ora.ResponseCreated(
-                response=ora.Response(
-                    status="in_progress",
-                    voice=self.tts_voice or "missing",
-                    chat_history=self.chatbot.chat_history,
+        if self.event_filter.wants("response.created"):
+            await self.output_queue.put(
+                ora.ResponseCreated(
+                    response=ora.Response(
+                        status="in_progress",
+                        voice=self.tts_voice or "missing",
+                        chat_history=self.chatbot.chat_history,
+                    )
                 )
             )
-        )
 
         llm_stopwatch = Stopwatch()
+        trace.start_span("llm.generation")
+        trace.start_span("llm.first_token")
 
-        quest = await self.start_up_tts(generating_message_i)
+        quest = await self.start_up_tts(generating_message_i, trace)
         llm = VLLMStream(
             # if generating_message_i is 2, then we have a system prompt + an empty
             # assistant message signalling that we are generating a response.
@@ -280,9 +377,10 @@ class UnmuteHandler(AsyncStreamHandler):
 
         try:
             async for delta in rechunk_to_words(llm.chat_completion(messages)):
-                await self.output_queue.put(
-                    ora.UnmuteResponseTextDeltaReady(delta=delta)
-                )
+                if self.event_filter.wants("unmute.response.text.delta.ready"):
+                    await self.output_queue.put(
+                        see.unmute_response_text_delta_ready(delta)
+                    )
 
                 mt.VLLM_RECV_WORDS.inc()
                 response_words.append(delta)
@@ -290,10 +388,12 @@ class UnmuteHandler(AsyncStreamHandler):
                 if time_to_first_token is None:
                     time_to_first_token = llm_stopwatch.time()
                     self.debug_dict["timing"]["to_first_token"] = time_to_first_token
+                    trace.end_span("llm.first_token")
                     mt.VLLM_TTFT.observe(time_to_first_token)
                     logger.info("Sending first word to TTS: %s", delta)
 
                 self.tts_output_stopwatch.start_if_not_started()
+                trace.start_span("tts.first_audio")
                 try:
                     tts = await quest.get()
                 except Exception:
@@ -324,6 +424,7 @@ class UnmuteHandler(AsyncStreamHandler):
         finally:
             logger.info("End of VLLM, after %d words.", len(response_words))
             mt.VLLM_ACTIVE_SESSIONS.dec()
+            trace.end_span("llm.generation", words=len(response_words))
             mt.VLLM_REPLY_LENGTH.observe(len(response_words))
             mt.VLLM_GEN_DURATION.observe(llm_stopwatch.time())
 
@@ -348,14 +449,10 @@ class UnmuteHandler(AsyncStreamHandler):
         # If this doesn't update, it means the receive loop isn't running because
         # the process is busy with something else, which is bad.
         self.debug_dict["last_receive_time"] = self.audio_received_sec()
-        float_audio = audio_to_float32(array)
-
-        self.debug_plot_data.append(
-            {
-                "t": self.audio_received_sec(),
-                "amplitude": float(np.sqrt((float_audio**2).mean())),
-                "pause_prediction": stt.pause_prediction.value,
-            }
+        self.debug_plot.add(
+            self.audio_received_sec(),
+            audio_to_float32(array),
+            stt.pause_prediction.value,
         )
 
         if self.chatbot.conversation_state() == "bot_speaking":
@@ -391,33 +488,12 @@ class UnmuteHandler(AsyncStreamHandler):
         if self.chatbot.conversation_state() == "user_speaking":
             self.debug_dict["timing"] = {}
 
-        # Invia audio a Whisper
-        result = await stt.send_audio(array)
-        
-        # Se Whisper ha trascritto qualcosa
-        if result and isinstance(result, WhisperTranscription):
-            await self.output_queue.put(
-                ora.ConversationItemInputAudioTranscriptionDelta(
-                    delta=result.text,
-                    start_time=result.start_time,
-                )
-            )
-            
-            if result.text.strip():
-                was_interrupted = False
-                if self.chatbot.conversation_state() == "bot_speaking":
-                    logger.info("Whisper-based interruption")
-                    await self.interrupt_bot()
-                    was_interrupted = True
-
-                self.stt_last_message_time = result.start_time
-                is_new_message = await self.add_chat_message_delta(result.text, "user")
-                if is_new_message:
-                    await self.output_queue.put(ora.InputAudioBufferSpeechStarted())
-
-                # Response generation now only happens when cordino_tirato is received
-                # Do not auto-generate - wait for button press
-                logger.debug(f"Whisper transcription added to chat: {result.text[:50]}...")
+        # Invia audio a Whisper. Doesn't wait for the transcription, which is handled
+        # by `_stt_loop`.
+        await stt.send_audio(array)
+        await self.update_cordino_quest()
+        if SPECULATIVE_TURNS:
+            await self.update_speculation()
 
         # Skip old pause detection logic when using WhisperSTT
         # WhisperSTT handles pause detection internally
@@ -427,21 +503,16 @@ class UnmuteHandler(AsyncStreamHandler):
             return
 
         # === Old pause detection logic for streaming STT (Kyutai) ===
-        if self.stt_end_of_flush_time is None:
+        if self.stt_flush is None:
             await self.detect_long_silence()
 
             if self.determine_pause():
                 logger.info("Pause detected")
+                self.start_turn_trace("pause").start_span("stt.transcript")
                 await self.output_queue.put(ora.InputAudioBufferSpeechStopped())
 
-                self.stt_end_of_flush_time = stt.current_time + stt.delay_sec
                 self.stt_flush_timer = Stopwatch()
-                num_frames = (
-                    int(math.ceil(stt.delay_sec / FRAME_TIME_SEC)) + 1
-                )  # some safety margin.
-                zero = np.zeros(SAMPLES_PER_FRAME, dtype=np.float32)
-                for _ in range(num_frames):
-                    await stt.send_audio(zero)
+                self.stt_flush = await stt.flush()
             elif (
                 self.chatbot.conversation_state() == "bot_speaking"
                 and stt.pause_prediction.value < 0.4
@@ -453,15 +524,65 @@ class UnmuteHandler(AsyncStreamHandler):
         else:
             # We do not try to detect interruption here, the STT would be processing
             # a chunk full of 0, so there is little chance the pause score would indicate an interruption.
-            if stt.current_time > self.stt_end_of_flush_time:
-                self.stt_end_of_flush_time = None
+            if self.stt_flush.done():
+                self.stt_flush = None
                 elapsed = self.stt_flush_timer.time()
                 rtf = stt.delay_sec / elapsed
                 logger.info(
                     "Flushing finished, took %.1f ms, RTF: %.1f", elapsed * 1000, rtf
                 )
+                if self.turn_trace is not None:
+                    self.turn_trace.end_span("stt.transcript")
                 await self._generate_response()
 
+    def start_speculation(self):
+        if self.speculation is None:
+            self.speculation = TurnSpeculation(
+                get_tts_pool(),
+                self.tts_voice,
+                warm_up_llm=self.openai_client.models.list,
+            )
+
+    async def update_speculation(self):
+        """Start or cancel getting ready for the answer, see `speculation.py`."""
+        stt = self.stt
+        if stt is None:
+            return
+        pause = stt.pause_prediction.value
+
+        if pause < SPECULATION_CANCEL_THRESHOLD:
+            self.speculation_expired = False
+            if self.speculation is not None:
+                await self.speculation.cancel("resumed")
+                self.speculation = None
+        elif self.speculation is not None:
+            if self.speculation.is_expired():
+                await self.speculation.cancel("expired")
+                self.speculation = None
+                self.speculation_expired = True
+        elif (
+            not self.speculation_expired
+            and pause > SPECULATION_START_THRESHOLD
+            and self.chatbot.conversation_state() == "user_speaking"
+        ):
+            logger.info("User may be done speaking, speculating")
+            self.start_speculation()
+
+    async def update_cordino_quest(self):
+        """Don't answer the button if the user pauses, then speaks again."""
+        stt = self.stt
+        if stt is None or self.cordino_quest is None:
+            return
+        # The button may be pulled before the user is done, so wait for a pause.
+        pause = stt.pause_prediction.value
+        if pause > SPECULATION_START_THRESHOLD:
+            self.cordino_paused = True
+        elif self.cordino_paused and pause < SPECULATION_CANCEL_THRESHOLD:
+            logger.info("User speaks again, not answering the button")
+            self.cordino_quest = None
+            await self.quest_manager.remove("cordino_tirato")
+            self.end_turn_trace(user_resumed=True)
+
     def determine_pause(self) -> bool:
         stt = self.stt
         if stt is None:
@@ -491,16 +612,22 @@ class UnmuteHandler(AsyncStreamHandler):
         if output_queue_item is not None:
             return output_queue_item
         else:
-            if self.last_additional_output_update < self.audio_received_sec() - 1:
-                # If we have nothing to emit, at least update the debug dict.
-                # Don't update too often for performance reasons
-                self.last_additional_output_update = self.audio_received_sec()
-                return self.get_gradio_update()
-            else:
-                return None
+            # If we have nothing to emit, at least update the debug dict.
+            return self.periodic_gradio_update()
+
+    def periodic_gradio_update(self) -> AdditionalOutputs | None:
+        if self.last_additional_output_update < self.audio_received_sec() - 1:
+            # Don't update too often for performance reasons
+            self.last_additional_output_update = self.audio_received_sec()
+            return self.get_gradio_update()
+        else:
+            return None
 
     def copy(self):
-        return UnmuteHandler()
+        return UnmuteHandler(
+            send_debug_plot=self.send_debug_plot,
+            incremental_chat_history=self.chat_history_sync is not None,
+        )
 
     async def __aenter__(self) -> None:
         await self.quest_manager.__aenter__()
@@ -519,9 +646,7 @@ class UnmuteHandler(AsyncStreamHandler):
             return stt
 
         async def _run(stt: WhisperSTT):
-            # WhisperSTT non ha loop - gestisce in send_audio
-            while True:
-                await asyncio.sleep(1)
+            await self._stt_loop(stt)
 
         async def _close(stt: WhisperSTT):
             await stt.shutdown()
@@ -531,21 +656,63 @@ class UnmuteHandler(AsyncStreamHandler):
 
 
 
-    async def start_up_tts(self, generating_message_i: int) -> Quest[TextToSpeech]:
-        async def _init() -> TextToSpeech:
-            factory = partial(
-                TextToSpeech,
-                recorder=self.recorder,
-                get_time=self.audio_received_sec,
-                voice=self.tts_voice,
+    async def _stt_loop(self, stt: WhisperSTT):
+        async for result in stt:
+            await self._handle_transcription(result)
+
+    async def _handle_transcription(self, result: WhisperTranscription):
+        await self.output_queue.put(
+            ora.ConversationItemInputAudioTranscriptionDelta(
+                delta=result.text,
+                start_time=result.start_time,
             )
+        )
+
+        if result.text.strip():
+            if self.chatbot.conversation_state() == "bot_speaking":
+                logger.info("Whisper-based interruption")
+                await self.interrupt_bot()
+
+            if result.ends_utterance:
+                if self.cordino_quest is not None and self.turn_trace is not None:
+                    # The button is waiting for this transcription.
+                    trace = self.turn_trace
+                else:
+                    # The turn starts with the pause, even if an earlier one is still
+                    # waiting for the button: the user spoke again since.
+                    trace = self.start_turn_trace("pause", start_ns=result.pause_ns)
+                record_transcription_spans(trace, result)
+
+            self.stt_last_message_time = result.start_time
+            is_new_message = await self.add_chat_message_delta(result.text, "user")
+            if is_new_message:
+                await self.output_queue.put(ora.InputAudioBufferSpeechStarted())
+
+            # Response generation now only happens when cordino_tirato is received
+            # Do not auto-generate - wait for button press
+            logger.debug(f"Whisper transcription added to chat: {result.text[:50]}...")
+
+    async def start_up_tts(
+        self, generating_message_i: int, trace: TurnTrace
+    ) -> Quest[TextToSpeech]:
+        async def _init() -> TextToSpeech:
+            speculation, self.speculation = self.speculation, None
+            if speculation is not None:
+                tts = await speculation.commit(self.tts_voice)
+                if tts is not None:
+                    tts.recorder = self.recorder
+                    tts.get_time = self.audio_received_sec
+                    return tts
+
             sleep_time = 0.05
             sleep_growth = 1.5
             max_sleep = 1.0
             trials = 5
             for trial in range(trials):
                 try:
-                    tts = await find_instance("tts", factory)
+                    with trace.span("tts.connect", trial=trial):
+                        # Usually a connection opened in advance, see `tts_pool.py`.
+                        tts = await get_tts_pool().checkout(self.tts_voice)
                 except Exception:
                     if trial == trials - 1:
                         raise
@@ -558,18 +725,23 @@ class UnmuteHandler(AsyncStreamHandler):
                     )
                     await self.output_queue.put(error)
                 else:
+                    # Pooled connections are made without knowing the session.
+                    tts.recorder = self.recorder
+                    tts.get_time = self.audio_received_sec
                     return tts
             raise AssertionError("Too many unexpected packets.")
 
         async def _run(tts: TextToSpeech):
-            await self._tts_loop(tts, generating_message_i)
+            await self._tts_loop(tts, generating_message_i, trace)
 
         async def _close(tts: TextToSpeech):
             await tts.shutdown()
 
         return await self.quest_manager.add(Quest("tts", _init, _run, _close))
 
-    async def _tts_loop(self, tts: TextToSpeech, generating_message_i: int):
+    async def _tts_loop(
+        self, tts: TextToSpeech, generating_message_i: int, trace: TurnTrace
+    ):
         # On interruption, we swap the output queue. This will ensure that this worker
         # can never accidentally push to the new queue if it's interrupted.
         output_queue = self.output_queue
@@ -600,8 +772,11 @@ class UnmuteHandler(AsyncStreamHandler):
                     t = self.tts_output_stopwatch.stop()
                     if t is not None:
                         self.debug_dict["timing"]["tts_audio"] = t
+                        trace.end_span("tts.first_audio")
+                        # Ended by the emit loop, see `main_websocket.py`.
+                        trace.start_span("emit.first_audio")
 
-                    audio = np.array(message.pcm, dtype=np.float32)
+                    audio = message.pcm
                     assert self.output_sample_rate == SAMPLE_RATE
 
                     # === GESTIONE BUFFER BAMBOLA ===
@@ -618,7 +793,8 @@ class UnmuteHandler(AsyncStreamHandler):
                     if audio_started is None:
                         audio_started = self.audio_received_sec()
                 elif isinstance(message, TTSTextMessage):
-                    await output_queue.put(ora.ResponseTextDelta(delta=message.text))
+                    if self.event_filter.wants("response.text.delta"):
+                        await output_queue.put(see.response_text_delta(message.text))
                     await self.add_chat_message_delta(
                         message.text,
                         "assistant",
@@ -667,8 +843,12 @@ class UnmuteHandler(AsyncStreamHandler):
 
         # It's convenient to have the whole chat history available in the client
         # after the response is done, so send the "gradio update"
-        await self.output_queue.put(self.get_gradio_update())
+        gradio_update = self.get_gradio_update()
+        if gradio_update is not None:
+            await self.output_queue.put(gradio_update)
         await self.output_queue.put(ora.ResponseAudioDone())
+        if self.turn_trace is trace:
+            self.end_turn_trace()
 
         # Signal that the turn is over by adding an empty message.
         await self.add_chat_message_delta("", "user")
@@ -692,6 +872,7 @@ class UnmuteHandler(AsyncStreamHandler):
             )
 
         await self.add_chat_message_delta(INTERRUPTION_CHAR, "assistant")
+        self.end_turn_trace(interrupted=True)
         # Riabilita Whisper su interruzione
         if self.stt and isinstance(self.stt, WhisperSTT):
             self.stt.bot_speaking = False
@@ -701,7 +882,8 @@ class UnmuteHandler(AsyncStreamHandler):
             # Clear any audio queued up by FastRTC's emit().
             # Not sure under what circumstatnces this is None.
             self._clear_queue()
-        self.output_queue = asyncio.Queue()  # Clear our own queue too
+        # Clear our own queue too
+        self.output_queue = SignalingQueue(self.output_ready)
 
         # Push some silence to flush the Opus state.
         # Not sure that this is actually needed.
@@ -723,8 +905,39 @@ class UnmuteHandler(AsyncStreamHandler):
         self.bambola_buffer.cordino_tirato = True
         self.bambola_buffer.start_recording()
 
+        if self.chatbot.conversation_state() == "bot_speaking":
+            logger.warning("Cannot start response - bot is already speaking")
+            return
+
         # Start generating response
-        # The user audio should already be in chat history from Whisper transcription
+        if SPECULATIVE_TURNS:
+            # Get the TTS ready while the end of the utterance is transcribed.
+            self.start_speculation()
+        # The transcription is awaited in the background, so that the websocket keeps
+        # receiving audio in the meantime. Replaces the quest of a previous pull.
+        # The turn started at the pause, if the utterance was already transcribed and
+        # the user didn't speak again since.
+        trace = self.turn_trace
+        if trace is None or (self.stt is not None and self.stt.has_speech):
+            trace = self.start_turn_trace("cordino_tirato")
+        self.cordino_paused = False
+        self.cordino_quest = await self.quest_manager.add(
+            Quest.from_run_step(
+                "cordino_tirato", partial(self._answer_cordino_tirato, trace)
+            )
+        )
+
+    async def _answer_cordino_tirato(self, trace: TurnTrace):
+        # Don't wait for the silence that ends the utterance to transcribe it.
+        if self.stt is not None:
+            with trace.span("stt.flush"):
+                flush = await self.stt.flush()
+                try:
+                    await asyncio.wait_for(flush, STT_FLUSH_TIMEOUT_SEC)
+                except TimeoutError:
+                    logger.warning("Whisper flush timed out, answering without it")
+        # From here on, speaking again doesn't cancel the answer.
+        self.cordino_quest = None
         conv_state = self.chatbot.conversation_state()
 
         # Check if there's user input to respond to
@@ -732,9 +945,11 @@ class UnmuteHandler(AsyncStreamHandler):
         has_user_input = last_user_msg and last_user_msg.strip()
 
         if conv_state == "bot_speaking":
-            logger.warning(f"Cannot start response - bot is already speaking")
+            logger.warning("Cannot start response - bot is already speaking")
         elif not has_user_input:
             logger.warning("No user input to respond to - waiting for speech")
+            if self.turn_trace is trace:
+                self.end_turn_trace(no_user_input=True)
         else:
             preview = last_user_msg[:50] if last_user_msg else ""
             logger.info(f"Starting response generation for: {preview}...")
@@ -812,6 +1027,23 @@ class UnmuteHandler(AsyncStreamHandler):
             await self.add_chat_message_delta(USER_SILENCE_MARKER, "user")
 
     async def update_session(self, session: ora.SessionConfig):
+        """Apply the configuration sent by the client.
+
+        Raises:
+            ValueError: if the event subscriptions are invalid. Nothing is updated then.
+        """
+        if session.event_subscriptions is not None:
+            self.event_filter = EventFilter.from_subscriptions(
+                session.event_subscriptions
+            )
+
+        if session.incremental_chat_history is not None:
+            if not session.incremental_chat_history:
+                self.chat_history_sync = None
+            elif self.chat_history_sync is None:
+                # The first update is a full snapshot.
+                self.chat_history_sync = ChatHistorySync()
+
         # Voice-specific instructions are now enabled
         if session.instructions:
             self.chatbot.set_instructions(session.instructions)